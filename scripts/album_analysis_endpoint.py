@@ -6,9 +6,10 @@ import json
 import os  # Agregar este import
 from collections import Counter, defaultdict
 from flask import jsonify, request  # Agregar request aquí
-import re
 import requests
 
+from pagination import CursorError, check_cursor_version, decode_cursor, encode_cursor
+
 logger = logging.getLogger(__name__)
 
 class AlbumAnalysisEndpoints:
@@ -39,6 +40,37 @@ class AlbumAnalysisEndpoints:
                     logger.error("db_manager no disponible")
                     return jsonify({'error': 'Base de datos no disponible', 'results': []}), 500
                 
+                index_version = self.db_manager.search_engine.index_version
+                try:
+                    cursor = decode_cursor(request.args.get('cursor'), {'q': query})
+                    check_cursor_version(cursor, index_version)
+                except CursorError as e:
+                    return jsonify({'error': str(e), 'results': []}), 400
+                
+                # Índice de búsqueda unificado (bm25 + subcadena con trigram)
+                page = self.db_manager.search_engine.search_albums_page(
+                    query, limit, cursor['after'] if cursor else None
+                )
+                if page is None and cursor:
+                    return jsonify({'error': 'El cursor ha caducado', 'results': []}), 400
+                if page is not None:
+                    albums, next_after = page
+                    results = [{
+                        'id': album['id'],
+                        'name': album['name'] or 'Sin nombre',
+                        'year': album['year'] or 'Desconocido',
+                        'genre': album['genre'] or 'Desconocido',
+                        'label': album['label'] or 'Desconocido',
+                        'artist_name': album['artist_name'] or 'Artista desconocido',
+                        'display_name': album['display_name'] or f"Album {album['id']}"
+                    } for album in albums]
+                    return jsonify({
+                        'results': results,
+                        'total': len(results),
+                        'query': query,
+                        'next_cursor': encode_cursor({'q': query, 'v': index_version, 'after': next_after}) if next_after else None
+                    })
+                
                 # Test básico de conexión
                 try:
                     test_result = self.db_manager.execute_query("SELECT COUNT(*) as total FROM albums LIMIT 1")
@@ -270,8 +302,7 @@ class AlbumAnalysisEndpoints:
             labels_chart_data = [{'label': row['label'], 'count': row['count']} for row in labels_data]
             countries_chart_data = [{'country': row['origin'], 'count': row['count']} for row in countries_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -359,8 +390,7 @@ class AlbumAnalysisEndpoints:
             
             artists_chart_data = [{'artist': row['name'], 'albums': row['albums_count']} for row in artists_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -477,8 +507,7 @@ class AlbumAnalysisEndpoints:
             timeline_data = [{'year': year, 'tracks_played': count} 
                            for year, count in sorted(concert_timeline.items())]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -575,8 +604,7 @@ class AlbumAnalysisEndpoints:
             genres_chart_data = [{'genre': row['genre'], 'count': row['count']} for row in genres_data]
             artists_chart_data = [{'artist': row['name'], 'albums': row['albums_count']} for row in artists_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -672,8 +700,7 @@ class AlbumAnalysisEndpoints:
                                  for release, count in sorted(releases_with_tracks.items(), 
                                                              key=lambda x: x[1], reverse=True)]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -714,52 +741,11 @@ class AlbumAnalysisEndpoints:
             album_tracks = self.db_manager.get_album_tracks_by_id(album_id)
             track_names = [track.get('title', '') for track in album_tracks if track.get('title')]
             
-            # Escuchas en Last.fm
-            lastfm_query = """
-                SELECT track_name, scrobble_date, COUNT(*) as plays
-                FROM scrobbles_paqueradejere
-                WHERE artist_id = ? AND track_name IN ({})
-                GROUP BY track_name, DATE(scrobble_date)
-                ORDER BY scrobble_date
-            """.format(','.join(['?' for _ in track_names]))
-            
-            lastfm_params = [artist_id] + track_names
-            lastfm_data = self.db_manager.execute_query(lastfm_query, lastfm_params) if track_names else []
-            
-            # Escuchas en ListenBrainz
-            listenbrainz_query = """
-                SELECT track_name, listen_date, COUNT(*) as plays
-                FROM listens_guevifrito
-                WHERE artist_id = ? AND track_name IN ({})
-                GROUP BY track_name, DATE(listen_date)
-                ORDER BY listen_date
-            """.format(','.join(['?' for _ in track_names]))
-            
-            listenbrainz_params = [artist_id] + track_names
-            listenbrainz_data = self.db_manager.execute_query(listenbrainz_query, listenbrainz_params) if track_names else []
-            
-            # Procesar datos por canciones
-            lastfm_tracks = defaultdict(int)
-            lastfm_monthly = defaultdict(int)
-            
-            for row in lastfm_data:
-                lastfm_tracks[row['track_name']] += row['plays']
-                try:
-                    month = row['scrobble_date'][:7]  # YYYY-MM
-                    lastfm_monthly[month] += row['plays']
-                except:
-                    pass
-            
-            listenbrainz_tracks = defaultdict(int)
-            listenbrainz_monthly = defaultdict(int)
-            
-            for row in listenbrainz_data:
-                listenbrainz_tracks[row['track_name']] += row['plays']
-                try:
-                    month = row['listen_date'][:7]  # YYYY-MM
-                    listenbrainz_monthly[month] += row['plays']
-                except:
-                    pass
+            # Escuchas por canción y por mes en Last.fm y ListenBrainz
+            lastfm_tracks, lastfm_monthly = self.db_manager.get_listen_counts(
+                'scrobbles_paqueradejere', 'scrobble_date', artist_id, track_names)
+            listenbrainz_tracks, listenbrainz_monthly = self.db_manager.get_listen_counts(
+                'listens_guevifrito', 'listen_date', artist_id, track_names)
             
             # Datos para gráficos
             lastfm_tracks_data = [{'track': t, 'plays': p} for t, p in sorted(lastfm_tracks.items(), key=lambda x: x[1], reverse=True)]
@@ -768,8 +754,7 @@ class AlbumAnalysisEndpoints:
             listenbrainz_tracks_data = [{'track': t, 'plays': p} for t, p in sorted(listenbrainz_tracks.items(), key=lambda x: x[1], reverse=True)]
             listenbrainz_timeline_data = [{'month': m, 'plays': p} for m, p in sorted(listenbrainz_monthly.items())]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -846,8 +831,7 @@ class AlbumAnalysisEndpoints:
             artist_collab_data = [{'collaborator': c, 'albums': count} 
                                 for c, count in all_collaborators.most_common(15)]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -960,8 +944,7 @@ class AlbumAnalysisEndpoints:
             years_data = [{'year': year, 'count': count} for year, count in sorted(feeds_by_year.items())]
             sources_data = [{'source': source, 'count': count} for source, count in feeds_by_source.most_common(10)]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -1000,7 +983,7 @@ class AlbumAnalysisEndpoints:
             
             # Obtener letras de las canciones del álbum
             lyrics_query = """
-                SELECT s.title, l.lyrics
+                SELECT s.title, s.lyrics_id
                 FROM songs s
                 JOIN lyrics l ON s.lyrics_id = l.id
                 WHERE s.album = ? AND s.artist = ?
@@ -1013,9 +996,6 @@ class AlbumAnalysisEndpoints:
             if not lyrics_data:
                 return {'error': f'No se encontraron letras para las canciones de "{album_name}"'}
             
-            # Analizar palabras en las letras
-            all_words = []
-            
             # Palabras a excluir (artículos y palabras comunes en inglés y español)
             stop_words = {
                 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'must', 'shall',
@@ -1024,39 +1004,39 @@ class AlbumAnalysisEndpoints:
                 'yo', 'tu', 'él', 'ella', 'nosotros', 'nosotras', 'vosotros', 'vosotras', 'ellos', 'ellas', 'mi', 'tu', 'su', 'nuestro', 'nuestra', 'vuestro', 'vuestra'
             }
             
-            for row in lyrics_data:
-                lyrics = row['lyrics'].lower()
-                # Limpiar y extraer palabras
-                words = re.findall(r'\b[a-záéíóúñü]{3,}\b', lyrics)
-                # Filtrar palabras válidas
-                valid_words = [word for word in words if word not in stop_words]
-                all_words.extend(valid_words)
-            
-            if not all_words:
+            # Palabras más frecuentes desde el índice de palabras de las letras
+            words_data = self.db_manager.get_lyrics_term_counts("""
+                SELECT s.lyrics_id, 1 as weight
+                FROM songs s
+                JOIN lyrics l ON s.lyrics_id = l.id
+                WHERE s.album = ? AND s.artist = ?
+                AND l.lyrics IS NOT NULL AND l.lyrics != ''
+            """, (album_name, artist_name), exclude=stop_words, limit=None)
+            
+            if not words_data:
                 return {'error': 'No se encontraron palabras válidas en las letras'}
             
-            # Contar palabras más frecuentes
-            word_counts = Counter(all_words)
-            most_common = word_counts.most_common(20)
+            most_common = [(row['word'], row['word_count']) for row in words_data[:20]]
             
             # Análisis por canción
+            word_totals = self.db_manager.get_lyrics_word_totals(
+                {row['lyrics_id'] for row in lyrics_data}, exclude=stop_words)
             songs_word_count = []
             for row in lyrics_data:
-                lyrics = row['lyrics'].lower()
-                words = re.findall(r'\b[a-záéíóúñü]{3,}\b', lyrics)
-                valid_words = [word for word in words if word not in stop_words]
+                words, unique_words = word_totals.get(row['lyrics_id'], (0, 0))
                 songs_word_count.append({
                     'song': row['title'],
-                    'words': len(valid_words),
-                    'unique_words': len(set(valid_words))
+                    'words': words,
+                    'unique_words': unique_words
                 })
             
+            total_words = sum(song['words'] for song in songs_word_count)
+            
             # Datos para gráficos
             words_chart_data = [{'word': word, 'count': count} for word, count in most_common]
             songs_chart_data = sorted(songs_word_count, key=lambda x: x['words'], reverse=True)
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -1072,10 +1052,10 @@ class AlbumAnalysisEndpoints:
                 'charts': charts,
                 'stats': {
                     'songs_with_lyrics': len(lyrics_data),
-                    'total_words': len(all_words),
-                    'unique_words': len(word_counts),
+                    'total_words': total_words,
+                    'unique_words': len(words_data),
                     'most_common_word': most_common[0][0] if most_common else 'N/A',
-                    'average_words_per_song': round(len(all_words) / len(lyrics_data), 1) if lyrics_data else 0
+                    'average_words_per_song': round(total_words / len(lyrics_data), 1) if lyrics_data else 0
                 },
                 'top_words': [{'word': word, 'count': count} for word, count in most_common[:10]]
             }
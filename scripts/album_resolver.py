@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Set
+
+from derived_store import DerivedJob
+
+logger = logging.getLogger(__name__)
+
+# Tipos de coincidencia guardados en derived.album_tracks.
+# Los de respaldo solo se calculan para álbumes sin coincidencia exacta.
+MATCH_EXACT = 'exact'                          # album = ? AND artist = ?
+MATCH_ALBUM_LIKE = 'album_like'                # album LIKE %álbum%
+MATCH_ALBUM_LIKE_ARTIST = 'album_like_artist'  # album LIKE %álbum% + artista contenido
+MATCH_ARTIST_LIKE_ALBUM = 'artist_like_album'  # artist LIKE %artista% + álbum contenido
+
+# Orden de preferencia de cada consulta de DatabaseManager
+TRACKS_BY_ID_MATCHES = (MATCH_EXACT, MATCH_ALBUM_LIKE)
+TRACKS_WITH_PATHS_MATCHES = (MATCH_EXACT, MATCH_ALBUM_LIKE_ARTIST, MATCH_ARTIST_LIKE_ALBUM)
+
+
+class AlbumTrackResolver(DerivedJob):
+    """Resuelve qué canciones pertenecen a cada álbum (songs no tiene album_id)
+
+    Materializa `album_tracks(album_id, match_type, position, song_id)` con el
+    resultado de las estrategias de búsqueda que antes se ejecutaban en cada
+    petición. Si desde la última ejecución solo se han añadido filas, se
+    resuelven únicamente los álbumes afectados.
+    """
+
+    name = 'album_tracks'
+    version = 3
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        watermark = self._watermark(conn)
+        affected = self._affected_albums(conn, previous, watermark)
+
+        if affected is None:
+            self._create_tables(conn, drop=True)
+            self._resolve_exact(conn)
+            self._resolve_fallbacks(conn, self._unresolved_albums(conn))
+            mode = 'full'
+        else:
+            self._create_tables(conn, drop=False)
+            if affected:
+                self._resolve_albums(conn, affected)
+            mode = 'incremental'
+
+        rows = conn.execute("SELECT COUNT(*) FROM album_tracks").fetchone()[0]
+        return {'watermark': watermark, 'rows': rows, 'mode': mode}
+
+    # === ESQUEMA ===
+
+    def _create_tables(self, conn: sqlite3.Connection, drop: bool):
+        if drop:
+            conn.execute("DROP TABLE IF EXISTS album_tracks")
+            conn.execute("DROP TABLE IF EXISTS album_resolution")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS album_tracks (
+                album_id INTEGER NOT NULL,
+                match_type TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                song_id INTEGER NOT NULL,
+                PRIMARY KEY (album_id, match_type, position)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_album_tracks_song ON album_tracks(song_id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS album_resolution (
+                album_id INTEGER PRIMARY KEY,
+                match_type TEXT,
+                tracks INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    # === MARCA DE AGUA ===
+
+    def _watermark(self, conn: sqlite3.Connection) -> Dict:
+        """Tamaño y huella de las columnas que afectan a la resolución"""
+        songs = conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM src.songs").fetchone()
+        albums = conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM src.albums").fetchone()
+        return {
+            'songs_max_id': songs[0],
+            'songs_count': songs[1],
+            'songs_hash': self._songs_hash(conn, songs[0]),
+            'albums_max_id': albums[0],
+            'albums_count': albums[1],
+            'albums_hash': self._albums_hash(conn, albums[0]),
+            'artists_hash': self._artists_hash(conn)
+        }
+
+    @staticmethod
+    def _songs_hash(conn, max_id: int) -> int:
+        return conn.execute("""
+            SELECT COALESCE(SUM(mwe_row_hash(id, album, artist, track_number)), 0)
+            FROM src.songs WHERE id <= ?
+        """, (max_id,)).fetchone()[0]
+
+    @staticmethod
+    def _albums_hash(conn, max_id: int) -> int:
+        return conn.execute("""
+            SELECT COALESCE(SUM(mwe_row_hash(id, name, artist_id)), 0)
+            FROM src.albums WHERE id <= ?
+        """, (max_id,)).fetchone()[0]
+
+    @staticmethod
+    def _artists_hash(conn) -> int:
+        return conn.execute("""
+            SELECT COALESCE(SUM(mwe_row_hash(id, name)), 0)
+            FROM src.artists
+        """).fetchone()[0]
+
+    def _affected_albums(self, conn, previous: Optional[Dict], current: Dict) -> Optional[Set[int]]:
+        """Álbumes a recalcular, o None si hace falta reconstruir la tabla entera"""
+        old = (previous or {}).get('watermark')
+        if not old or not self._tables_exist(conn):
+            return None
+
+        if old == current:
+            return set()
+
+        # Solo se admite el caso de filas añadidas: lo ya existente no debe cambiar
+        if current['artists_hash'] != old['artists_hash']:
+            return None
+        new_songs = current['songs_count'] - old['songs_count']
+        new_albums = current['albums_count'] - old['albums_count']
+        if new_songs < 0 or new_albums < 0:
+            return None
+        if self._songs_hash(conn, old['songs_max_id']) != old['songs_hash']:
+            return None
+        if self._albums_hash(conn, old['albums_max_id']) != old['albums_hash']:
+            return None
+        if conn.execute("SELECT COUNT(*) FROM src.songs WHERE id > ?",
+                        (old['songs_max_id'],)).fetchone()[0] != new_songs:
+            return None
+
+        affected = {row[0] for row in conn.execute(
+            "SELECT id FROM src.albums WHERE id > ?", (old['albums_max_id'],)
+        )}
+        # Álbumes con coincidencia exacta en las canciones nuevas
+        affected.update(row[0] for row in conn.execute("""
+            SELECT DISTINCT a.id
+            FROM src.songs s
+            JOIN src.artists ar ON ar.name = s.artist
+            JOIN src.albums a ON a.artist_id = ar.id AND a.name = s.album
+            WHERE s.id > ?
+        """, (old['songs_max_id'],)))
+        # Los álbumes resueltos por LIKE pueden ganar canciones con cualquier alta
+        if new_songs:
+            affected.update(row[0] for row in conn.execute(
+                "SELECT album_id FROM album_resolution WHERE match_type IS NULL OR match_type != ?",
+                (MATCH_EXACT,)
+            ))
+        return affected
+
+    @staticmethod
+    def _tables_exist(conn) -> bool:
+        return conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name IN ('album_tracks', 'album_resolution')
+        """).fetchone()[0] == 2
+
+    # === RESOLUCIÓN ===
+
+    def _resolve_exact(self, conn, album_ids: Optional[List[int]] = None):
+        """Coincidencia exacta album/artist para todos los álbumes (o los indicados)"""
+        id_filter = ""
+        if album_ids is not None:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS resolve_ids (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM resolve_ids")
+            conn.executemany("INSERT OR IGNORE INTO resolve_ids (id) VALUES (?)", [(i,) for i in album_ids])
+            id_filter = "AND a.id IN (SELECT id FROM temp.resolve_ids)"
+
+        conn.execute(f"""
+            INSERT INTO album_tracks (album_id, match_type, position, song_id)
+            SELECT a.id, ?, ROW_NUMBER() OVER (PARTITION BY a.id ORDER BY s.track_number, s.id), s.id
+            FROM src.albums a
+            JOIN src.artists ar ON a.artist_id = ar.id
+            JOIN src.songs s ON s.album = a.name AND s.artist = ar.name
+            WHERE a.name != '' AND ar.name != ''
+            {id_filter}
+        """, (MATCH_EXACT,))
+        conn.execute(f"""
+            INSERT OR REPLACE INTO album_resolution (album_id, match_type, tracks)
+            SELECT a.id, ?, COUNT(*)
+            FROM src.albums a
+            JOIN album_tracks t ON t.album_id = a.id
+            WHERE t.match_type = ? {id_filter}
+            GROUP BY a.id
+        """, (MATCH_EXACT, MATCH_EXACT))
+
+    def _unresolved_albums(self, conn, album_ids: Optional[List[int]] = None) -> List[sqlite3.Row]:
+        """Álbumes (con su artista, si existe) sin coincidencia exacta"""
+        # LEFT JOIN: un álbum cuyo artista no está en `artists` también recibe su
+        # fila en album_resolution y no obliga a resolverlo en cada petición
+        query = """
+            SELECT a.id, a.name, ar.name AS artist_name
+            FROM src.albums a
+            LEFT JOIN src.artists ar ON a.artist_id = ar.id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM album_resolution r
+                WHERE r.album_id = a.id AND r.match_type = ?
+            )
+        """
+        params = [MATCH_EXACT]
+        if album_ids is not None:
+            query += " AND a.id IN (SELECT id FROM temp.resolve_ids)"
+        return conn.execute(query, params).fetchall()
+
+    def _resolve_fallbacks(self, conn, albums: List[sqlite3.Row]):
+        """Estrategias LIKE de respaldo, ejecutadas solo aquí y no en cada petición"""
+        for album in albums:
+            album_name = album['name']
+            artist_name = album['artist_name']
+            rows = []
+            resolved_type = None
+
+            if album_name:
+                like_tracks = conn.execute("""
+                    SELECT id, artist FROM src.songs
+                    WHERE album LIKE ?
+                    ORDER BY track_number
+                """, (f"%{album_name}%",)).fetchall()
+                rows += [(MATCH_ALBUM_LIKE, t['id']) for t in like_tracks]
+                if like_tracks:
+                    resolved_type = MATCH_ALBUM_LIKE
+
+                # Sin artista no se filtra: valen todas las coincidencias del álbum
+                needle = (artist_name or '').lower()
+                filtered = [t for t in like_tracks if needle in (t['artist'] or '').lower()]
+                rows += [(MATCH_ALBUM_LIKE_ARTIST, t['id']) for t in filtered]
+                if filtered:
+                    resolved_type = MATCH_ALBUM_LIKE_ARTIST
+
+            if artist_name and not any(r[0] == MATCH_ALBUM_LIKE_ARTIST for r in rows):
+                artist_tracks = conn.execute("""
+                    SELECT id, album FROM src.songs
+                    WHERE artist LIKE ?
+                    ORDER BY album, track_number
+                """, (f"%{artist_name}%",)).fetchall()
+                if album_name:
+                    needle = album_name.lower()
+                    filtered = [t for t in artist_tracks if needle in (t['album'] or '').lower()]
+                    rows += [(MATCH_ARTIST_LIKE_ALBUM, t['id']) for t in filtered]
+                    if filtered and resolved_type is None:
+                        resolved_type = MATCH_ARTIST_LIKE_ALBUM
+
+            positions = {}
+            params = []
+            for match_type, song_id in rows:
+                positions[match_type] = positions.get(match_type, 0) + 1
+                params.append((album['id'], match_type, positions[match_type], song_id))
+            if params:
+                conn.executemany("""
+                    INSERT INTO album_tracks (album_id, match_type, position, song_id)
+                    VALUES (?, ?, ?, ?)
+                """, params)
+            conn.execute("""
+                INSERT OR REPLACE INTO album_resolution (album_id, match_type, tracks)
+                VALUES (?, ?, ?)
+            """, (album['id'], resolved_type, len(params)))
+
+    def _resolve_albums(self, conn, album_ids: Set[int]):
+        """Recalcula solo los álbumes indicados"""
+        ids = sorted(album_ids)
+        conn.executemany("DELETE FROM album_tracks WHERE album_id = ?", [(i,) for i in ids])
+        conn.executemany("DELETE FROM album_resolution WHERE album_id = ?", [(i,) for i in ids])
+        self._resolve_exact(conn, ids)
+        self._resolve_fallbacks(conn, self._unresolved_albums(conn, ids))
+        logger.debug(f"Resolución incremental de {len(ids)} álbumes")
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from index_advisor import record_statement
+from lazy_import import lazy_module, load_modules, module_available
+from query_cache import get_query_cache
+
+# DuckDB es opcional (las tablas se le pasan en DataFrames de pandas); ambos
+# se importan al abrir la conexión de DuckDB, no al arrancar la app
+duckdb = lazy_module('duckdb')
+pd = lazy_module('pandas')
+DUCKDB_AVAILABLE = module_available('duckdb') and module_available('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Tablas de FROM / JOIN, con esquema opcional (p.ej. derived.scrobble_rollups)
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+(?:(\w+)\.)?"?(\w+)"?', re.IGNORECASE)
+
+# SELECT * / alias.*: hay que copiar todas las columnas de las tablas
+SELECT_ALL_PATTERN = re.compile(r'(?:\bSELECT(?:\s+DISTINCT)?|,)\s*(?:\w+\.)?\*', re.IGNORECASE)
+
+# Filas por bloque al copiar una tabla de SQLite a DuckDB
+LOAD_BATCH = 50000
+
+# Motor que usan las consultas del contexto actual en lugar del configurado
+# (lo fija el benchmark; ScrobbleSources.map lo propaga a sus hilos)
+_current_engine: ContextVar = ContextVar('analytics_engine', default=None)
+
+
+def row_class(columns: List[str]):
+    """Tupla con acceso por nombre de columna, como sqlite3.Row"""
+    index = {name: position for position, name in enumerate(columns)}
+    names = list(columns)
+
+    class Row(tuple):
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return tuple.__getitem__(self, index[key])
+            return tuple.__getitem__(self, key)
+
+        def keys(self):
+            return names
+
+    return Row
+
+
+def _sqlite_value(value):
+    """Valor de DuckDB con el tipo que devolvería SQLite"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def duckdb_type(declared: str) -> str:
+    """Tipo de DuckDB para una columna según la afinidad de su tipo en SQLite"""
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return 'BIGINT'
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'DOUBLE'
+    return 'VARCHAR'
+
+
+class SQLiteEngine:
+    """Consultas analíticas sobre las conexiones de lectura del pool"""
+
+    name = 'sqlite'
+
+    def __init__(self, pool, cache=None):
+        self.pool = pool
+        self.cache = cache
+
+    def query(self, query: str, params=()) -> List:
+        params = tuple(params or ())
+        if self.cache is None:
+            return self._execute(query, params)
+        # Misma clave que DatabaseManager.execute_query: comparten resultados
+        return self.cache.get_or_compute(('sql', query, params), lambda: self._execute(query, params))
+
+    def _execute(self, query: str, params: tuple) -> List:
+        record_statement(query, params)
+        try:
+            return self.pool.get_connection().execute(query, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error ejecutando consulta: {e}")
+            return []
+
+
+class DuckDBEngine:
+    """Consultas analíticas en DuckDB sobre una copia en columnas de las tablas
+
+    El fichero SQLite no se adjunta a DuckDB: su extensión sqlite trae otra
+    copia de la librería y, dentro del mismo proceso, rompe los bloqueos del
+    WAL de las conexiones del pool (errores "locking protocol" en las
+    escrituras y caídas del proceso). Las tablas que usa cada consulta se
+    copian a una BD DuckDB en memoria leyéndolas por el pool (también las de
+    `derived`), solo con las columnas que nombran las consultas. La copia se
+    hace en un hilo en segundo plano, cada tabla en una transacción que
+    sustituye a la anterior al confirmarse; mientras no está lista la
+    consulta se ejecuta en SQLite. Cuando cambia una BD (como mucho se
+    comprueba cada check_interval) sus tablas se vuelven a copiar de la misma
+    forma. Las consultas que DuckDB no admite (julianday, date() con
+    modificadores, strftime de SQLite...) o cuyas tablas no se pueden copiar
+    se ejecutan en SQLite y se recuerdan para no volver a intentarlo.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, pool, engine_config: dict, fallback: SQLiteEngine, cache=None,
+                 background: bool = True):
+        self.pool = pool
+        self.cache = cache
+        self.fallback = fallback
+        self.background = background
+        self.threads = engine_config.get('threads')
+        self.memory_limit = engine_config.get('memory_limit')
+        self.check_interval = engine_config.get('check_interval', 5)
+
+        self._db = None
+        self._tokens = {}
+        self._last_check = 0.0
+        # (esquema, tabla) -> columnas copiadas / pedidas por las consultas
+        self._loaded: Dict[Tuple[str, str], frozenset] = {}
+        self._wanted: Dict[Tuple[str, str], set] = {}
+        self._pending = set()
+        self._failed = set()
+        self._generations: Dict[str, int] = {}
+        self._loading = False
+        self._tables = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._unsupported = set()
+        self._row_classes = {}
+        self.stats = {'queries': 0, 'fallbacks': 0, 'deferred': 0, 'tables_loaded': 0,
+                      'load_s': 0.0, 'refreshes': 0}
+
+    def query(self, query: str, params=()) -> List:
+        params = tuple(params or ())
+        if query in self._unsupported:
+            return self.fallback.query(query, params)
+        if self.cache is None:
+            return self._execute(query, params)
+        return self.cache.get_or_compute(('duckdb', query, params), lambda: self._execute(query, params))
+
+    def _execute(self, query: str, params: tuple) -> List:
+        try:
+            cursor = self._prepare(query)
+            if cursor is None:
+                # Tablas copiándose en segundo plano: de momento responde SQLite
+                self._count('deferred')
+                return self.fallback._execute(query, params)
+            cursor.execute(query, list(params))
+            Row = self._row_class(tuple(column[0] for column in cursor.description))
+            rows = [Row(_sqlite_value(value) for value in row) for row in cursor.fetchall()]
+            self._count('queries')
+            return rows
+        except Exception as e:
+            if self._is_dialect_error(e):
+                # Dialecto de SQLite no soportado: esta consulta se hará siempre en SQLite
+                logger.info(f"Consulta no soportada en DuckDB, se ejecuta en SQLite: {e}")
+                self._unsupported.add(query)
+            else:
+                # Fallo pasajero (p.ej. copia de una tabla): se reintenta en DuckDB
+                logger.debug(f"Error en DuckDB, la consulta se ejecuta en SQLite: {e}")
+            self._count('fallbacks')
+            return self.fallback._execute(query, params)
+
+    def _is_dialect_error(self, error: Exception) -> bool:
+        """True si DuckDB no entiende la consulta (sintaxis, columnas o funciones)"""
+        if self._db is None:
+            # Sin conexión el módulo puede no haberse cargado
+            return False
+        return isinstance(error, (duckdb.ParserException, duckdb.BinderException,
+                                  duckdb.CatalogException, duckdb.NotImplementedException))
+
+    def _row_class(self, columns: tuple):
+        Row = self._row_classes.get(columns)
+        if Row is None:
+            Row = self._row_classes[columns] = row_class(columns)
+        return Row
+
+    # === COPIA DE LAS TABLAS ===
+
+    def _schema_tokens(self) -> Dict[str, object]:
+        """Versión de la BD leída (`main`) y de cada BD adjunta, como `derived`"""
+        tokens = {'main': (self.pool.change_token, self.pool.data_token())}
+        for alias, path in dict(self.pool.attachments).items():
+            parts = [path]
+            for name in (path, path + '-wal'):
+                try:
+                    st = os.stat(name)
+                    parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+                except OSError:
+                    parts.append('-')
+            tokens[alias] = tuple(parts)
+        return tokens
+
+    def _prepare(self, query: str):
+        """Cursor del hilo actual si las tablas de la consulta ya están copiadas
+
+        Si falta alguna (o alguna columna) se encarga su copia y devuelve None.
+        """
+        with self._lock:
+            if self._db is None:
+                self._connect()
+            now = time.monotonic()
+            if now - self._last_check >= self.check_interval:
+                self._last_check = now
+                self._check_tokens()
+
+            tables = self._tables.get(query)
+            if tables is None:
+                tables = self._tables[query] = self._referenced_tables(query)
+            missing = []
+            for table, columns in tables:
+                if table in self._failed:
+                    raise RuntimeError(f"no se pudo copiar {table[0]}.{table[1]}")
+                loaded = self._loaded.get(table)
+                if loaded is None or not columns <= loaded:
+                    self._wanted.setdefault(table, set()).update(columns)
+                    missing.append(table)
+            if missing:
+                if not self.background:
+                    for table in missing:
+                        self._load(table)
+                else:
+                    self._pending.update(missing)
+                    self._load_async()
+                    return None
+            db = self._db
+
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = db.cursor()
+        return cursor
+
+    def _connect(self):
+        """BD DuckDB en memoria (llamar con el lock)"""
+        db = duckdb.connect(':memory:')
+        if self.threads:
+            db.execute(f"SET threads = {int(self.threads)}")
+        if self.memory_limit:
+            db.execute(f"SET memory_limit = '{self.memory_limit}'")
+        self._db = db
+        self._tokens = self._schema_tokens()
+
+    def _check_tokens(self):
+        """Vuelve a copiar en segundo plano las tablas de las BD que han cambiado (con el lock)"""
+        tokens = self._schema_tokens()
+        changed = {schema for schema, token in tokens.items() if self._tokens.get(schema) != token}
+        if not changed:
+            return
+        self._tokens = tokens
+        self._tables = {}
+        for schema in changed:
+            self._generations[schema] = self._generations.get(schema, 0) + 1
+        self._failed = {table for table in self._failed if table[0] not in changed}
+        stale = {table for table in self._loaded if table[0] in changed}
+        if stale:
+            for table in stale:
+                del self._loaded[table]
+            self.stats['refreshes'] += 1
+            logger.info(f"Datos cambiados en {', '.join(sorted(changed))}: "
+                        f"{len(stale)} tablas se vuelven a copiar a DuckDB")
+            if self.background:
+                self._pending.update(stale)
+                self._load_async()
+
+    def _load_async(self):
+        """Hilo que copia las tablas pendientes (con el lock)"""
+        if self._loading:
+            return
+        self._loading = True
+        threading.Thread(target=self._load_pending, name='duckdb-loader', daemon=True).start()
+
+    def _load_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._loading = False
+                    return
+                table = self._pending.pop()
+            try:
+                self._load(table)
+            except Exception as e:
+                logger.error(f"Error copiando {table[0]}.{table[1]} a DuckDB: {e}")
+                with self._lock:
+                    self._failed.add(table)
+
+    def _load(self, table: Tuple[str, str]):
+        """Copia una tabla con las columnas pedidas hasta ahora y la marca como lista
+
+        Si su BD cambia durante la copia, la tabla vuelve a quedar pendiente.
+        """
+        with self._lock:
+            columns = frozenset(self._wanted.get(table, ()))
+            generation = self._generations.get(table[0], 0)
+            db = self._db
+        self._load_table(db, *table, columns)
+        with self._lock:
+            if self._generations.get(table[0], 0) != generation:
+                self._pending.add(table)
+            else:
+                self._loaded[table] = columns
+
+    def _referenced_tables(self, query: str) -> List[Tuple[Tuple[str, str], frozenset]]:
+        """(esquema, tabla) de FROM / JOIN que existen en SQLite (no los alias de CTE)
+        con las columnas de cada una que aparecen en la consulta"""
+        schemas = {'main', *self.pool.attachments}
+        conn = self.pool.get_connection()
+        words = {word.lower() for word in re.findall(r'\w+', query)}
+        select_all = SELECT_ALL_PATTERN.search(query) is not None
+        tables = []
+        seen = set()
+        for schema, table in TABLE_PATTERN.findall(query):
+            schema = schema or 'main'
+            if schema not in schemas or (schema, table) in seen:
+                continue
+            seen.add((schema, table))
+            columns = self._table_columns(conn, schema, table)
+            if not columns:
+                continue
+            # Por nombre, sin analizar la consulta: puede sobrar alguna, nunca faltar
+            if not select_all:
+                columns = [(name, declared) for name, declared in columns
+                           if name.lower() in words or not re.fullmatch(r'\w+', name)]
+            tables.append(((schema, table), frozenset(name for name, _ in columns)))
+        return tables
+
+    @staticmethod
+    def _table_columns(conn, schema: str, table: str) -> List[Tuple[str, str]]:
+        """(nombre, tipo declarado) de las columnas, vacío si la tabla o vista no existe"""
+        # table_xinfo incluye las columnas generadas (hidden 2 y 3)
+        return [(row[1], row[2]) for row in conn.execute(f'PRAGMA {schema}.table_xinfo("{table}")')
+                if row[6] != 1]
+
+    def _load_table(self, db, schema: str, table: str, wanted: frozenset):
+        """Copia (o vuelve a copiar) una tabla de SQLite a DuckDB en bloques de LOAD_BATCH filas
+
+        Todo en una transacción con un cursor propio: las consultas de otros
+        hilos siguen viendo la copia anterior hasta que termina.
+        """
+        started = time.perf_counter()
+        conn = self.pool.get_connection()
+        available = self._table_columns(conn, schema, table)
+        columns = [(name, declared) for name, declared in available if name in wanted]
+        target = f'{schema}."{table}"'
+        # Las consultas cruzan por sp.rowid: se copia el de SQLite como columna
+        # (en DuckDB `rowid` es la posición de la fila en la copia)
+        if 'rowid' not in {name.lower() for name, _ in columns} and self._has_rowid(conn, target):
+            columns.insert(0, ('rowid', 'INTEGER'))
+        if not columns:
+            # Solo COUNT(*): basta una columna para tener las filas
+            columns = available[:1]
+        names = [name for name, _ in columns]
+
+        cursor = db.cursor()
+        try:
+            cursor.execute("BEGIN")
+            try:
+                if schema != 'main':
+                    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                cursor.execute(f"DROP TABLE IF EXISTS {target}")
+                cursor.execute(f"CREATE TABLE {target} ("
+                               + ", ".join(f'"{name}" {duckdb_type(declared)}' for name, declared in columns) + ")")
+                rows_cursor = conn.execute(f'SELECT {", ".join(f"[{name}]" for name in names)} FROM {target}')
+                while True:
+                    rows = rows_cursor.fetchmany(LOAD_BATCH)
+                    if not rows:
+                        break
+                    cursor.register('mwe_load_batch', pd.DataFrame(rows, columns=names, dtype=object))
+                    try:
+                        cursor.execute(f"INSERT INTO {target} SELECT * FROM mwe_load_batch")
+                    finally:
+                        cursor.unregister('mwe_load_batch')
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            cursor.close()
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['tables_loaded'] += 1
+            self.stats['load_s'] = round(self.stats['load_s'] + elapsed, 3)
+        logger.info(f"Tabla {schema}.{table} ({len(names)} columnas) copiada a DuckDB en {elapsed:.2f}s")
+
+    @staticmethod
+    def _has_rowid(conn, target: str) -> bool:
+        """False en las tablas WITHOUT ROWID y en las vistas"""
+        try:
+            conn.execute(f"SELECT rowid FROM {target} LIMIT 0")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'tables': sorted(f"{schema}.{table}" for schema, table in self._loaded),
+                'loading': sorted(f"{schema}.{table}" for schema, table in self._pending),
+                'unsupported_queries': len(self._unsupported)
+            }
+
+
+class AnalyticsEngine:
+    """Motor de las consultas de agregación de los análisis y estadísticas
+
+    Con `database.analytics.engine` en `auto` (por defecto) o `duckdb` y el
+    paquete duckdb instalado, las agregaciones se ejecutan en DuckDB; si no,
+    o con `sqlite`, en SQLite con el pool compartido. Los resultados se guardan en la caché de consultas
+    y las filas se leen igual que sqlite3.Row (por posición o por nombre).
+    """
+
+    ENGINES = ('auto', 'sqlite', 'duckdb')
+
+    def __init__(self, pool, config: dict = None):
+        self.pool = pool
+        self.config = config or {}
+        self.engine_config = self.config.get('database', {}).get('analytics', {})
+        self.preferred = self.engine_config.get('engine', 'auto')
+        if self.preferred not in self.ENGINES:
+            logger.warning(f"Motor analítico desconocido: {self.preferred}; se usa SQLite")
+            self.preferred = 'sqlite'
+
+        self.cache = get_query_cache(pool, self.config)
+        self.sqlite = SQLiteEngine(pool, self.cache)
+        self.duckdb = None
+        if self.preferred != 'sqlite':
+            if DUCKDB_AVAILABLE:
+                self.duckdb = DuckDBEngine(pool, self.engine_config, self.sqlite, self.cache)
+            elif self.preferred == 'duckdb':
+                logger.warning("DuckDB no disponible - los análisis se ejecutan en SQLite")
+        self.default = self.duckdb or self.sqlite
+
+    @property
+    def name(self) -> str:
+        return self.default.name
+
+    def query(self, query: str, params=()) -> List:
+        """Ejecuta una consulta de agregación en el motor activo"""
+        engine = _current_engine.get() or self.default
+        return engine.query(query, params)
+
+    # === BENCHMARK ===
+
+    def benchmark_engines(self) -> Dict:
+        """Motores disponibles sin caché (cada consulta se ejecuta de verdad)"""
+        sqlite_engine = SQLiteEngine(self.pool)
+        engines = {'sqlite': sqlite_engine}
+        if DUCKDB_AVAILABLE:
+            # Copia en el propio hilo: el benchmark mide DuckDB, no SQLite mientras copia
+            engines['duckdb'] = DuckDBEngine(self.pool, self.engine_config, sqlite_engine, background=False)
+        return engines
+
+    @contextmanager
+    def using(self, engine):
+        """Las consultas de este contexto (y de los hilos que lo copien) van a `engine`"""
+        token = _current_engine.set(engine)
+        try:
+            yield engine
+        finally:
+            _current_engine.reset(token)
+
+    def benchmark(self, cases: Dict[str, Callable[[], object]], repeat: int = 1) -> Dict:
+        """Tiempo de cada caso con cada motor y si ambos devuelven lo mismo
+
+        Cada motor se calienta con una primera ejecución (en DuckDB adjunta
+        la BD y descarta las consultas no soportadas) y se mide la mejor
+        de `repeat` ejecuciones siguientes.
+        """
+        engines = self.benchmark_engines()
+        results = {}
+        for name, run in cases.items():
+            timings = {}
+            outputs = {}
+            for engine_name, engine in engines.items():
+                with self.using(engine):
+                    try:
+                        fallbacks = engine.get_stats()['fallbacks'] if engine_name == 'duckdb' else 0
+                        outputs[engine_name] = run()
+                        best = None
+                        for _ in range(max(1, repeat)):
+                            started = time.perf_counter()
+                            run()
+                            elapsed = time.perf_counter() - started
+                            best = elapsed if best is None else min(best, elapsed)
+                        timings[engine_name] = {'ms': round(best * 1000, 1)}
+                        if engine_name == 'duckdb':
+                            timings[engine_name]['fallbacks'] = engine.get_stats()['fallbacks'] - fallbacks
+                    except Exception as e:
+                        logger.error(f"Error en benchmark {name} ({engine_name}): {e}")
+                        timings[engine_name] = {'error': str(e)}
+            values = list(outputs.values())
+            timings['same_result'] = all(value == values[0] for value in values[1:])
+            results[name] = timings
+
+        return {
+            'engines': list(engines),
+            'default_engine': self.name,
+            'duckdb_available': DUCKDB_AVAILABLE,
+            'repeat': max(1, repeat),
+            'results': results
+        }
+
+    def warm_up(self) -> Optional[float]:
+        """Importa DuckDB y pandas antes de la primera consulta de análisis
+
+        Devuelve los segundos empleados o None si se usa SQLite.
+        """
+        if self.duckdb is None:
+            return None
+        return load_modules(duckdb, pd)
+
+    def get_stats(self) -> Dict:
+        stats = {'engine': self.name, 'preferred': self.preferred, 'duckdb_available': DUCKDB_AVAILABLE}
+        if self.duckdb:
+            stats['duckdb'] = self.duckdb.get_stats()
+        return stats
+
+
+_engines: Dict[str, AnalyticsEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_analytics_engine(pool, config: dict = None) -> AnalyticsEngine:
+    """Motor analítico compartido por todos los managers que leen de la misma BD"""
+    with _engines_lock:
+        engine = _engines.get(pool.db_path)
+        if engine is None:
+            engine = AnalyticsEngine(pool, config)
+            _engines[pool.db_path] = engine
+        return engine
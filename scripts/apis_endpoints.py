@@ -15,7 +15,12 @@ import re
 logger = logging.getLogger(__name__)
 
 try:
+    from chart_cache import get_chart_cache
     from download_manager import DownloadManager
+    from index_advisor import record_statement
+    from lazy_import import get_lazy_stats
+    from pagination import CursorError, check_cursor_version, decode_cursor, encode_cursor, stream_json_list
+    from scrobble_sources import parse_users
 except ImportError as e:
     logger.error(f"Error importando módulos: {e}")
     raise
@@ -186,6 +191,16 @@ class APIEndpoints:
         except Exception as e:
             logger.error(f"Error programando borrado de ZIP: {e}")
     
+    def _dashboard_response(self, section: str, chart: str = None, extra: dict = None):
+        """Sección del snapshot de estadísticas con su antigüedad en la cabecera Age"""
+        data, age = self.db_manager.stats.get_dashboard_section(section, chart)
+        if extra:
+            data = {**data, **extra}
+        response = jsonify(data)
+        if age is not None:
+            response.headers['Age'] = str(int(age))
+        return response
+
     def setup_api_routes(self):
         """Configura todas las rutas de la API"""
         
@@ -253,14 +268,62 @@ class APIEndpoints:
             try:
                 if not self.db_manager:
                     return jsonify({'error': 'Base de datos no disponible', 'results': []}), 500
-                    
-                results = self.db_manager.search_artists(query, limit)
-                self.db_manager.add_recent_search(query)
-                return jsonify({'results': results, 'total': len(results)})
+                
+                index_version = self.db_manager.search_engine.index_version
+                try:
+                    cursor = decode_cursor(request.args.get('cursor'), {'q': query})
+                    check_cursor_version(cursor, index_version)
+                except CursorError as e:
+                    return jsonify({'error': str(e), 'results': []}), 400
+                
+                next_cursor = None
+                page = self.db_manager.search_engine.search_artists_page(
+                    query, limit, cursor['after'] if cursor else None
+                )
+                if page is not None:
+                    results, next_after = page
+                    if next_after:
+                        next_cursor = encode_cursor({'q': query, 'v': index_version, 'after': next_after})
+                elif cursor:
+                    return jsonify({'error': 'El cursor ha caducado', 'results': []}), 400
+                else:
+                    results = self.db_manager.search_artists(query, limit)
+                
+                if not cursor:
+                    self.db_manager.add_recent_search(query)
+                return jsonify({'results': results, 'total': len(results), 'next_cursor': next_cursor})
             except Exception as e:
                 logger.error(f"Error en búsqueda de artistas: {e}")
                 return jsonify({'error': str(e), 'results': []}), 500
         
+        @self.app.route('/api/suggest')
+        def api_suggest():
+            """Sugerencias de artistas y álbumes mientras se escribe (índice en memoria)"""
+            query = request.args.get('q', '')
+            suggest_type = request.args.get('type', 'all')
+            
+            try:
+                limit = int(request.args.get('limit', 10))
+                kinds = ('artist', 'album') if suggest_type == 'all' else (suggest_type,)
+                
+                started = time.perf_counter()
+                results = self.db_manager.typeahead.suggest(query, kinds, limit)
+                took_us = int((time.perf_counter() - started) * 1_000_000)
+                
+                if results is None:
+                    return jsonify({'error': 'Índice de sugerencias no disponible', 'artists': [], 'albums': []}), 503
+                
+                index_stats = self.db_manager.typeahead.get_stats()
+                return jsonify({
+                    'query': query,
+                    **results,
+                    'counts': {'artists': index_stats['artists'], 'albums': index_stats['albums']},
+                    'took_us': took_us
+                })
+            except Exception as e:
+                logger.error(f"Error en sugerencias: {e}")
+                return jsonify({'error': str(e), 'artists': [], 'albums': []}), 500
+        
         @self.app.route('/api/search/global')
         def api_search_global():
             """Búsqueda global en toda la base de datos"""
@@ -273,10 +336,31 @@ class APIEndpoints:
             try:
                 if not self.db_manager:
                     return jsonify({'error': 'Base de datos no disponible', 'results': {}}), 500
-                    
-                results = self.db_manager.search_global(query, limit)
-                self.db_manager.add_recent_search(query)
-                return jsonify({'results': results})
+                
+                index_version = self.db_manager.search_engine.index_version
+                try:
+                    cursor = decode_cursor(request.args.get('cursor'), {'q': query})
+                    check_cursor_version(cursor, index_version)
+                except CursorError as e:
+                    return jsonify({'error': str(e), 'results': {}}), 400
+                
+                # El cursor guarda la última clave de cada tipo que aún tiene resultados
+                next_cursor = None
+                page = self.db_manager.search_engine.search_global_page(
+                    query, limit, cursor['after'] if cursor else None
+                )
+                if page is not None:
+                    results, next_after = page
+                    if next_after:
+                        next_cursor = encode_cursor({'q': query, 'v': index_version, 'after': next_after})
+                elif cursor:
+                    return jsonify({'error': 'El cursor ha caducado', 'results': {}}), 400
+                else:
+                    results = self.db_manager.search_global(query, limit)
+                
+                if not cursor:
+                    self.db_manager.add_recent_search(query)
+                return jsonify({'results': results, 'next_cursor': next_cursor})
             except Exception as e:
                 logger.error(f"Error en búsqueda global: {e}")
                 return jsonify({'error': str(e), 'results': {}}), 500
@@ -317,14 +401,15 @@ class APIEndpoints:
         
         @self.app.route('/api/artists/popular')
         def api_get_popular_artists():
-            """Obtener artistas más populares"""
+            """Obtener artistas más populares (?order=trending para escuchas recientes)"""
             limit = min(int(request.args.get('limit', 20)), 50)
+            order = 'trending' if request.args.get('order') == 'trending' else 'plays'
             try:
                 if not self.db_manager:
                     return jsonify({'error': 'Base de datos no disponible'}), 500
                     
-                artists = self.db_manager.get_popular_artists(limit)
-                return jsonify({'artists': artists, 'total': len(artists)})
+                artists = self.db_manager.get_popular_artists(limit, order)
+                return jsonify({'artists': artists, 'total': len(artists), 'order': order})
             except Exception as e:
                 logger.error(f"Error obteniendo artistas populares: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -360,6 +445,22 @@ class APIEndpoints:
                 return jsonify({'error': str(e)}), 500
         
         # === CANCIONES ===
+        @self.app.route('/api/songs/popular')
+        def api_get_popular_songs():
+            """Canciones más escuchadas (?order=trending, ?artist=nombre)"""
+            limit = min(int(request.args.get('limit', 20)), 100)
+            order = 'trending' if request.args.get('order') == 'trending' else 'plays'
+            artist_name = request.args.get('artist', '').strip() or None
+            try:
+                if not self.db_manager:
+                    return jsonify({'error': 'Base de datos no disponible'}), 500
+                
+                tracks = self.db_manager.get_popular_tracks(limit, order, artist_name)
+                return jsonify({'tracks': tracks, 'total': len(tracks), 'order': order})
+            except Exception as e:
+                logger.error(f"Error obteniendo canciones populares: {e}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/api/songs/<int:song_id>')
         def api_get_song(song_id):
             """Obtener información de una canción"""
@@ -1280,6 +1381,16 @@ class APIEndpoints:
                 db_info = self.db_manager.get_database_info()
                 return jsonify({
                     'database': db_info,
+                    'pool': self.db_manager.pool.get_stats(),
+                    'replica': self.db_manager.replica.get_status(),
+                    'derived': self.db_manager.derived.get_status(),
+                    'query_cache': self.db_manager.query_cache.get_stats(),
+                    'recent_searches': self.db_manager.recent_searches.get_stats(),
+                    'columnar': self.db_manager.columnar.get_stats(),
+                    'charts': get_chart_cache(self.config).get_stats(),
+                    'stats_dashboard': self.db_manager.stats.get_dashboard_stats(),
+                    'lazy_modules': get_lazy_stats(),
+                    'json': self.app.json.get_stats() if hasattr(self.app.json, 'get_stats') else None,
                     'config': {
                         'music_root': self.config.get('paths', {}).get('music_root'),
                         'downloads': self.config.get('paths', {}).get('downloads'),
@@ -1297,36 +1408,7 @@ class APIEndpoints:
         def api_stats_overview():
             """Resumen general de estadísticas"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                overview = stats_manager.get_system_overview()
-                return jsonify(overview)
-            except ImportError as e:
-                logger.warning(f"StatsManager no disponible: {e}")
-                # Fallback básico si stats_manager no está disponible
-                if not self.db_manager:
-                    return jsonify({'error': 'Base de datos no disponible'}), 500
-                
-                try:
-                    db_info = self.db_manager.get_database_info()
-                    overview = {
-                        'database': {
-                            'size_mb': 0,  # Placeholder
-                            'total_tables': len(db_info.get('tables', {})),
-                            'last_updated': 'N/A'
-                        },
-                        'content': {
-                            'total_artists': db_info.get('tables', {}).get('artists', {}).get('count', 0),
-                            'total_albums': db_info.get('tables', {}).get('albums', {}).get('count', 0),
-                            'total_songs': db_info.get('tables', {}).get('songs', {}).get('count', 0),
-                            'total_duration_hours': 0  # Placeholder
-                        },
-                        'completeness': 75  # Placeholder
-                    }
-                    return jsonify(overview)
-                except Exception as fallback_error:
-                    logger.error(f"Error en fallback de estadísticas: {fallback_error}")
-                    return jsonify({'error': 'Error obteniendo estadísticas'}), 500
+                return self._dashboard_response('overview')
             except Exception as e:
                 logger.error(f"Error obteniendo resumen de estadísticas: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1335,22 +1417,72 @@ class APIEndpoints:
         def api_stats_database():
             """Información detallada de la base de datos"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                db_info = stats_manager.get_database_info()
-                return jsonify(db_info)
+                index_advisor = self.db_manager.index_advisor.get_report(
+                    refresh=request.args.get('refresh_plans', 'false').lower() == 'true'
+                )
+                return self._dashboard_response('database', extra={'index_advisor': index_advisor})
             except Exception as e:
                 logger.error(f"Error obteniendo info de base de datos: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/stats/cache')
+        def api_stats_cache():
+            """Métricas de la caché de consultas (aciertos, fallos, desalojos)"""
+            try:
+                return jsonify(self.db_manager.query_cache.get_stats())
+            except Exception as e:
+                logger.error(f"Error obteniendo estadísticas de caché de consultas: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/stats/cache/clear', methods=['POST'])
+        def api_stats_cache_clear():
+            """Vacía la caché de consultas"""
+            try:
+                self.db_manager.query_cache.clear()
+                return jsonify({'success': True, 'message': 'Caché de consultas vaciada'})
+            except Exception as e:
+                logger.error(f"Error vaciando caché de consultas: {e}")
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/stats/chart-cache')
+        def api_stats_chart_cache():
+            """Métricas de la caché de gráficos de Plotly (aciertos, desalojos, tamaño)"""
+            try:
+                return jsonify(get_chart_cache(self.config).get_stats())
+            except Exception as e:
+                logger.error(f"Error obteniendo estadísticas de caché de gráficos: {e}")
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/stats/analytics')
+        def api_stats_analytics():
+            """Motor analítico activo (SQLite / DuckDB) y consultas derivadas a SQLite"""
+            try:
+                return jsonify(self.db_manager.analytics.get_stats())
+            except Exception as e:
+                logger.error(f"Error obteniendo estado del motor analítico: {e}")
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/stats/benchmark')
+        def api_stats_benchmark():
+            """Compara los motores analíticos en las estadísticas de la biblioteca (?repeat=)"""
+            try:
+                stats_manager = self.db_manager.stats
+                repeat = min(max(request.args.get('repeat', 1, type=int), 1), 10)
+                cases = {
+                    'artists': stats_manager.get_artists_stats,
+                    'albums': stats_manager.get_albums_stats,
+                    'songs': stats_manager.get_songs_stats
+                }
+                return jsonify(self.db_manager.analytics.benchmark(cases, repeat))
+            except Exception as e:
+                logger.error(f"Error en benchmark de estadísticas: {e}")
+                return jsonify({'error': str(e)}), 500
+
         @self.app.route('/api/stats/artists')
         def api_stats_artists():
             """Estadísticas de artistas"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                artists_stats = stats_manager.get_artists_stats()
-                return jsonify(artists_stats)
+                return self._dashboard_response('artists')
             except Exception as e:
                 logger.error(f"Error obteniendo estadísticas de artistas: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1359,10 +1491,7 @@ class APIEndpoints:
         def api_stats_albums():
             """Estadísticas de álbumes"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                albums_stats = stats_manager.get_albums_stats()
-                return jsonify(albums_stats)
+                return self._dashboard_response('albums')
             except Exception as e:
                 logger.error(f"Error obteniendo estadísticas de álbumes: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1371,10 +1500,7 @@ class APIEndpoints:
         def api_stats_songs():
             """Estadísticas de canciones"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                songs_stats = stats_manager.get_songs_stats()
-                return jsonify(songs_stats)
+                return self._dashboard_response('songs')
             except Exception as e:
                 logger.error(f"Error obteniendo estadísticas de canciones: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1383,10 +1509,7 @@ class APIEndpoints:
         def api_stats_missing_data():
             """Análisis de datos faltantes"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                missing_stats = stats_manager.get_missing_data_stats()
-                return jsonify(missing_stats)
+                return self._dashboard_response('missing_data')
             except Exception as e:
                 logger.error(f"Error analizando datos faltantes: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1395,10 +1518,7 @@ class APIEndpoints:
         def api_stats_charts(category, chart_type):
             """Gráficos estadísticos específicos"""
             try:
-                from stats_manager import StatsManager
-                stats_manager = StatsManager(self.db_manager.db_path, self.config)
-                chart_data = stats_manager.get_chart_data_for_frontend(chart_type, category)
-                return jsonify(chart_data)
+                return self._dashboard_response('charts', f"{category}/{chart_type}")
             except Exception as e:
                 logger.error(f"Error generando gráfico {category}/{chart_type}: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1555,48 +1675,120 @@ class APIEndpoints:
 
         @self.app.route('/api/artists/list')
         def api_get_artists_list():
-            """Lista todos los artistas para el selector - VERSIÓN MEJORADA"""
+            """Lista todos los artistas para el selector - VERSIÓN MEJORADA
+
+            Paginada por clave (name, id): la respuesta incluye `next_cursor`
+            para pedir la página siguiente con `?cursor=`. Con `?stream=1` la
+            lista se escribe a medida que se lee de SQLite.
+            """
             try:
                 limit = min(int(request.args.get('limit', 5000)), 10000)  # Aumentar límite
                 search = request.args.get('search', '').strip()
+                stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
                 
                 logger.info(f"Solicitando lista de artistas: limit={limit}, search='{search}'")
                 
                 if not self.db_manager:
                     return jsonify({'error': 'Base de datos no disponible'}), 500
                 
-                # Consulta base
+                index_version = self.db_manager.search_engine.index_version
+                try:
+                    cursor = decode_cursor(request.args.get('cursor'), {'search': search})
+                    if cursor and cursor.get('src') == 'search_index':
+                        check_cursor_version(cursor, index_version)
+                except CursorError as e:
+                    return jsonify({'error': str(e), 'artists': [], 'total': 0}), 400
+                
+                # Con búsqueda se usa el índice unificado (sin LIKE '%...%')
+                source = cursor['src'] if cursor else ('search_index' if search else 'sql')
+                indexed = None
+                if search and source == 'search_index':
+                    indexed = self.db_manager.search_engine.artist_names_page(
+                        search, limit, cursor['after'] if cursor else None
+                    )
+                    if indexed is None:
+                        if cursor:
+                            return jsonify({'error': 'El cursor ha caducado', 'artists': [], 'total': 0}), 400
+                        source = 'sql'
+                
+                def make_cursor(after):
+                    if not after:
+                        return None
+                    data = {'search': search, 'src': source, 'after': after}
+                    if source == 'search_index':
+                        data['v'] = index_version
+                    return encode_cursor(data)
+                
+                if indexed is not None:
+                    artists, next_after = indexed
+                    debug = {
+                        'raw_rows': len(artists),
+                        'processed': len(artists),
+                        'search_term': search,
+                        'limit_used': limit,
+                        'source': 'search_index'
+                    }
+                    if stream:
+                        return stream_json_list('artists', artists, tail_fn=lambda count, last: {
+                            'total': count, 'next_cursor': make_cursor(next_after), 'debug': debug
+                        })
+                    return jsonify({
+                        'artists': artists,
+                        'total': len(artists),
+                        'next_cursor': make_cursor(next_after),
+                        'debug': debug
+                    })
+                
+                # Consulta base con paginación por clave (name, id)
+                conditions = ["name IS NOT NULL", "name != ''"]
+                params = []
                 if search:
                     # Si hay búsqueda, filtrar
-                    query = """
-                        SELECT id, name
-                        FROM artists 
-                        WHERE name IS NOT NULL 
-                        AND name != '' 
-                        AND name LIKE ?
-                        ORDER BY name
-                        LIMIT ?
-                    """
-                    params = (f"%{search}%", limit)
-                else:
-                    # Sin búsqueda, todos los artistas
-                    query = """
-                        SELECT id, name
-                        FROM artists 
-                        WHERE name IS NOT NULL AND name != ''
-                        ORDER BY name
-                        LIMIT ?
-                    """
-                    params = (limit,)
+                    conditions.append("name LIKE ?")
+                    params.append(f"%{search}%")
+                if cursor:
+                    conditions.append("(name, id) > (?, ?)")
+                    params.extend(cursor['after'])
+                query = f"""
+                    SELECT id, name
+                    FROM artists 
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY name, id
+                    LIMIT ?
+                """
+                # Una fila más para saber si hay página siguiente
+                params.append(limit + 1)
                 
                 logger.debug(f"Ejecutando consulta: {query}")
                 logger.debug(f"Parámetros: {params}")
                 
-                rows = self.db_manager.execute_query(query, params)
+                page_state = {'next_after': None}
+                
+                def iter_artists():
+                    record_statement(query, tuple(params))
+                    conn = self.db_manager.get_connection()
+                    last = None
+                    for position, row in enumerate(conn.execute(query, params)):
+                        if position == limit:
+                            # Con limit=0 no hay última fila: página vacía sin cursor
+                            if last is not None:
+                                page_state['next_after'] = [last['name'], last['id']]
+                            break
+                        last = {'id': row['id'], 'name': row['name']}
+                        yield last
+                
+                if stream:
+                    return stream_json_list('artists', iter_artists(), tail_fn=lambda count, last: {
+                        'total': count,
+                        'next_cursor': make_cursor(page_state['next_after']),
+                        'debug': {'search_term': search, 'limit_used': limit, 'source': 'sql'}
+                    })
+                
+                artists = list(iter_artists())
                 
-                logger.info(f"Encontrados {len(rows)} artistas en la consulta")
+                logger.info(f"Encontrados {len(artists)} artistas en la consulta")
                 
-                if not rows:
+                if not artists and not cursor:
                     # Diagnóstico si no hay resultados
                     count_query = "SELECT COUNT(*) as total FROM artists WHERE name IS NOT NULL AND name != ''"
                     count_result = self.db_manager.execute_query(count_query)
@@ -1607,6 +1799,7 @@ class APIEndpoints:
                     return jsonify({
                         'artists': [],
                         'total': 0,
+                        'next_cursor': None,
                         'debug': {
                             'total_in_db': total_count,
                             'search_term': search,
@@ -1614,25 +1807,14 @@ class APIEndpoints:
                         }
                     })
                 
-                artists = []
-                for row in rows:
-                    try:
-                        artist = {
-                            'id': row['id'],
-                            'name': row['name']
-                        }
-                        artists.append(artist)
-                    except Exception as e:
-                        logger.warning(f"Error procesando artista: {e}")
-                        continue
-                
                 logger.info(f"Devolviendo {len(artists)} artistas procesados")
                 
                 return jsonify({
                     'artists': artists, 
                     'total': len(artists),
+                    'next_cursor': make_cursor(page_state['next_after']),
                     'debug': {
-                        'raw_rows': len(rows),
+                        'raw_rows': len(artists),
                         'processed': len(artists),
                         'search_term': search,
                         'limit_used': limit
@@ -1673,7 +1855,8 @@ class APIEndpoints:
                 elif analysis_type == 'discografia':
                     return jsonify(self._get_discography_analysis_simple(artist_id))
                 elif analysis_type == 'escuchas':
-                    return jsonify(self._get_listens_analysis_simple(artist_id))
+                    return jsonify(self._get_listens_analysis_simple(
+                        artist_id, parse_users(request.args.getlist('user'))))
                 elif analysis_type == 'colaboradores':
                     return jsonify(self._get_collaborators_analysis_simple(artist_id))
                 elif analysis_type == 'feeds':
@@ -2456,8 +2639,7 @@ class APIEndpoints:
                     continue
             
             # Crear gráficos usando stats_manager
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             decades_chart_data = [{'decade': d, 'count': c} for d, c in decades_data.items()]
             
@@ -2488,8 +2670,9 @@ class APIEndpoints:
         """Análisis de conciertos simplificado - CORREGIDO PARA RENDERIZACIÓN"""
         try:
             # Conciertos por año
-            concerts_query = """
-                SELECT substr(eventDate, 1, 4) as year, COUNT(*) as concerts
+            year = self.db_manager.time_column('artists_setlistfm', 'year') or "substr(eventDate, 1, 4)"
+            concerts_query = f"""
+                SELECT {year} as year, COUNT(*) as concerts
                 FROM artists_setlistfm 
                 WHERE artist_id = ? AND eventDate IS NOT NULL AND eventDate != ''
                 GROUP BY year
@@ -2574,8 +2757,7 @@ class APIEndpoints:
             """
             last_concert = self.db_manager.execute_query(last_concert_query, (artist_id,))
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -2683,8 +2865,7 @@ class APIEndpoints:
             discogs_styles_data = [{'style': s, 'count': c} for s, c in discogs_styles.most_common(10)]
             lastfm_tags_data = [{'tag': t, 'count': c} for t, c in lastfm_tags.most_common(10)]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'album_genres': stats_manager.create_chart('pie', album_genres_data, 'Géneros de Álbumes', 'genre', 'count'),
@@ -2782,8 +2963,7 @@ class APIEndpoints:
             else:
                 timeline_data = []
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -2859,8 +3039,7 @@ class APIEndpoints:
             types_data = [{'type': t, 'count': c} for t, c in types_count.most_common(10)]
             collection_chart_data = [{'status': s, 'count': c} for s, c in collection_data.items()]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'formats': stats_manager.create_chart('pie', formats_data, 'Distribución por Formato', 'format', 'count'),
@@ -2881,72 +3060,37 @@ class APIEndpoints:
             logger.error(f"Error en análisis de discografía: {e}")
             return {'error': str(e)}
 
-    def _get_listens_analysis_simple(self, artist_id):
-        """Análisis de escuchas simplificado"""
+    def _get_listens_analysis_simple(self, artist_id, users=None):
+        """Análisis de escuchas simplificado (usuarios por defecto o los de ?user=)"""
         try:
-            # Escuchas de Last.fm
-            lastfm_query = """
-                SELECT track_name, scrobble_date, COUNT(*) as plays
-                FROM scrobbles_paqueradejere 
-                WHERE artist_id = ?
-                GROUP BY track_name, DATE(scrobble_date)
-                ORDER BY scrobble_date
-            """
-            lastfm_data = self.db_manager.execute_query(lastfm_query, (artist_id,))
+            from collections import Counter
             
-            # Escuchas de ListenBrainz
-            listenbrainz_query = """
-                SELECT track_name, listen_date, COUNT(*) as plays
-                FROM listens_guevifrito 
-                WHERE artist_id = ?
-                GROUP BY track_name, DATE(listen_date)
-                ORDER BY listen_date
-            """
-            listenbrainz_data = self.db_manager.execute_query(listenbrainz_query, (artist_id,))
+            sources = self.db_manager.scrobble_sources
             
-            if not lastfm_data and not listenbrainz_data:
-                return {'error': 'No se encontraron datos de escuchas para este artista'}
+            def listen_counts(source):
+                tracks, monthly = self.db_manager.get_listen_counts(
+                    source['table'], source['date_column'], artist_id)
+                return {'tracks': Counter(tracks), 'monthly': Counter(monthly)}
             
-            # Procesar datos - simplificado para evitar complejidad
-            from collections import defaultdict
+            # Escuchas por canción y por mes de Last.fm y ListenBrainz (sumadas entre usuarios)
+            lastfm = sources.sum_by(sources.resolve(users, 'lastfm'), listen_counts) or {}
+            listenbrainz = sources.sum_by(sources.resolve(users, 'listenbrainz'), listen_counts) or {}
+            lastfm_tracks = lastfm.get('tracks', Counter())
+            lastfm_monthly = lastfm.get('monthly', Counter())
+            listenbrainz_tracks = listenbrainz.get('tracks', Counter())
+            listenbrainz_monthly = listenbrainz.get('monthly', Counter())
             
-            # Last.fm por canciones (top 10)
-            lastfm_tracks = defaultdict(int)
-            for row in lastfm_data:
-                lastfm_tracks[row['track_name']] += row['plays']
+            if not lastfm_tracks and not listenbrainz_tracks:
+                return {'error': 'No se encontraron datos de escuchas para este artista'}
             
+            # Top 10 canciones y escuchas por mes
             lastfm_tracks_data = [{'track': t, 'plays': p} for t, p in sorted(lastfm_tracks.items(), key=lambda x: x[1], reverse=True)[:10]]
-            
-            # ListenBrainz por canciones (top 10)
-            listenbrainz_tracks = defaultdict(int)
-            for row in listenbrainz_data:
-                listenbrainz_tracks[row['track_name']] += row['plays']
-            
             listenbrainz_tracks_data = [{'track': t, 'plays': p} for t, p in sorted(listenbrainz_tracks.items(), key=lambda x: x[1], reverse=True)[:10]]
             
-            # Datos acumulativos por mes (simplificado)
-            lastfm_monthly = defaultdict(int)
-            for row in lastfm_data:
-                try:
-                    month = row['scrobble_date'][:7]  # YYYY-MM
-                    lastfm_monthly[month] += row['plays']
-                except:
-                    pass
-            
             lastfm_cumulative_data = [{'month': m, 'plays': p} for m, p in sorted(lastfm_monthly.items())]
-            
-            listenbrainz_monthly = defaultdict(int)
-            for row in listenbrainz_data:
-                try:
-                    month = row['listen_date'][:7]  # YYYY-MM
-                    listenbrainz_monthly[month] += row['plays']
-                except:
-                    pass
-            
             listenbrainz_cumulative_data = [{'month': m, 'plays': p} for m, p in sorted(listenbrainz_monthly.items())]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'lastfm_tracks': stats_manager.create_chart('bar', lastfm_tracks_data, 'Top Canciones Last.fm', 'track', 'plays'),
@@ -3090,8 +3234,7 @@ class APIEndpoints:
             engineers_data = [{'engineer': e, 'count': c} for e, c in engineers.most_common(10)]
             collaborators_data = [{'collaborator': c, 'count': count} for c, count in collaborators.most_common(15)]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -3166,8 +3309,7 @@ class APIEndpoints:
             sources_data = [{'source': s, 'count': c} for s, c in sources.most_common(10)]
             activity_data = [{'month': m, 'count': c} for m, c in sorted(monthly_activity.items())]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'feeds_sources': stats_manager.create_chart('pie', sources_data, 'Feeds por Publicación', 'source', 'count'),
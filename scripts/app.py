@@ -2,10 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import argparse
+import threading
+
+# --profile-startup: las importaciones se miden desde aquí (Flask y módulos locales incluidos)
+from startup_profile import StartupProfiler
+startup_profiler = StartupProfiler.start() if __name__ == '__main__' and '--profile-startup' in sys.argv else None
+
 import yaml
 import logging
 from flask import Flask, render_template, request, jsonify, send_file, redirect
 from werkzeug.exceptions import NotFound
+from werkzeug.serving import make_server
 import configparser
 
 
@@ -25,6 +34,9 @@ try:
     from template_routes import TemplateRoutes
     from album_analysis_endpoint import AlbumAnalysisEndpoints
     from scrobbles_analysis_endpoint import ScrobblesAnalysisEndpoints
+    from batch_endpoint import BatchEndpoints
+    from fast_json import FastJSONProvider
+    from stats_manager import warm_up_charts
 except ImportError as e:
     logger.error(f"Error importando módulos: {e}")
     raise
@@ -34,13 +46,24 @@ except ImportError as e:
 class MusicWebExplorer:
     """Aplicación principal de Music Web Explorer"""
     
-    def __init__(self, config_path='config.yml'):
+    def __init__(self, config_path='config.yml', profiler: StartupProfiler = None):
+        self.profiler = profiler
         self.app = Flask(__name__)
+        # Serialización con orjson/msgspec si están instalados (y RowSet sin dicts intermedios)
+        self.app.json = FastJSONProvider(self.app)
         self.config = self.load_config(config_path)
         self.setup_logging()
         
         # Inicializar componentes
         self.db_manager = DatabaseManager(self.config)
+        # Réplica local opcional: debe activarse antes de que nadie lea la BD
+        self.db_manager.replica.start()
+        self.db_manager.index_advisor.start(replica_active=self.db_manager.replica.current_path is not None)
+        self.db_manager.derived.start()
+        self.db_manager.typeahead.start()
+        self.db_manager.columnar.start()
+        self.db_manager.recent_searches.start()
+        self.db_manager.stats.start()
         self.img_manager = ImageManager(self.config)
         self.telegram_notifier = self.create_telegram_notifier()
         self.template_routes = TemplateRoutes(self.app, self.config)
@@ -50,6 +73,7 @@ class MusicWebExplorer:
             self.config
         )
         self.scrobbles_endpoints = ScrobblesAnalysisEndpoints(self.app, self.db_manager, self.config)
+        self.batch_endpoints = BatchEndpoints(self.app, self.db_manager, self.config)
 
         # Configurar rutas
         self.setup_routes()
@@ -63,6 +87,9 @@ class MusicWebExplorer:
             self.config
         )
         
+        if self.profiler:
+            self.setup_startup_profile()
+        
         logger.info("Music Web Explorer inicializado correctamente")
     
     def load_config(self, config_path):
@@ -197,6 +224,41 @@ class MusicWebExplorer:
                                  error_code=500, 
                                  error_message="Error interno del servidor"), 500
     
+    def setup_startup_profile(self):
+        """Informe de arranque al servir la primera petición (--profile-startup)"""
+        self.profiler.mark('init')
+        
+        @self.app.after_request
+        def profile_first_request(response):
+            self.profiler.request_served(request.path)
+            return response
+    
+    def start_warmup(self):
+        """Carga en segundo plano las librerías pesadas que se importan bajo demanda
+
+        pandas / Plotly (gráficos con charts.format: plotly) y DuckDB (motor
+        analítico); sin esto las paga la primera petición que las usa.
+        """
+        if not self.config.get('app', {}).get('warmup', True):
+            return
+        
+        def warm_up():
+            steps = {
+                'charts': lambda: warm_up_charts(self.config),
+                'analytics': self.db_manager.analytics.warm_up
+            }
+            for name, step in steps.items():
+                try:
+                    elapsed = step()
+                    if elapsed is not None:
+                        logger.info(f"Calentamiento {name}: {elapsed:.3f}s")
+                except Exception as e:
+                    logger.error(f"Error en calentamiento {name}: {e}")
+            if self.profiler:
+                self.profiler.mark('warmup')
+        
+        threading.Thread(target=warm_up, name='warmup', daemon=True).start()
+    
     def run(self):
         """Ejecuta la aplicación"""
         app_config = self.config.get('app', {})
@@ -206,20 +268,37 @@ class MusicWebExplorer:
         
         logger.info(f"Iniciando servidor en {host}:{port} (debug={debug})")
         
-        self.app.run(
-            host=host,
-            port=port,
-            debug=debug,
-            threaded=True
-        )
+        if debug:
+            # Recargador y depurador de Werkzeug (sin calentamiento)
+            self.app.run(
+                host=host,
+                port=port,
+                debug=debug,
+                threaded=True
+            )
+            return
+        
+        # make_server abre el socket: el calentamiento empieza con el puerto ya escuchando
+        server = make_server(host, port, self.app, threaded=True)
+        if self.profiler:
+            self.profiler.mark('bind')
+        self.start_warmup()
+        server.serve_forever()
 
 def create_app():
     """Factory function para crear la aplicación"""
     return MusicWebExplorer().app
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Music Web Explorer')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='registra el tiempo de importación por módulo y hasta la primera petición servida')
+    parser.parse_args()
+    
     try:
-        app_instance = MusicWebExplorer()
+        if startup_profiler:
+            startup_profiler.mark('imports')
+        app_instance = MusicWebExplorer(profiler=startup_profiler)
         app_instance.run()
     except KeyboardInterrupt:
         logger.info("Aplicación terminada por el usuario")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+
+class BatchEndpoints:
+    """Endpoint que resuelve varios recursos en una sola petición
+
+    Las páginas de artista y álbum necesitaban 2 peticiones de datos más una
+    por carátula. POST /api/batch recibe la lista de recursos y los resuelve
+    en el mismo hilo, por lo que todas las consultas usan la misma conexión
+    del pool, y devuelve un único documento JSON.
+
+    Cuerpo de la petición:
+        {"requests": [{"key": "artist", "type": "artist", "id": 5},
+                      {"key": "albums", "type": "artist_albums", "id": 5}]}
+    """
+
+    def __init__(self, app, db_manager, config):
+        self.app = app
+        self.db_manager = db_manager
+        self.config = config
+        self.max_requests = config.get('batch', {}).get('max_requests', 50)
+
+        self.resolvers = {
+            'artist': self._resolve_artist,
+            'artist_albums': self._resolve_artist_albums,
+            'album': self._resolve_album,
+            'album_tracks': self._resolve_album_tracks,
+            'images': self._resolve_images
+        }
+        self.setup_batch_routes()
+
+    def setup_batch_routes(self):
+        """Configura la ruta del endpoint por lotes"""
+
+        @self.app.route('/api/batch', methods=['POST'])
+        def api_batch():
+            """Resuelve una lista de recursos en una sola respuesta"""
+            started = time.perf_counter()
+            try:
+                if not self.db_manager:
+                    return jsonify({'error': 'Base de datos no disponible', 'results': {}}), 500
+
+                payload = request.get_json(silent=True) or {}
+                items = payload.get('requests')
+                if not isinstance(items, list) or not items:
+                    return jsonify({'error': 'Se esperaba una lista "requests"', 'results': {}}), 400
+                if len(items) > self.max_requests:
+                    return jsonify({
+                        'error': f'Demasiados recursos en el lote (máximo {self.max_requests})',
+                        'results': {}
+                    }), 400
+
+                results = {}
+                for position, item in enumerate(items):
+                    if not isinstance(item, dict):
+                        results[str(position)] = {'status': 400, 'error': 'Recurso inválido'}
+                        continue
+                    key = str(item.get('key', position))
+                    results[key] = self._resolve(item)
+
+                return jsonify({
+                    'results': results,
+                    'took_ms': round((time.perf_counter() - started) * 1000, 2)
+                })
+
+            except Exception as e:
+                logger.error(f"Error en petición por lotes: {e}")
+                return jsonify({'error': str(e), 'results': {}}), 500
+
+    def _resolve(self, item: dict) -> dict:
+        """Resuelve un recurso; los errores se devuelven en su entrada sin romper el lote"""
+        resource_type = item.get('type')
+        resolver = self.resolvers.get(resource_type)
+        if not resolver:
+            return {'status': 400, 'error': f'Tipo de recurso no soportado: {resource_type}'}
+
+        try:
+            return resolver(item)
+        except (TypeError, ValueError):
+            return {'status': 400, 'error': 'Identificador inválido'}
+        except Exception as e:
+            logger.error(f"Error resolviendo recurso {resource_type} en lote: {e}")
+            return {'status': 500, 'error': str(e)}
+
+    # === RECURSOS ===
+
+    @staticmethod
+    def _artist_image_url(artist_id) -> str:
+        return f"/api/images/artist/{artist_id}"
+
+    @staticmethod
+    def _album_image_url(album_id) -> str:
+        return f"/api/images/album/{album_id}"
+
+    def _resolve_artist(self, item: dict) -> dict:
+        artist_id = int(item.get('id'))
+        artist = self.db_manager.get_artist_by_id(artist_id)
+        if not artist:
+            return {'status': 404, 'error': 'Artista no encontrado'}
+        artist['image_url'] = self._artist_image_url(artist_id)
+        return {'status': 200, 'artist': artist}
+
+    def _resolve_artist_albums(self, item: dict) -> dict:
+        artist_id = int(item.get('id'))
+        albums = self.db_manager.get_artist_albums_by_id(artist_id)
+        # Lista vacía: 404 si el artista no existe, igual que /api/artists/<id>/albums
+        if not albums and not self.db_manager.get_artist_by_id(artist_id):
+            return {'status': 404, 'error': 'Artista no encontrado'}
+        if albums:
+            id_position = albums.columns.index('id')
+            albums = albums.with_column('image_url', lambda row: self._album_image_url(row[id_position]))
+        return {'status': 200, 'albums': albums, 'total': len(albums)}
+
+    def _resolve_album(self, item: dict) -> dict:
+        album_id = int(item.get('id'))
+        album = self.db_manager.get_album_by_id(album_id)
+        if not album:
+            return {'status': 404, 'error': 'Álbum no encontrado'}
+        album['image_url'] = self._album_image_url(album_id)
+        return {'status': 200, 'album': album}
+
+    def _resolve_album_tracks(self, item: dict) -> dict:
+        album_id = int(item.get('id'))
+        tracks = self.db_manager.get_album_tracks_by_id(album_id)
+        return {'status': 200, 'tracks': tracks, 'total': len(tracks)}
+
+    def _resolve_images(self, item: dict) -> dict:
+        """URLs de imagen para una lista de ids ('artist' o 'album')"""
+        entity = item.get('entity', 'album')
+        if entity not in ('artist', 'album'):
+            return {'status': 400, 'error': f'Entidad de imagen no soportada: {entity}'}
+        url_for = self._artist_image_url if entity == 'artist' else self._album_image_url
+        ids = [int(entity_id) for entity_id in item.get('ids', [])]
+        return {'status': 200, 'urls': {str(entity_id): url_for(entity_id) for entity_id in ids}}
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def chart_key(chart_type: str, title: str, x_field: Optional[str], y_field: Optional[str],
+              data: List[Dict]) -> Tuple:
+    """Clave de un gráfico: tipo, título, campos y hash de los datos
+
+    El orden de las claves de cada fila se respeta: sin `x_field` / `y_field`
+    los ejes salen de las primeras columnas del DataFrame.
+    """
+    payload = json.dumps(data, default=str, ensure_ascii=False, separators=(',', ':'))
+    digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    return (chart_type, title, x_field, y_field, digest)
+
+
+class ChartCache:
+    """Caché LRU del JSON de las figuras de Plotly
+
+    Con los mismos datos la figura es la misma, así que no hace falta
+    invalidarla al cambiar la BD: los datos nuevos dan otra clave y las
+    entradas viejas salen por LRU. Se limita por número de entradas y por
+    tamaño total del JSON guardado.
+    """
+
+    def __init__(self, config: dict = None):
+        cache_config = (config or {}).get('charts', {}).get('cache', {})
+
+        self.enabled = cache_config.get('enabled', True)
+        self.max_entries = cache_config.get('max_entries', 256)
+        self.max_bytes = cache_config.get('max_bytes', 64 * 1024 * 1024)
+
+        self._entries: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """JSON de la figura guardada o None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            chart = self._entries.get(key)
+            if chart is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return chart
+
+    def set(self, key: Hashable, chart: str):
+        if not self.enabled or len(chart) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = chart
+            self._bytes += len(chart)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+            size = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0,
+            **stats
+        }
+
+
+_cache: Optional[ChartCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_chart_cache(config: dict = None) -> ChartCache:
+    """Caché de gráficos del proceso (compartida por los StatsManager de cada BD)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChartCache(config)
+            logger.info(f"Caché de gráficos: {'activa' if _cache.enabled else 'desactivada'} "
+                        f"({_cache.max_entries} entradas)")
+        return _cache
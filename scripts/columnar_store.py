@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from derived_store import row_hash, rows_hash
+
+logger = logging.getLogger(__name__)
+
+# NumPy es opcional: sin él los análisis siguen usando SQL
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Marca de fecha ausente en `ts`
+NO_DATE = -(2 ** 62)
+
+WEEKDAY_NAMES = ('Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado')
+
+# Columnas cargadas (además de la fecha) que forman la huella de cada tabla
+HASHED_COLUMNS = ['artist_name', 'track_name', 'artist_id']
+
+# Tablas de escuchas por defecto → columna de fecha
+DEFAULT_TABLES = {
+    'scrobbles_paqueradejere': 'scrobble_date',
+    'listens_guevifrito': 'listen_date'
+}
+
+
+class _Interner:
+    """Asigna un entero a cada texto (solo crece: los ids antiguos siguen siendo válidos)"""
+
+    __slots__ = ('values', 'index')
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.index: Dict[Optional[str], int] = {}
+
+    def intern(self, value: Optional[str]) -> int:
+        ref = self.index.get(value)
+        if ref is None:
+            ref = len(self.values)
+            self.index[value] = ref
+            self.values.append(value)
+        return ref
+
+    def lookup(self, value: Optional[str]) -> int:
+        return self.index.get(value, -1)
+
+
+def _day_number(day: str) -> int:
+    """'AAAA-MM-DD' → días desde 1970-01-01"""
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+
+class ListenColumns:
+    """Snapshot inmutable de una tabla de escuchas en arrays de NumPy
+
+    Una posición por escucha: `ts` (segundos epoch, NO_DATE si no tiene
+    fecha), `day` y `month` (días / meses desde 1970), `artist` y `track`
+    (ids internados) y `artist_id`. Las agregaciones (por periodo, top-K)
+    son bincount / argsort sobre los arrays, sin bucles en Python.
+    """
+
+    def __init__(self, table: str, ts, artist, track, artist_id,
+                 artists: _Interner, tracks: _Interner, last_rowid: int, token: str):
+        self.table = table
+        self.ts = ts
+        self.artist = artist
+        self.track = track
+        self.artist_id = artist_id
+        self.artists = artists
+        self.tracks = tracks
+        self.last_rowid = last_rowid
+        self.token = token
+
+        self.has_date = ts != NO_DATE
+        self.day = np.where(self.has_date, ts // 86400, 0).astype(np.int32)
+        self.month = self.day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    # === FILTROS ===
+
+    def select(self, artist_id: int = None, tracks: Iterable[str] = None,
+               start: str = None, end: str = None, dated: bool = False):
+        """Máscara booleana de escuchas; `start` incluido y `end` excluido (AAAA-MM-DD)"""
+        mask = np.ones(len(self.ts), dtype=bool)
+        if artist_id is not None:
+            mask &= self.artist_id == artist_id
+        if tracks is not None:
+            ids = [self.tracks.lookup(name) for name in tracks]
+            mask &= np.isin(self.track, [ref for ref in ids if ref >= 0])
+        if dated or start or end:
+            mask &= self.has_date
+        if start:
+            mask &= self.day >= _day_number(start)
+        if end:
+            mask &= self.day < _day_number(end)
+        return mask
+
+    # === AGREGACIONES ===
+
+    @staticmethod
+    def _counts(values, mask) -> Tuple[int, 'np.ndarray']:
+        """bincount de `values[mask]` desplazado al mínimo (devuelve el desplazamiento)"""
+        selected = values[mask]
+        if not len(selected):
+            return 0, np.zeros(0, dtype=np.int64)
+        offset = int(selected.min())
+        return offset, np.bincount(selected - offset)
+
+    def count_by_year(self, mask) -> List[Tuple[str, int]]:
+        offset, counts = self._counts(self.month // 12, mask & self.has_date)
+        return [(str(1970 + offset + position), int(count))
+                for position, count in enumerate(counts) if count]
+
+    def count_by_month(self, mask) -> List[Tuple[str, int]]:
+        offset, counts = self._counts(self.month, mask & self.has_date)
+        months = np.arange(offset, offset + len(counts)).astype('datetime64[M]').astype(str)
+        return [(str(month), int(count)) for month, count in zip(months, counts) if count]
+
+    def count_by_weekday(self, mask) -> List[Tuple[str, int]]:
+        """Escuchas por día de la semana (0 = domingo, como strftime('%w'))"""
+        weekdays = (self.day[mask & self.has_date] + 4) % 7
+        counts = np.bincount(weekdays, minlength=7)
+        return [(WEEKDAY_NAMES[weekday], int(count)) for weekday, count in enumerate(counts) if count]
+
+    def top(self, column: str, mask, limit: int = None, skip_empty: bool = True) -> List[Tuple[str, int]]:
+        """Valores más frecuentes de 'artist' o 'track' con su número de escuchas"""
+        interner = self.artists if column == 'artist' else self.tracks
+        names = interner.values
+        values = getattr(self, column)[mask]
+        if not len(values):
+            return []
+        counts = np.bincount(values, minlength=len(names))
+        if skip_empty:
+            for empty in (None, ''):
+                ref = interner.lookup(empty)
+                if 0 <= ref < len(counts):
+                    counts[ref] = 0
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-counts[present], kind='stable')]
+        if limit is not None:
+            order = order[:limit]
+        return [(names[ref], int(counts[ref])) for ref in order]
+
+    def count_by_month_for(self, column: str, names: Iterable[str], mask) -> List[Tuple[str, str, int]]:
+        """(nombre, AAAA-MM, escuchas) de los valores indicados de 'artist' o 'track'"""
+        interner = self.artists if column == 'artist' else self.tracks
+        values = getattr(self, column)
+        rows = []
+        for name in names:
+            ref = interner.lookup(name)
+            if ref < 0:
+                continue
+            rows.extend((name, month, count) for month, count in self.count_by_month(mask & (values == ref)))
+        return rows
+
+
+class ColumnarStore:
+    """Escuchas en memoria en formato columnar para los análisis
+
+    Carga cada tabla de escuchas configurada en un ListenColumns y la amplía
+    con las filas nuevas (rowid posterior al último cargado) cuando cambia
+    la BD; si se han borrado o reescrito filas (número de filas y huella de
+    su contenido), la vuelve a cargar entera.
+    Mientras no hay snapshot los análisis usan SQL.
+    """
+
+    def __init__(self, pool, config: dict = None):
+        columnar_config = (config or {}).get('database', {}).get('columnar', {})
+
+        self.pool = pool
+        self.enabled = columnar_config.get('enabled', True) and NUMPY_AVAILABLE
+        self.check_interval = columnar_config.get('check_interval', 5)
+        self.tables: Dict[str, str] = columnar_config.get('tables', DEFAULT_TABLES)
+
+        self._snapshots: Dict[str, ListenColumns] = {}
+        self._counts: Dict[str, int] = {}
+        self._hashes: Dict[str, int] = {}
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._stats = {'full_loads': 0, 'incremental_loads': 0, 'last_duration_s': None}
+        self.last_error = None
+
+        if columnar_config.get('enabled', True) and not NUMPY_AVAILABLE:
+            logger.info("NumPy no disponible: análisis de escuchas por SQL")
+
+    # === CARGA ===
+
+    def start(self):
+        """Carga inicial en segundo plano"""
+        if self.enabled:
+            self._refresh_async()
+
+    def load(self) -> bool:
+        """Carga o amplía todas las tablas; devuelve True si alguna cambió"""
+        with self._load_lock:
+            token = self.pool.data_token()
+            changed = False
+            started = time.time()
+            try:
+                conn = self.pool.get_connection()
+                for table, date_column in self.tables.items():
+                    snapshot = self._snapshots.get(table)
+                    if snapshot is not None and snapshot.token == token:
+                        continue
+                    if not self._table_exists(conn, table):
+                        self._snapshots.pop(table, None)
+                        continue
+                    self._snapshots[table] = self._load_table(conn, table, date_column, snapshot, token)
+                    changed = True
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error cargando escuchas en memoria: {e}")
+                return False
+
+            if changed:
+                self._stats['last_duration_s'] = round(time.time() - started, 3)
+                rows = sum(len(snapshot) for snapshot in self._snapshots.values())
+                logger.info(f"Escuchas en memoria: {rows} filas en {self._stats['last_duration_s']}s")
+            return changed
+
+    @staticmethod
+    def _table_exists(conn, table: str) -> bool:
+        return conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0] > 0
+
+    def _load_table(self, conn, table: str, date_column: str,
+                    previous: Optional[ListenColumns], token: str) -> ListenColumns:
+        """Añade las filas nuevas al snapshot anterior o carga la tabla entera"""
+        conn.create_function('mwe_row_hash', -1, row_hash, deterministic=True)
+        columns = [date_column] + HASHED_COLUMNS
+        after_rowid = 0
+        if previous is not None:
+            kept = conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE rowid <= ?", (previous.last_rowid,)
+            ).fetchone()[0]
+            # Mismo número de filas no basta: una fila ya cargada puede haberse editado
+            if (kept == self._counts.get(table) and
+                    rows_hash(conn, table, columns, 0, previous.last_rowid) == self._hashes.get(table)):
+                after_rowid = previous.last_rowid
+            else:
+                previous = None
+
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT rowid, CAST(strftime('%s', {date_column}) AS INTEGER), artist_name, track_name, artist_id
+            FROM {table}
+            WHERE rowid > ?
+            ORDER BY rowid
+        """, (after_rowid,))
+        rows = cursor.fetchall()
+
+        artists = previous.artists if previous is not None else _Interner()
+        tracks = previous.tracks if previous is not None else _Interner()
+        intern_artist = artists.intern
+        intern_track = tracks.intern
+
+        ts = np.fromiter((NO_DATE if row[1] is None else row[1] for row in rows), dtype=np.int64, count=len(rows))
+        artist = np.fromiter((intern_artist(row[2]) for row in rows), dtype=np.int32, count=len(rows))
+        track = np.fromiter((intern_track(row[3]) for row in rows), dtype=np.int32, count=len(rows))
+        artist_id = np.fromiter((-1 if row[4] is None else row[4] for row in rows), dtype=np.int64, count=len(rows))
+        last_rowid = rows[-1][0] if rows else (previous.last_rowid if previous is not None else 0)
+
+        if previous is not None:
+            ts = np.concatenate((previous.ts, ts))
+            artist = np.concatenate((previous.artist, artist))
+            track = np.concatenate((previous.track, track))
+            artist_id = np.concatenate((previous.artist_id, artist_id))
+            self._stats['incremental_loads'] += 1
+        else:
+            self._stats['full_loads'] += 1
+
+        self._counts[table] = len(ts)
+        self._hashes[table] = ((self._hashes[table] if previous is not None else 0) +
+                               rows_hash(conn, table, columns, after_rowid, last_rowid))
+        return ListenColumns(table, ts, artist, track, artist_id, artists, tracks, last_rowid, token)
+
+    def _refresh_async(self):
+        if self._loading:
+            return
+        self._loading = True
+
+        def run():
+            try:
+                self.load()
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name='columnar-loader', daemon=True).start()
+
+    # === CONSULTA ===
+
+    def get(self, table: str) -> Optional[ListenColumns]:
+        """Snapshot de la tabla, o None si no está cargado (se usa SQL)
+
+        Como mucho cada check_interval comprueba si la BD ha cambiado y, si
+        es así, amplía el snapshot en segundo plano; mientras tanto devuelve
+        el anterior, igual que las tablas derivadas.
+        """
+        if not self.enabled or table not in self.tables:
+            return None
+        snapshot = self._snapshots.get(table)
+        if snapshot is None:
+            self._refresh_async()
+            return None
+
+        now = time.time()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self.pool.data_token() != snapshot.token:
+                self._refresh_async()
+        return snapshot
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'numpy': NUMPY_AVAILABLE,
+            'tables': {table: len(snapshot) for table, snapshot in self._snapshots.items()},
+            'memory_mb': round(sum(
+                snapshot.ts.nbytes + snapshot.artist.nbytes + snapshot.track.nbytes
+                + snapshot.artist_id.nbytes + snapshot.day.nbytes + snapshot.month.nbytes
+                + snapshot.has_date.nbytes
+                for snapshot in self._snapshots.values()
+            ) / 1048576, 2),
+            'last_error': self.last_error,
+            **self._stats
+        }
+
+
+def listen_summary(columns: ListenColumns, mask) -> Dict:
+    """Escuchas por canción (de más a menos), por mes y total de una selección"""
+    return {
+        'tracks': columns.top('track', mask, skip_empty=False),
+        'monthly': columns.count_by_month(mask),
+        'total': int(mask.sum())
+    }
@@ -7,6 +7,27 @@ import os
 from typing import List, Dict, Optional, Tuple
 import json
 
+from db_pool import get_pool
+from analytics_engine import get_analytics_engine
+from db_replica import DatabaseReplica
+from index_advisor import IndexAdvisor, record_statement
+from derived_store import DerivedStore
+from album_resolver import AlbumTrackResolver, TRACKS_BY_ID_MATCHES, TRACKS_WITH_PATHS_MATCHES
+from search_engine import SearchEngine, SearchIndexJob
+from play_counts import EPOCH_EXPR, PlayCountsJob, register_decay, trending_factor
+from scrobble_resolver import ALBUM_KEYS_SELECT, KEY_FUNCTIONS, SONG_KEYS_SELECT, ScrobbleSongMapJob
+from scrobble_rollups import ScrobbleRollupJob, rollup_select, DAY_EXPR, MONTH_EXPR
+from scrobble_history import ScrobbleHistoryJob, history_select
+from lyrics_index import LyricsTermsJob, tokenize
+from typeahead import TypeaheadIndex
+from columnar_store import ColumnarStore, listen_summary
+from scrobble_sources import ScrobbleSources
+from time_columns import time_source, part_column, part_expression, table_columns
+from fast_json import RowSet
+from query_cache import cached, get_query_cache, is_cacheable_statement
+from write_buffer import RecentSearchBuffer
+from stats_manager import get_stats_manager
+
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
@@ -16,6 +37,40 @@ class DatabaseManager:
         self.config = config
         self.db_path = config.get('database', {}).get('path', '/app/data/musica.sqlite')
         self.timeout = config.get('database', {}).get('timeout', 30)
+        self.pool = get_pool(self.db_path, config)
+        self.query_cache = get_query_cache(self.pool, config)
+        # Agregaciones de los análisis en DuckDB si está instalado (si no, SQLite)
+        self.analytics = get_analytics_engine(self.pool, config)
+        self.replica = DatabaseReplica(self.pool, config)
+        self.index_advisor = IndexAdvisor(self.pool, config)
+        # Los índices se crean en cada snapshot antes de activarlo
+        self.replica.add_listener(self.index_advisor.apply_indexes)
+        # Tablas precalculadas en la BD auxiliar (adjunta como `derived`)
+        self.derived = DerivedStore(self.pool, config)
+        self.derived.register(AlbumTrackResolver())
+        self.derived.register(SearchIndexJob())
+        self.play_counts = PlayCountsJob(config)
+        self.derived.register(self.play_counts)
+        self.scrobble_map = ScrobbleSongMapJob(config)
+        # La unión de respaldo empareja con las mismas claves normalizadas que el mapa
+        for name, (num_params, func) in KEY_FUNCTIONS.items():
+            self.pool.create_function(name, num_params, func)
+        self.derived.register(self.scrobble_map)
+        self.derived.register(ScrobbleRollupJob(config))
+        self.derived.register(ScrobbleHistoryJob(config))
+        self.derived.register(LyricsTermsJob())
+        self.search_engine = SearchEngine(self)
+        self.typeahead = TypeaheadIndex(self.pool, config)
+        # Escuchas en arrays de NumPy para los análisis (opcional)
+        self.columnar = ColumnarStore(self.pool, config)
+        # Tablas de escuchas de cada usuario (scrobbles_<usuario>, listens_<usuario>)
+        self.scrobble_sources = ScrobbleSources(self.pool, config)
+        # Búsquedas recientes con escritura diferida (sin commit en cada búsqueda)
+        self.recent_searches = RecentSearchBuffer(self.pool, config)
+        # Estadísticas de la página de sistema (snapshot recalculado en segundo plano)
+        self.stats = get_stats_manager(self.db_path, config)
+        # Columnas de las tablas con fecha (para usar las generadas si existen)
+        self._time_schema = (None, {})
         
         # Verificar que la base de datos existe
         if not os.path.exists(self.db_path):
@@ -24,11 +79,9 @@ class DatabaseManager:
             logger.info(f"Base de datos conectada: {self.db_path}")
     
     def get_connection(self):
-        """Obtiene una conexión a la base de datos"""
+        """Obtiene la conexión de lectura del hilo actual desde el pool"""
         try:
-            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
-            conn.row_factory = sqlite3.Row  # Para acceso por nombre de columna
-            return conn
+            return self.pool.get_connection()
         except Exception as e:
             logger.error(f"Error conectando a la base de datos: {e}")
             raise
@@ -76,6 +129,13 @@ class DatabaseManager:
         
     def execute_query(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
         """Ejecuta una consulta de forma segura y devuelve los resultados"""
+        if is_cacheable_statement(query):
+            key = ('sql', query, tuple(params) if params else ())
+            return self.query_cache.get_or_compute(key, lambda: self._execute_query(query, params))
+        return self._execute_query(query, params)
+    
+    def _execute_query(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
+        record_statement(query, params)
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -91,6 +151,11 @@ class DatabaseManager:
     def search_artists(self, query: str, limit: int = 50) -> List[Dict]:
         """Busca artistas por nombre usando FTS o LIKE"""
         try:
+            # Índice de búsqueda unificado (bm25 + prefijo + subcadena)
+            results = self.search_engine.search_artists(query, limit)
+            if results is not None:
+                return results
+            
             with self.get_connection() as conn:
                 search_term = f"%{query}%"
                 
@@ -126,40 +191,41 @@ class DatabaseManager:
             logger.error(f"Error buscando artistas: {e}")
             return []
     
-    def get_artist_albums(self, artist_name: str) -> List[Dict]:
+    @cached('artist_albums')
+    def get_artist_albums(self, artist_name: str) -> RowSet:
         """Obtiene los álbumes de un artista por nombre"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute("""
+                return RowSet.from_query(conn, """
                     SELECT a.*, ar.name as artist_name
                     FROM albums a
                     JOIN artists ar ON a.artist_id = ar.id
                     WHERE ar.name = ?
                     ORDER BY a.year DESC, a.name
                 """, (artist_name,))
-                return [dict(row) for row in cursor.fetchall()]
                 
         except Exception as e:
             logger.error(f"Error obteniendo álbumes del artista {artist_name}: {e}")
-            return []
+            return RowSet((), [])
     
-    def get_artist_albums_by_id(self, artist_id: int) -> List[Dict]:
+    @cached('artist_albums_by_id')
+    def get_artist_albums_by_id(self, artist_id: int) -> RowSet:
         """Obtiene los álbumes de un artista por ID"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute("""
+                return RowSet.from_query(conn, """
                     SELECT a.*, ar.name as artist_name
                     FROM albums a
                     JOIN artists ar ON a.artist_id = ar.id
                     WHERE a.artist_id = ?
                     ORDER BY a.year DESC, a.name
                 """, (artist_id,))
-                return [dict(row) for row in cursor.fetchall()]
                 
         except Exception as e:
             logger.error(f"Error obteniendo álbumes del artista {artist_id}: {e}")
-            return []
+            return RowSet((), [])
     
+    @cached('artist_by_id')
     def get_artist_by_id(self, artist_id: int) -> Optional[Dict]:
         """Obtiene un artista por ID"""
         try:
@@ -201,7 +267,8 @@ class DatabaseManager:
             logger.error(f"Error obteniendo canciones del álbum: {e}")
             return []
     
-    def get_album_tracks_by_id(self, album_id: int) -> List[Dict]:
+    @cached('album_tracks_by_id')
+    def get_album_tracks_by_id(self, album_id: int) -> RowSet:
         """Obtiene las canciones de un álbum por ID - VERSION CORREGIDA"""
         try:
             with self.get_connection() as conn:
@@ -209,54 +276,51 @@ class DatabaseManager:
                 album_info = self.get_album_by_id(album_id)
                 if not album_info:
                     logger.error(f"Álbum {album_id} no encontrado")
-                    return []
+                    return RowSet((), [])
                 
                 album_name = album_info.get('name')
                 artist_name = album_info.get('artist_name')
                 
-                # Buscar canciones por nombre de álbum y artista
+                # Información del álbum y artista añadida a cada canción
+                album_columns = {'album_name': album_name, 'artist_name': artist_name}
+                
+                # Resolución precalculada por el AlbumTrackResolver
+                tracks = self._get_resolved_album_tracks(conn, album_id, TRACKS_BY_ID_MATCHES)
+                if tracks is not None:
+                    return tracks.with_constants(album_columns)
+                
+                # Sin tabla derivada: búsqueda directa por nombre de álbum y artista
                 if album_name and artist_name:
-                    cursor = conn.execute("""
+                    tracks = RowSet.from_query(conn, """
                         SELECT * FROM songs 
                         WHERE album = ? AND artist = ?
                         ORDER BY track_number
                     """, (album_name, artist_name))
-                    tracks = [dict(row) for row in cursor.fetchall()]
                     
                     if tracks:
-                        # Añadir información del álbum y artista
-                        for track in tracks:
-                            track['album_name'] = album_name
-                            track['artist_name'] = artist_name
-                        
                         logger.debug(f"Encontradas {len(tracks)} canciones para álbum {album_id}")
-                        return tracks
+                        return tracks.with_constants(album_columns)
                 
                 # Fallback: búsqueda flexible
                 if album_name:
-                    cursor = conn.execute("""
+                    tracks = RowSet.from_query(conn, """
                         SELECT * FROM songs 
                         WHERE album LIKE ?
                         ORDER BY track_number
-                    """, (f"%{album_name}%",))
-                    tracks = [dict(row) for row in cursor.fetchall()]
-                    
-                    # Añadir información del álbum y artista
-                    for track in tracks:
-                        track['album_name'] = album_name
-                        track['artist_name'] = artist_name
+                    """, (f"%{album_name}%",)).with_constants(album_columns)
                     
                     if tracks:
                         logger.debug(f"Encontradas {len(tracks)} canciones (fallback) para álbum {album_id}")
                         return tracks
                 
                 logger.warning(f"No se encontraron canciones para el álbum {album_id}")
-                return []
+                return RowSet((), [])
                 
         except Exception as e:
             logger.error(f"Error obteniendo canciones del álbum {album_id}: {e}")
-            return []
+            return RowSet((), [])
     
+    @cached('album_by_id')
     def get_album_by_id(self, album_id: int) -> Optional[Dict]:
         """Obtiene un álbum por ID"""
         try:
@@ -274,6 +338,7 @@ class DatabaseManager:
             logger.error(f"Error obteniendo álbum {album_id}: {e}")
             return None
     
+    @cached('song_by_id')
     def get_song_by_id(self, song_id: int) -> Optional[Dict]:
         """Obtiene una canción por ID"""
         try:
@@ -321,63 +386,357 @@ class DatabaseManager:
         """Obtiene las letras de una canción por ID"""
         return self.get_song_lyrics(song_id=song_id)
     
-    def get_recent_searches(self, limit: int = 10) -> List[Dict]:
-        """Obtiene las búsquedas recientes"""
+    def get_recent_searches(self, limit: int = 10) -> RowSet:
+        """Obtiene las búsquedas recientes (incluidas las aún no escritas en la BD)"""
+        pending = self.recent_searches.pending()
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute("""
+                stored = RowSet.from_query(conn, """
                     SELECT search_term, search_date 
                     FROM recent_searches 
                     ORDER BY search_date DESC 
                     LIMIT ?
-                """, (limit,))
-                return [dict(row) for row in cursor.fetchall()]
+                """, (limit + len(pending),))
         except Exception as e:
             logger.debug(f"Tabla recent_searches no existe o error: {e}")
-            return []
+            stored = RowSet(('search_term', 'search_date'), [])
+        
+        if not pending:
+            return stored[:limit]
+        pending_terms = {term for term, _ in pending}
+        rows = pending + [row for row in stored.rows if row[0] not in pending_terms]
+        rows.sort(key=lambda row: row[1] or '', reverse=True)
+        return RowSet(('search_term', 'search_date'), rows[:limit])
     
     def add_recent_search(self, search_term: str):
-        """Añade una búsqueda reciente"""
+        """Añade una búsqueda reciente (escritura diferida, ver write_buffer)"""
         try:
-            with self.get_connection() as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO recent_searches (search_term, search_date) 
-                    VALUES (?, datetime('now'))
-                """, (search_term,))
-                conn.commit()
+            self.recent_searches.add(search_term)
         except Exception as e:
             logger.debug(f"No se pudo guardar búsqueda reciente: {e}")
     
-    def get_popular_artists(self, limit: int = 20) -> List[Dict]:
-        """Obtiene los artistas más populares basado en reproducciones"""
+    @cached('popular_artists')
+    def get_popular_artists(self, limit: int = 20, order: str = 'plays') -> RowSet:
+        """Obtiene los artistas más populares basado en reproducciones
+
+        order='trending' ordena por escuchas recientes (decaimiento exponencial).
+        """
         try:
             with self.get_connection() as conn:
+                # Agregados precalculados por PlayCountsJob
+                results = self._get_popular_artists_aggregated(conn, limit, order)
+                if results is not None:
+                    return results
+                
                 # Usar tabla de scrobbles para obtener artistas más escuchados
-                cursor = conn.execute("""
-                    SELECT a.*, COUNT(s.id) as play_count
+                # (mismas columnas que la tabla derivada: last_played y trending)
+                register_decay(conn, self.play_counts.half_life_days)
+                sort_column = 'decay_score' if order == 'trending' else 'play_count'
+                results = RowSet.from_query(conn, f"""
+                    SELECT a.*, COUNT(s.id) as play_count,
+                           MAX({EPOCH_EXPR}) AS last_played,
+                           COALESCE(SUM(mwe_decay_weight({EPOCH_EXPR})), 0.0) AS decay_score
                     FROM artists a
                     LEFT JOIN scrobbles s ON a.name = s.artist_name
                     GROUP BY a.id, a.name
-                    ORDER BY play_count DESC, a.name
+                    ORDER BY {sort_column} DESC, a.name
                     LIMIT ?
                 """, (limit,))
-                results = [dict(row) for row in cursor.fetchall()]
+                if results:
+                    results = self._with_trending(results)
                 
                 if not results:
                     # Fallback: obtener artistas por orden alfabético
-                    cursor = conn.execute("""
+                    results = RowSet.from_query(conn, """
                         SELECT * FROM artists 
                         ORDER BY name 
                         LIMIT ?
                     """, (limit,))
-                    results = [dict(row) for row in cursor.fetchall()]
                 
                 return results
                 
         except Exception as e:
             logger.error(f"Error obteniendo artistas populares: {e}")
-            return []
+            return RowSet((), [])
     
+    def _get_popular_artists_aggregated(self, conn, limit: int, order: str) -> Optional[RowSet]:
+        """Artistas más escuchados desde derived.artist_play_counts (None si no está lista)"""
+        if not self.derived.is_ready(PlayCountsJob.name):
+            return None
+        try:
+            sort_column = 'p.decay_score' if order == 'trending' else 'p.plays'
+            results = RowSet.from_query(conn, f"""
+                SELECT a.*, p.plays AS play_count, p.last_played, p.decay_score
+                FROM derived.artist_play_counts p
+                JOIN artists a ON a.name = p.artist_name
+                ORDER BY {sort_column} DESC, a.name
+                LIMIT ?
+            """, (limit,))
+            
+            if len(results) < limit:
+                # Como en el LEFT JOIN original: después, los artistas sin escuchas
+                results.rows.extend(RowSet.from_query(conn, """
+                    SELECT a.*, 0 AS play_count, NULL AS last_played, 0.0 AS decay_score
+                    FROM artists a
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM derived.artist_play_counts p WHERE p.artist_name = a.name
+                    )
+                    ORDER BY a.name
+                    LIMIT ?
+                """, (limit - len(results),)).rows)
+            
+            return self._with_trending(results)
+        except sqlite3.Error as e:
+            logger.debug(f"Tabla derivada artist_play_counts no disponible: {e}")
+            return None
+    
+    @cached('popular_tracks')
+    def get_popular_tracks(self, limit: int = 20, order: str = 'plays', artist_name: str = None) -> RowSet:
+        """Canciones más escuchadas (o en tendencia)
+
+        Lee derived.track_play_counts; mientras no está lista (o si su trabajo
+        falla) agrupa los scrobbles al vuelo con las mismas columnas.
+        """
+        try:
+            with self.get_connection() as conn:
+                if self.derived.is_ready(PlayCountsJob.name):
+                    source = "derived.track_play_counts"
+                else:
+                    register_decay(conn, self.play_counts.half_life_days)
+                    source = f"""(
+                        SELECT artist_name, track_name, COUNT(*) AS plays,
+                               MAX({EPOCH_EXPR}) AS last_played,
+                               SUM(mwe_decay_weight({EPOCH_EXPR})) AS decay_score
+                        FROM {self.play_counts.table}
+                        WHERE artist_name IS NOT NULL AND artist_name != ''
+                          AND track_name IS NOT NULL AND track_name != ''
+                        GROUP BY artist_name, track_name
+                    )"""
+                sort_column = 'decay_score' if order == 'trending' else 'plays'
+                where = "WHERE artist_name = ?" if artist_name else ""
+                params = ((artist_name,) if artist_name else ()) + (limit,)
+                results = RowSet.from_query(conn, f"""
+                    SELECT artist_name, track_name, plays AS play_count, last_played, decay_score
+                    FROM {source}
+                    {where}
+                    ORDER BY {sort_column} DESC, artist_name, track_name
+                    LIMIT ?
+                """, params)
+                return self._with_trending(results)
+        except Exception as e:
+            logger.error(f"Error obteniendo canciones populares: {e}")
+            return RowSet((), [])
+    
+    def _with_trending(self, results: RowSet) -> RowSet:
+        """Sustituye decay_score por `trending`: escuchas recientes equivalentes a hoy"""
+        factor = trending_factor(self.play_counts.half_life_days)
+        position = results.columns.index('decay_score')
+        columns = results.columns[:position] + ('trending',) + results.columns[position + 1:]
+        return RowSet(columns, [
+            row[:position] + (float(f"{(row[position] or 0.0) * factor:.6g}"),) + row[position + 1:]
+            for row in results.rows
+        ])
+
+    def get_listen_counts(self, table: str, date_column: str, artist_id: int,
+                          track_names: List[str] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Escuchas de un artista (opcionalmente solo de esas canciones) por canción y por mes
+
+        Usa las escuchas en memoria si están cargadas; si no, una consulta
+        agrupada por canción y mes.
+        """
+        columns = self.columnar.get(table)
+        if columns is not None:
+            summary = listen_summary(columns, columns.select(artist_id=artist_id, tracks=track_names))
+            return dict(summary['tracks']), dict(summary['monthly'])
+
+        track_filter = ''
+        params = [artist_id]
+        if track_names is not None:
+            if not track_names:
+                return {}, {}
+            track_filter = f" AND track_name IN ({','.join('?' for _ in track_names)})"
+            params.extend(track_names)
+
+        month = self.time_column(table, 'month') or f"substr({date_column}, 1, 7)"
+        rows = self.execute_query(f"""
+            SELECT track_name, {month} as month, COUNT(*) as plays
+            FROM {table}
+            WHERE artist_id = ?{track_filter}
+            GROUP BY track_name, month
+        """, tuple(params))
+
+        tracks: Dict[str, int] = {}
+        monthly: Dict[str, int] = {}
+        for row in rows:
+            tracks[row['track_name']] = tracks.get(row['track_name'], 0) + row['plays']
+            if row['month']:
+                monthly[row['month']] = monthly.get(row['month'], 0) + row['plays']
+        return tracks, monthly
+
+    def get_lyrics_term_counts(self, weights_query: str, params: tuple = (), exclude=(),
+                               min_length: int = 3, min_count: int = 1, limit: int = 20) -> List[Dict]:
+        """Palabras más frecuentes en un conjunto ponderado de letras
+
+        `weights_query` devuelve (lyrics_id, weight): cada aparición de una
+        palabra cuenta `weight` veces (p.ej. escuchas de la canción). Usa el
+        índice derived.lyrics_terms si está listo; si no, tokeniza las letras.
+        Devuelve filas {word, word_count, song_count} de más a menos frecuente
+        (todas si `limit` es None).
+        """
+        exclude = tuple(exclude)
+        if self.derived.is_ready(LyricsTermsJob.name):
+            exclude_sql = f" AND t.term NOT IN ({','.join('?' for _ in exclude)})" if exclude else ''
+            rows = self.execute_query(f"""
+                SELECT t.term as word,
+                       SUM(t.count * w.weight) as word_count,
+                       COUNT(DISTINCT t.lyrics_id) as song_count
+                FROM ({weights_query}) w
+                JOIN derived.lyrics_terms t ON t.lyrics_id = w.lyrics_id
+                WHERE length(t.term) >= ?{exclude_sql}
+                GROUP BY t.term
+                HAVING word_count >= ?
+                ORDER BY word_count DESC, t.term
+                LIMIT ?
+            """, (*params, min_length, *exclude, min_count, -1 if limit is None else limit))
+            return [dict(row) for row in rows]
+
+        rows = self.execute_query(f"""
+            SELECT w.lyrics_id, w.weight, l.lyrics
+            FROM ({weights_query}) w
+            JOIN lyrics l ON l.id = w.lyrics_id
+        """, params)
+        excluded = set(exclude)
+        word_counts: Dict[str, int] = {}
+        songs: Dict[str, set] = {}
+        for row in rows:
+            for term, count in tokenize(row['lyrics']).items():
+                if len(term) < min_length or term in excluded:
+                    continue
+                word_counts[term] = word_counts.get(term, 0) + count * row['weight']
+                songs.setdefault(term, set()).add(row['lyrics_id'])
+        ranked = sorted((item for item in word_counts.items() if item[1] >= min_count),
+                        key=lambda item: (-item[1], item[0]))
+        return [{'word': term, 'word_count': count, 'song_count': len(songs[term])}
+                for term, count in ranked[:limit]]
+
+    def get_lyrics_word_totals(self, lyrics_ids: List[int], exclude=(),
+                               min_length: int = 3) -> Dict[int, Tuple[int, int]]:
+        """Palabras y palabras distintas de cada letra (lyrics_id → (total, distintas))"""
+        lyrics_ids = list(lyrics_ids)
+        if not lyrics_ids:
+            return {}
+        exclude = tuple(exclude)
+        id_marks = ','.join('?' for _ in lyrics_ids)
+        if self.derived.is_ready(LyricsTermsJob.name):
+            exclude_sql = f" AND term NOT IN ({','.join('?' for _ in exclude)})" if exclude else ''
+            rows = self.execute_query(f"""
+                SELECT lyrics_id, SUM(count) as words, COUNT(*) as unique_words
+                FROM derived.lyrics_terms
+                WHERE lyrics_id IN ({id_marks}) AND length(term) >= ?{exclude_sql}
+                GROUP BY lyrics_id
+            """, (*lyrics_ids, min_length, *exclude))
+            return {row['lyrics_id']: (row['words'], row['unique_words']) for row in rows}
+
+        rows = self.execute_query(f"SELECT id, lyrics FROM lyrics WHERE id IN ({id_marks})", tuple(lyrics_ids))
+        excluded = set(exclude)
+        totals = {}
+        for row in rows:
+            counts = {term: count for term, count in tokenize(row['lyrics']).items()
+                      if len(term) >= min_length and term not in excluded}
+            totals[row['id']] = (sum(counts.values()), len(counts))
+        return totals
+
+    def scrobble_song_joins(self, table: str, scrobble_alias: str = 'sp', song_alias: str = 's',
+                            album_alias: str = None, outer: bool = False) -> str:
+        """Fragmento JOIN de scrobbles a songs (y opcionalmente albums)
+
+        Usa derived.scrobble_song_map (claves enteras indexadas) si está lista
+        para esa tabla; si no, empareja al vuelo con el mismo criterio que el
+        mapa (artista y título normalizados, canción y álbum de menor id).
+        Con `outer` se usan LEFT JOIN y se conservan los scrobbles sin canción.
+        """
+        join = 'LEFT JOIN' if outer else 'JOIN'
+        if self.scrobble_map.table == table and self.derived.is_ready(ScrobbleSongMapJob.name):
+            map_alias = f"{scrobble_alias}_map"
+            joins = (f"{join} derived.scrobble_song_map {map_alias} ON {map_alias}.scrobble_rowid = {scrobble_alias}.rowid "
+                     f"{join} songs {song_alias} ON {song_alias}.id = {map_alias}.song_id")
+            if album_alias:
+                joins += f" {join} albums {album_alias} ON {album_alias}.id = {map_alias}.album_id"
+            return joins
+
+        # CROSS JOIN fija el orden (scrobbles primero): si SQLite empezara por
+        # songs, calcularía mwe_song_key() de todos los scrobbles en cada canción
+        if not outer:
+            join = 'CROSS JOIN'
+        keys_alias = f"{scrobble_alias}_keys"
+        joins = (f"{join} ({SONG_KEYS_SELECT.format(songs='songs')}) {keys_alias} "
+                 f"ON {keys_alias}.song_key = mwe_song_key({scrobble_alias}.artist_name, {scrobble_alias}.track_name) "
+                 f"{join} songs {song_alias} ON {song_alias}.id = {keys_alias}.song_id")
+        if album_alias:
+            album_keys_alias = f"{album_alias}_keys"
+            joins += (f" {join} ({ALBUM_KEYS_SELECT.format(albums='albums')}) {album_keys_alias} "
+                      f"ON {album_keys_alias}.artist_id = {song_alias}.artist_id "
+                      f"AND {album_keys_alias}.name_key = mwe_normalize({song_alias}.album) "
+                      f"{join} albums {album_alias} ON {album_alias}.id = {album_keys_alias}.album_id")
+        return joins
+
+    def scrobble_rollup_source(self, table: str, monthly: bool = False) -> str:
+        """Origen para FROM con las columnas de derived.scrobble_daily
+
+        La tabla derivada (diaria, o mensual con `monthly`: `day` es el primer
+        día del mes) si está lista; si no, la misma agregación calculada al
+        vuelo sobre los scrobbles (más lenta, mismo resultado).
+        """
+        if self.scrobble_map.table == table and self.derived.is_ready(ScrobbleRollupJob.name):
+            return "derived.scrobble_monthly" if monthly else "derived.scrobble_daily"
+        joins = self.scrobble_song_joins(table, album_alias='a', outer=True)
+        if monthly:
+            month = self.time_column(table, 'month', 'sp')
+            day_expr = f"COALESCE({month} || '-01', '')" if month else MONTH_EXPR
+        else:
+            day = self.time_column(table, 'day', 'sp')
+            day_expr = f"COALESCE({day}, '')" if day else DAY_EXPR
+        return f"({rollup_select(table, joins, day_expr=day_expr)})"
+
+    def time_column(self, table: str, part: str, alias: str = None) -> Optional[str]:
+        """Columna generada con una parte de la fecha de `table` (ver time_columns) o None
+
+        Solo existe si el asesor de índices ha aplicado la migración sobre la
+        BD que se está leyendo (snapshot de la réplica u origen escribible).
+        """
+        source = time_source(table)
+        if not source:
+            return None
+        token = self.pool.data_token()
+        cached_token, schema = self._time_schema
+        if cached_token != token:
+            schema = {}
+        if table not in schema:
+            schema[table] = table_columns(self.get_connection(), table)
+            self._time_schema = (token, schema)
+        column = part_column(source[1], part)
+        if column not in schema[table]:
+            return None
+        return f"{alias}.{column}" if alias else column
+
+    def date_part(self, table: str, part: str, alias: str = None) -> str:
+        """Parte de la fecha de `table`: la columna generada indexada si existe
+        y, si no, la misma expresión calculada sobre la columna de texto"""
+        column = self.time_column(table, part, alias)
+        if column:
+            return column
+        return part_expression(time_source(table)[0], part, alias)
+
+    def song_history_source(self, table: str) -> str:
+        """Origen para FROM con las columnas de derived.song_listening_history
+
+        La tabla derivada si está lista; si no, el mismo historial calculado
+        al vuelo con funciones de ventana sobre todos los scrobbles.
+        """
+        if self.scrobble_map.table == table and self.derived.is_ready(ScrobbleHistoryJob.name):
+            return "derived.song_listening_history"
+        return f"({history_select(table)})"
+
     def search_global(self, query: str, limit: int = 50) -> Dict:
         """Búsqueda global en artistas, álbumes y canciones usando FTS cuando esté disponible"""
         results = {
@@ -387,6 +746,11 @@ class DatabaseManager:
         }
         
         try:
+            # Índice de búsqueda unificado: una sola consulta para los tres tipos
+            engine_results = self.search_engine.search_global(query, limit)
+            if engine_results is not None:
+                return engine_results
+            
             with self.get_connection() as conn:
                 search_term = f"%{query}%"
                 
@@ -462,59 +826,20 @@ class DatabaseManager:
                 
                 logger.debug(f"Buscando canciones para: {artist_name} - {album_name}")
                 
-                # Estrategia 1: Búsqueda exacta por álbum y artista
-                tracks = []
-                if album_name and artist_name:
-                    cursor = conn.execute("""
-                        SELECT * FROM songs 
-                        WHERE album = ? AND artist = ?
-                        ORDER BY track_number
-                    """, (album_name, artist_name))
-                    tracks = [dict(row) for row in cursor.fetchall()]
-                    
-                    if tracks:
-                        logger.debug(f"Estrategia 1 exitosa: {len(tracks)} canciones encontradas")
-                
-                # Estrategia 2: Búsqueda flexible por álbum (si la primera no funciona)
-                if not tracks and album_name:
-                    cursor = conn.execute("""
-                        SELECT * FROM songs 
-                        WHERE album LIKE ?
-                        ORDER BY track_number
-                    """, (f"%{album_name}%",))
-                    all_tracks = [dict(row) for row in cursor.fetchall()]
-                    
-                    # Filtrar por artista si es necesario
-                    if artist_name and all_tracks:
-                        tracks = [t for t in all_tracks if artist_name.lower() in t.get('artist', '').lower()]
-                    else:
-                        tracks = all_tracks
-                    
-                    if tracks:
-                        logger.debug(f"Estrategia 2 exitosa: {len(tracks)} canciones encontradas")
-                
-                # Estrategia 3: Búsqueda por artista similar (último recurso)
-                if not tracks and artist_name:
-                    cursor = conn.execute("""
-                        SELECT * FROM songs 
-                        WHERE artist LIKE ?
-                        ORDER BY album, track_number
-                    """, (f"%{artist_name}%",))
-                    all_tracks = [dict(row) for row in cursor.fetchall()]
-                    
-                    # Filtrar manualmente por álbum
-                    if album_name and all_tracks:
-                        tracks = [t for t in all_tracks if album_name.lower() in t.get('album', '').lower()]
-                    
-                    if tracks:
-                        logger.debug(f"Estrategia 3 exitosa: {len(tracks)} canciones encontradas")
+                # Resolución precalculada; las estrategias solo se usan sin tabla derivada
+                # Aquí se añaden rutas a cada canción, así que se necesitan dicts
+                tracks = self._get_resolved_album_tracks(conn, album_id, TRACKS_WITH_PATHS_MATCHES)
+                if tracks is None:
+                    tracks = self._search_album_tracks(conn, album_name, artist_name)
+                else:
+                    tracks = tracks.to_dicts()
                 
                 if not tracks:
                     logger.warning(f"No se encontraron canciones para el álbum {album_id}")
                     return []
                 
                 # Enriquecer con información de rutas y metadatos
-                for track in tracks:
+                for position, track in enumerate(tracks):
                     # Añadir información del álbum
                     track['album_name'] = album_name
                     track['artist_name'] = artist_name
@@ -530,7 +855,7 @@ class DatabaseManager:
                         track['best_path'] = None
                     
                     # Log de debug para las primeras canciones
-                    if tracks.index(track) < 3:
+                    if position < 3:
                         logger.debug(f"Canción: {track.get('title')} - Ruta: {track.get('best_path')}")
                 
                 logger.info(f"Obtenidas {len(tracks)} canciones para álbum {album_id} ({artist_name} - {album_name})")
@@ -540,6 +865,90 @@ class DatabaseManager:
             logger.error(f"Error obteniendo canciones con rutas del álbum {album_id}: {e}")
             return []
     
+    def _get_resolved_album_tracks(self, conn, album_id: int, match_types: Tuple[str, ...]) -> Optional[RowSet]:
+        """Canciones del álbum según derived.album_tracks (None si no está disponible)"""
+        if not self.derived.is_ready('album_tracks'):
+            return None
+        try:
+            resolution = conn.execute(
+                "SELECT match_type FROM derived.album_resolution WHERE album_id = ?", (album_id,)
+            ).fetchone()
+            if resolution is None:
+                # Álbum posterior a la última resolución
+                return None
+            
+            placeholders = ','.join('?' for _ in match_types)
+            resolved = RowSet.from_query(conn, f"""
+                SELECT t.match_type AS _match_type, s.*
+                FROM derived.album_tracks t
+                JOIN songs s ON s.id = t.song_id
+                WHERE t.album_id = ? AND t.match_type IN ({placeholders})
+                ORDER BY t.match_type, t.position
+            """, (album_id,) + tuple(match_types))
+            
+            by_type = {}
+            for row in resolved.rows:
+                by_type.setdefault(row[0], []).append(row[1:])
+            columns = resolved.columns[1:]
+            for match_type in match_types:
+                if by_type.get(match_type):
+                    return RowSet(columns, by_type[match_type])
+            return RowSet(columns, [])
+        except sqlite3.Error as e:
+            logger.debug(f"Tabla derivada album_tracks no disponible: {e}")
+            return None
+    
+    def _search_album_tracks(self, conn, album_name: str, artist_name: str) -> List[Dict]:
+        """Búsqueda directa por nombre (respaldo cuando no hay tabla derivada)"""
+        # Estrategia 1: Búsqueda exacta por álbum y artista
+        tracks = []
+        if album_name and artist_name:
+            cursor = conn.execute("""
+                SELECT * FROM songs 
+                WHERE album = ? AND artist = ?
+                ORDER BY track_number
+            """, (album_name, artist_name))
+            tracks = [dict(row) for row in cursor.fetchall()]
+            
+            if tracks:
+                logger.debug(f"Estrategia 1 exitosa: {len(tracks)} canciones encontradas")
+        
+        # Estrategia 2: Búsqueda flexible por álbum (si la primera no funciona)
+        if not tracks and album_name:
+            cursor = conn.execute("""
+                SELECT * FROM songs 
+                WHERE album LIKE ?
+                ORDER BY track_number
+            """, (f"%{album_name}%",))
+            all_tracks = [dict(row) for row in cursor.fetchall()]
+            
+            # Filtrar por artista si es necesario
+            if artist_name and all_tracks:
+                tracks = [t for t in all_tracks if artist_name.lower() in (t.get('artist') or '').lower()]
+            else:
+                tracks = all_tracks
+            
+            if tracks:
+                logger.debug(f"Estrategia 2 exitosa: {len(tracks)} canciones encontradas")
+        
+        # Estrategia 3: Búsqueda por artista similar (último recurso)
+        if not tracks and artist_name:
+            cursor = conn.execute("""
+                SELECT * FROM songs 
+                WHERE artist LIKE ?
+                ORDER BY album, track_number
+            """, (f"%{artist_name}%",))
+            all_tracks = [dict(row) for row in cursor.fetchall()]
+            
+            # Filtrar manualmente por álbum
+            if album_name and all_tracks:
+                tracks = [t for t in all_tracks if album_name.lower() in (t.get('album') or '').lower()]
+            
+            if tracks:
+                logger.debug(f"Estrategia 3 exitosa: {len(tracks)} canciones encontradas")
+        
+        return tracks
+    
     def _determine_best_path(self, track: Dict, path_fields: List[str]) -> Optional[str]:
         """Determina la mejor ruta de archivo para una canción - VERSION MEJORADA"""
         
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import logging
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs por defecto para las conexiones de lectura
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'mmap_size': 268435456,  # 256MB
+    'cache_size': -65536,    # 64MB (valor negativo = KiB)
+    'temp_store': 'MEMORY',
+}
+
+
+class _ThreadSlot:
+    """Conexión asignada a un hilo; vuelve al pool cuando el hilo termina"""
+
+    def __init__(self, pool, conn, generation):
+        self.conn = conn
+        self.generation = generation
+        # El finalizador se ejecuta al destruirse el threading.local del hilo
+        weakref.finalize(self, pool._release, conn, generation)
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite compartido por todos los managers
+
+    - Una conexión de lectura por hilo, abierta una sola vez con PRAGMAs
+      ajustados y `query_only`. Cuando el hilo termina (el servidor de
+      desarrollo crea un hilo por petición) la conexión queda libre y la
+      reutiliza el siguiente hilo.
+    - Una única conexión de escritura serializada con un lock.
+    - Las lecturas pueden redirigirse a una copia local (ver db_replica)
+      con `swap()`; la escritura siempre va a la base de datos original.
+    """
+
+    def __init__(self, db_path: str, config: dict = None):
+        self.config = config or {}
+        db_config = self.config.get('database', {})
+        pool_config = db_config.get('pool', {})
+
+        self.db_path = db_path
+        self.read_path = db_path
+        self.generation = 0
+        self.attachments = {}
+        self.attachment_versions = {}
+        self.functions = {}
+        self.timeout = db_config.get('timeout', 30)
+        self.max_idle = pool_config.get('max_idle', 16)
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pool_config.get('pragmas', {}))
+
+        self._local = threading.local()
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'released': 0,
+            'discarded': 0,
+            'writer_acquisitions': 0,
+            'swaps': 0
+        }
+
+    # === LECTURA ===
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Devuelve la conexión de lectura del hilo actual"""
+        slot = getattr(self._local, 'slot', None)
+        if slot is not None and slot.generation == self.generation:
+            self._count('hits')
+            return slot.conn
+
+        conn = None
+        with self._lock:
+            generation = self.generation
+            read_path = self.read_path
+            if self._idle:
+                conn = self._idle.pop()
+
+        if conn is not None:
+            self._count('hits')
+        else:
+            self._count('misses')
+            conn = self._open_reader(read_path)
+
+        # Si había una conexión de una generación anterior se libera al
+        # sustituir el slot; las consultas en curso conservan su referencia
+        self._local.slot = _ThreadSlot(self, conn, generation)
+        return conn
+
+    def _open_reader(self, path: str) -> sqlite3.Connection:
+        """Abre una conexión de lectura con los PRAGMAs configurados"""
+        conn = sqlite3.connect(path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn)
+        for name, (num_params, func) in self.functions.items():
+            conn.create_function(name, num_params, func, deterministic=True)
+        for alias, attach_path in self.attachments.items():
+            try:
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (attach_path,))
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo adjuntar {attach_path} como {alias}: {e}")
+        try:
+            conn.execute("PRAGMA query_only = ON")
+        except sqlite3.Error as e:
+            logger.debug(f"No se pudo activar query_only: {e}")
+        return conn
+
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """Aplica los PRAGMAs de rendimiento; ignora los que el fichero no admite"""
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.Error as e:
+                # p.ej. journal_mode=WAL sobre una BD montada en solo lectura
+                logger.debug(f"PRAGMA {name}={value} no aplicado: {e}")
+
+    def _release(self, conn: sqlite3.Connection, generation: int):
+        """Devuelve una conexión al pool al terminar su hilo"""
+        with self._lock:
+            if generation != self.generation:
+                # Conexión a un snapshot antiguo: no se cierra explícitamente
+                # por si alguna consulta la sigue usando; se cierra al liberarse
+                self.stats['discarded'] += 1
+                return
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                self.stats['released'] += 1
+                return
+            self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def swap(self, read_path: str):
+        """Redirige las lecturas a otra ruta sin cortar las peticiones en curso
+
+        Cada hilo obtiene una conexión nueva en su siguiente get_connection();
+        las conexiones antiguas se liberan cuando dejan de usarse.
+        """
+        with self._lock:
+            self.read_path = read_path
+            self.generation += 1
+            self.stats['swaps'] += 1
+            stale = list(self._idle)
+            self._idle.clear()
+        for conn in stale:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        logger.info(f"Lecturas redirigidas a {read_path} (generación {self.generation})")
+
+    def attach(self, alias: str, path: str):
+        """Adjunta otra base de datos (p.ej. la de datos derivados) a todas las lecturas"""
+        with self._lock:
+            self.attachments[alias] = path
+            self.generation += 1
+            stale = list(self._idle)
+            self._idle.clear()
+        for conn in stale:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        logger.info(f"Base de datos {path} adjuntada como '{alias}' en las lecturas")
+
+    def create_function(self, name: str, num_params: int, func):
+        """Registra una función SQL en todas las lecturas (p.ej. claves normalizadas)"""
+        with self._lock:
+            self.functions[name] = (num_params, func)
+            self.generation += 1
+            stale = list(self._idle)
+            self._idle.clear()
+        for conn in stale:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        logger.debug(f"Función SQL {name} registrada en las lecturas")
+
+    def touch_attachment(self, alias: str):
+        """Marca que han cambiado los datos de una BD adjunta (p.ej. tablas derivadas reconstruidas)"""
+        with self._lock:
+            self.attachment_versions[alias] = self.attachment_versions.get(alias, 0) + 1
+
+    @property
+    def attachments_token(self) -> Tuple:
+        """Versión de los datos de las BD adjuntas (cambia con cada touch_attachment)"""
+        with self._lock:
+            return tuple(sorted(self.attachment_versions.items()))
+
+    def data_token(self) -> str:
+        """Identifica la versión de los datos que se están leyendo
+
+        Cambia con cada snapshot nuevo de la réplica y, sin réplica, cuando
+        cambian el tamaño o la fecha del fichero (o de su WAL).
+        """
+        read_path = self.read_path
+        parts = [read_path]
+        for path in (read_path, read_path + '-wal'):
+            try:
+                st = os.stat(path)
+                parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                parts.append('-')
+        return '|'.join(parts)
+
+    @property
+    def change_token(self) -> int:
+        """Identificador que cambia cada vez que se cambia el snapshot de lectura"""
+        return self.generation
+
+    # === ESCRITURA ===
+
+    @contextmanager
+    def writer(self):
+        """Conexión de escritura única, serializada entre hilos"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+                self._writer.row_factory = sqlite3.Row
+                self._apply_pragmas(self._writer)
+            self._count('writer_acquisitions')
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    # === MÉTRICAS ===
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        """Contadores de aciertos/fallos del pool"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self._idle)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total * 100, 2) if total else 0.0
+        stats['db_path'] = self.db_path
+        stats['read_path'] = self.read_path
+        stats['generation'] = self.generation
+        return stats
+
+    def close_all(self):
+        """Cierra las conexiones libres y la de escritura"""
+        with self._lock:
+            while self._idle:
+                try:
+                    self._idle.pop().close()
+                except Exception:
+                    pass
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+# Registro de pools por ruta, compartido por DatabaseManager, StatsManager e ImageManager
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, config: dict = None) -> ConnectionPool:
+    """Obtiene (o crea) el pool compartido para una base de datos"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, config)
+            _pools[db_path] = pool
+            logger.info(f"Pool de conexiones creado para {db_path}")
+        return pool
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseReplica:
+    """Copia local (disco o tmpfs) de musica.sqlite para no leer a través de NFS
+
+    Al arrancar copia la base de datos con la API de backup online de SQLite
+    y, en segundo plano, vuelve a copiarla cuando cambia el fichero origen.
+    Cada copia se escribe con un nombre nuevo y después se hace `pool.swap()`,
+    de modo que las peticiones en curso terminan sobre el snapshot anterior.
+    """
+
+    def __init__(self, pool: ConnectionPool, config: dict):
+        replica_config = config.get('database', {}).get('replica', {})
+
+        self.pool = pool
+        self.source_path = pool.db_path
+        self.enabled = replica_config.get('enabled', False)
+        self.replica_dir = replica_config.get('dir', '/dev/shm/music_web_explorer')
+        self.poll_interval = replica_config.get('poll_interval', 30)
+        self.keep_snapshots = max(1, replica_config.get('keep_snapshots', 2))
+        self.pages_per_step = replica_config.get('pages_per_step', 4096)
+
+        self.current_path = None
+        self.last_refresh = None
+        self.last_duration = None
+        self.last_error = None
+        self.refresh_count = 0
+
+        self._signature = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # === CICLO DE VIDA ===
+
+    def start(self) -> bool:
+        """Crea el snapshot inicial y lanza el hilo de refresco"""
+        if not self.enabled:
+            return False
+
+        if not os.path.exists(self.source_path):
+            logger.warning(f"Réplica deshabilitada: no existe {self.source_path}")
+            return False
+
+        try:
+            os.makedirs(self.replica_dir, exist_ok=True)
+            self._remove_stale_files()
+        except Exception as e:
+            logger.error(f"No se pudo preparar el directorio de réplica {self.replica_dir}: {e}")
+            return False
+
+        if not self.refresh():
+            return False
+
+        self._thread = threading.Thread(target=self._watch_loop, name='db-replica', daemon=True)
+        self._thread.start()
+        logger.info(f"Réplica local activa en {self.replica_dir} (comprobación cada {self.poll_interval}s)")
+        return True
+
+    def stop(self):
+        """Detiene el hilo de refresco"""
+        self._stop_event.set()
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """Registra una función que se llama con la ruta de cada snapshot nuevo
+
+        Se ejecuta antes de redirigir las lecturas, así que puede preparar
+        el snapshot (índices, migraciones...) sin que nadie lo esté leyendo.
+        """
+        self._listeners.append(callback)
+
+    # === REFRESCO ===
+
+    def _source_signature(self) -> Optional[Tuple]:
+        """Firma del fichero origen (y su WAL si existe) para detectar cambios"""
+        signature = []
+        for path in (self.source_path, self.source_path + '-wal'):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+            except OSError as e:
+                logger.debug(f"No se pudo leer {path}: {e}")
+                return None
+        return tuple(signature)
+
+    def refresh(self, force: bool = True) -> bool:
+        """Copia la base de datos origen a un snapshot nuevo y lo activa"""
+        with self._refresh_lock:
+            signature = self._source_signature()
+            if not force and signature == self._signature:
+                return False
+
+            started = time.time()
+            snapshot_path = os.path.join(
+                self.replica_dir,
+                f"musica.{int(started * 1000)}.sqlite"
+            )
+            tmp_path = snapshot_path + '.tmp'
+
+            try:
+                source = sqlite3.connect(f"file:{self.source_path}?mode=ro", uri=True, timeout=self.pool.timeout)
+                target = sqlite3.connect(tmp_path)
+                try:
+                    source.backup(target, pages=self.pages_per_step)
+                finally:
+                    target.close()
+                    source.close()
+
+                os.replace(tmp_path, snapshot_path)
+
+                for callback in self._listeners:
+                    try:
+                        callback(snapshot_path)
+                    except Exception as e:
+                        logger.error(f"Error preparando snapshot {snapshot_path}: {e}")
+
+                self.pool.swap(snapshot_path)
+
+                self.current_path = snapshot_path
+                self._signature = signature
+                self.last_refresh = datetime.now().isoformat()
+                self.last_duration = round(time.time() - started, 3)
+                self.last_error = None
+                self.refresh_count += 1
+                logger.info(f"Snapshot de BD actualizado en {self.last_duration}s: {snapshot_path}")
+
+                self._cleanup_old_snapshots()
+                return True
+
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error copiando base de datos a réplica: {e}")
+                for path in (tmp_path, snapshot_path):
+                    if path != self.current_path and os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                return False
+
+    def _watch_loop(self):
+        """Comprueba periódicamente si el origen ha cambiado"""
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh(force=False)
+            except Exception as e:
+                logger.error(f"Error en hilo de réplica: {e}")
+
+    # === LIMPIEZA ===
+
+    def _snapshot_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.replica_dir, 'musica.*.sqlite')))
+
+    def _remove_files(self, snapshot_path: str):
+        # Borrar un fichero abierto es seguro: las conexiones antiguas lo
+        # siguen leyendo hasta cerrarse
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            try:
+                os.remove(snapshot_path + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.debug(f"No se pudo borrar {snapshot_path + suffix}: {e}")
+
+    def _cleanup_old_snapshots(self):
+        """Conserva solo los últimos snapshots"""
+        snapshots = [p for p in self._snapshot_files() if p != self.current_path]
+        excess = len(snapshots) - (self.keep_snapshots - 1)
+        for path in snapshots[:max(0, excess)]:
+            self._remove_files(path)
+
+    def _remove_stale_files(self):
+        """Elimina restos de ejecuciones anteriores"""
+        for path in self._snapshot_files():
+            self._remove_files(path)
+        for path in glob.glob(os.path.join(self.replica_dir, 'musica.*.sqlite.tmp')):
+            self._remove_files(path)
+
+    # === ESTADO ===
+
+    def get_status(self) -> Dict:
+        """Estado de la réplica para los endpoints de sistema"""
+        return {
+            'enabled': self.enabled,
+            'active': self.current_path is not None,
+            'source_path': self.source_path,
+            'snapshot_path': self.current_path,
+            'last_refresh': self.last_refresh,
+            'last_duration_s': self.last_duration,
+            'refresh_count': self.refresh_count,
+            'poll_interval': self.poll_interval,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import quote
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Separa los valores de row_hash() para que ('ab', 'c') y ('a', 'bc') no coincidan
+_HASH_SEPARATOR = '\x1f'
+
+
+def row_hash(*values) -> int:
+    """crc32 del contenido de una fila (registrada como `mwe_row_hash` en los trabajos)
+
+    Las huellas de las marcas de agua suman este valor por fila: a diferencia
+    de las longitudes, cambia también al editar un texto sin alterar su tamaño.
+    """
+    payload = _HASH_SEPARATOR.join('\x00' if value is None else str(value) for value in values)
+    return zlib.crc32(payload.encode('utf-8'))
+
+
+def rows_hash(conn, table: str, columns: List[str], after_rowid: int, up_to_rowid: int) -> int:
+    """Suma de mwe_row_hash() de las filas con after_rowid < rowid <= up_to_rowid
+
+    Al ser una suma, la huella de un rango ampliado es la del rango anterior
+    más la de las filas nuevas: las comprobaciones incrementales detectan
+    las filas ya procesadas que se han editado o sustituido.
+    """
+    return conn.execute(f"""
+        SELECT COALESCE(SUM(mwe_row_hash(rowid, {', '.join(columns)})), 0)
+        FROM {table}
+        WHERE rowid > ? AND rowid <= ?
+    """, (after_rowid, up_to_rowid)).fetchone()[0]
+
+
+class DerivedJob:
+    """Trabajo que materializa tablas en la base de datos de datos derivados
+
+    Las subclases definen `name`, `version` y `build()`. `build()` recibe una
+    conexión cuya base principal es la de datos derivados, que tiene la BD
+    musical adjunta como `src` y la función `mwe_row_hash()`; devuelve la
+    marca de agua que se guardará en `derived_meta` y que recibirá en la
+    siguiente ejecución.
+    """
+
+    name = None
+    version = 1
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        raise NotImplementedError
+
+
+class DerivedStore:
+    """Base de datos auxiliar (sidecar) con tablas precalculadas
+
+    musica.sqlite se monta en solo lectura, así que las tablas derivadas se
+    guardan en un fichero propio de la aplicación que se adjunta como
+    `derived` a todas las conexiones de lectura del pool. Un hilo en segundo
+    plano vuelve a ejecutar los trabajos cuando cambia la BD de origen.
+    """
+
+    def __init__(self, pool, config: dict):
+        derived_config = config.get('database', {}).get('derived', {})
+
+        self.pool = pool
+        self.enabled = derived_config.get('enabled', True)
+        self.path = derived_config.get('path', '/app/data/musica_derived.sqlite')
+        self.check_interval = derived_config.get('check_interval', 10)
+
+        self.jobs: List[DerivedJob] = []
+        self.last_error = None
+        self._meta: Dict[str, Dict] = {}
+        self._source_token = None
+        self._initialized = False
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # === CICLO DE VIDA ===
+
+    def register(self, job: DerivedJob):
+        """Registra un trabajo de materialización"""
+        self.jobs.append(job)
+
+    def initialize(self) -> bool:
+        """Crea el fichero auxiliar y lo adjunta a las lecturas del pool"""
+        if not self.enabled:
+            return False
+        if self._initialized:
+            return True
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=self.pool.timeout)
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS derived_meta (
+                        name TEXT PRIMARY KEY,
+                        version INTEGER NOT NULL,
+                        source_token TEXT,
+                        watermark TEXT,
+                        rows INTEGER,
+                        mode TEXT,
+                        built_at TEXT,
+                        duration_s REAL
+                    )
+                """)
+                conn.commit()
+                for row in conn.execute("SELECT * FROM derived_meta"):
+                    self._meta[row[0]] = self._meta_from_row(row)
+            finally:
+                conn.close()
+
+            self.pool.attach('derived', self.path)
+            self._initialized = True
+            logger.info(f"Datos derivados en {self.path}")
+            return True
+
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"No se pudo inicializar la BD de datos derivados {self.path}: {e}")
+            return False
+
+    def start(self):
+        """Ejecuta los trabajos pendientes en segundo plano y vigila cambios"""
+        if not self.initialize():
+            return
+
+        self._thread = threading.Thread(target=self._watch_loop, name='derived-store', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _watch_loop(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Error en el planificador de datos derivados: {e}")
+            if self._stop_event.wait(self.check_interval):
+                break
+
+    # === EJECUCIÓN ===
+
+    def _open_job_connection(self, read_path: str) -> sqlite3.Connection:
+        """Conexión escribible al sidecar con la BD de origen adjunta como `src`"""
+        conn = sqlite3.connect(self.path, timeout=self.pool.timeout, uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.create_function('mwe_row_hash', -1, row_hash, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{quote(read_path)}?mode=ro",))
+        return conn
+
+    def run_pending(self, force: bool = False) -> List[str]:
+        """Ejecuta los trabajos cuya versión o BD de origen han cambiado"""
+        if not self._initialized:
+            return []
+
+        with self._run_lock:
+            token = self.pool.data_token()
+            pending = [
+                job for job in self.jobs
+                if force or self._needs_run(job, token)
+            ]
+            if not pending:
+                return []
+
+            executed = []
+            read_path = self.pool.read_path
+            conn = self._open_job_connection(read_path)
+            try:
+                for job in pending:
+                    if self._run_job(conn, job, token):
+                        executed.append(job.name)
+            finally:
+                conn.close()
+            self._source_token = token
+            return executed
+
+    def _needs_run(self, job: DerivedJob, token: str) -> bool:
+        meta = self._meta.get(job.name)
+        if not meta or meta['version'] != job.version:
+            return True
+        return meta.get('source_token') != token
+
+    def _run_job(self, conn: sqlite3.Connection, job: DerivedJob, token: str) -> bool:
+        started = time.time()
+        previous = self._meta.get(job.name)
+        if previous and previous['version'] != job.version:
+            previous = None
+
+        try:
+            # Transacción explícita: sqlite3 no abre una antes de DROP/CREATE y los
+            # lectores verían las tablas a medio reconstruir
+            conn.execute("BEGIN")
+            result = job.build(conn, previous) or {}
+            meta = {
+                'name': job.name,
+                'version': job.version,
+                'source_token': token,
+                'watermark': result.get('watermark'),
+                'rows': result.get('rows'),
+                'mode': result.get('mode', 'full'),
+                'built_at': datetime.now().isoformat(),
+                'duration_s': round(time.time() - started, 3)
+            }
+            conn.execute("""
+                INSERT OR REPLACE INTO derived_meta
+                    (name, version, source_token, watermark, rows, mode, built_at, duration_s)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (meta['name'], meta['version'], meta['source_token'],
+                  json.dumps(meta['watermark']) if meta['watermark'] is not None else None,
+                  meta['rows'], meta['mode'], meta['built_at'], meta['duration_s']))
+            conn.commit()
+
+            self._meta[job.name] = meta
+            # Las cachés de resultados ven el cambio aunque la BD de origen siga igual
+            self.pool.touch_attachment('derived')
+            logger.info(f"Tabla derivada '{job.name}' actualizada ({meta['mode']}, "
+                        f"{meta['rows']} filas) en {meta['duration_s']}s")
+            return True
+
+        except Exception as e:
+            conn.rollback()
+            self.last_error = f"{job.name}: {e}"
+            logger.error(f"Error materializando '{job.name}': {e}")
+            return False
+
+    @staticmethod
+    def _meta_from_row(row) -> Dict:
+        watermark = row[3]
+        try:
+            watermark = json.loads(watermark) if watermark else None
+        except ValueError:
+            watermark = None
+        return {
+            'name': row[0],
+            'version': row[1],
+            'source_token': row[2],
+            'watermark': watermark,
+            'rows': row[4],
+            'mode': row[5],
+            'built_at': row[6],
+            'duration_s': row[7]
+        }
+
+    # === CONSULTA ===
+
+    def is_ready(self, name: str) -> bool:
+        """True si la tabla derivada está construida con la versión actual del trabajo"""
+        meta = self._meta.get(name)
+        if not meta:
+            return False
+        job = next((j for j in self.jobs if j.name == name), None)
+        return job is None or meta['version'] == job.version
+
+    def get_meta(self, name: str) -> Optional[Dict]:
+        """Metadatos de la última construcción de un trabajo (None si no se ha construido)"""
+        return self._meta.get(name)
+
+    def get_status(self) -> Dict:
+        """Estado de los trabajos para los endpoints de sistema"""
+        return {
+            'enabled': self.enabled,
+            'initialized': self._initialized,
+            'path': self.path,
+            'last_error': self.last_error,
+            'jobs': {
+                job.name: {
+                    'ready': self.is_ready(job.name),
+                    **{k: v for k, v in (self._meta.get(job.name) or {}).items()
+                       if k not in ('name', 'watermark', 'source_token')}
+                }
+                for job in self.jobs
+            }
+        }
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import sqlite3
+import decimal
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+# Codificadores opcionales: se usa el más rápido disponible
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+
+class RowSet(Sequence):
+    """Resultado de una consulta como tuplas con una cabecera de columnas compartida
+
+    Evita crear un dict por fila al leer de SQLite: las filas se guardan tal
+    cual las devuelve el cursor y solo se convierten a objetos al serializar
+    (o al acceder a una fila concreta, que devuelve un dict nuevo).
+    """
+
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns: Sequence[str], rows: List[tuple]):
+        self.columns = tuple(columns)
+        self.rows = rows
+
+    @classmethod
+    def from_query(cls, conn: sqlite3.Connection, query: str, params: tuple = ()) -> 'RowSet':
+        """Ejecuta la consulta con filas tupla (sin sqlite3.Row)"""
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        return cls(columns, cursor.fetchall())
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowSet(self.columns, self.rows[index])
+        return dict(zip(self.columns, self.rows[index]))
+
+    def __iter__(self) -> Iterator[Dict]:
+        columns = self.columns
+        for row in self.rows:
+            yield dict(zip(columns, row))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RowSet):
+            return self.columns == other.columns and self.rows == other.rows
+        if isinstance(other, list):
+            return self.to_dicts() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RowSet(columns={list(self.columns)}, rows={len(self.rows)})"
+
+    def column(self, name: str) -> List[Any]:
+        """Valores de una columna"""
+        position = self.columns.index(name)
+        return [row[position] for row in self.rows]
+
+    def with_column(self, name: str, value_fn: Callable[[tuple], Any]) -> 'RowSet':
+        """Nuevo RowSet con una columna calculada a partir de cada tupla"""
+        return RowSet(self.columns + (name,), [row + (value_fn(row),) for row in self.rows])
+
+    def with_constants(self, values: Dict[str, Any]) -> 'RowSet':
+        """Nuevo RowSet con columnas de valor fijo (p.ej. el álbum de todas las canciones)"""
+        extra = tuple(values.values())
+        return RowSet(self.columns + tuple(values), [row + extra for row in self.rows])
+
+    def to_dicts(self) -> List[Dict]:
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+def _default(obj):
+    """Tipos que los codificadores no conocen"""
+    if isinstance(obj, RowSet):
+        return obj.to_dicts()
+    if isinstance(obj, sqlite3.Row):
+        return dict(zip(obj.keys(), obj))
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no serializable a JSON")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask con orjson/msgspec y MessagePack opcional
+
+    Sustituye al codificador de la biblioteca estándar cuando hay uno más
+    rápido instalado, serializa RowSet directamente y, si el cliente lo pide
+    con `Accept: application/x-msgpack`, responde en MessagePack.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        if ORJSON_AVAILABLE:
+            self.backend = 'orjson'
+        elif MSGSPEC_AVAILABLE:
+            self.backend = 'msgspec'
+            self._msgspec_encoder = msgspec.json.Encoder(enc_hook=_default)
+        else:
+            self.backend = 'json'
+        logger.info(f"Codificador JSON: {self.backend}"
+                    f"{' (+ msgpack)' if MSGPACK_AVAILABLE else ''}")
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def dumps_bytes(self, obj: Any, **kwargs) -> bytes:
+        if not kwargs:
+            try:
+                if self.backend == 'orjson':
+                    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+                if self.backend == 'msgspec':
+                    return self._msgspec_encoder.encode(obj)
+            except (TypeError, ValueError, OverflowError) as e:
+                # Enteros de más de 64 bits, claves raras...: se usa la biblioteca estándar
+                logger.debug(f"Codificador {self.backend} no pudo serializar, usando json: {e}")
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs).encode('utf-8')
+
+    def loads(self, s, **kwargs) -> Any:
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+
+        if MSGPACK_AVAILABLE and self._wants_msgpack():
+            body = msgpack.packb(obj, default=_default, use_bin_type=True)
+            return self._app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+    @staticmethod
+    def _wants_msgpack() -> bool:
+        try:
+            accept = request.accept_mimetypes
+        except RuntimeError:
+            return False
+        # Solo si se prefiere explícitamente a JSON (un navegador con */* recibe JSON)
+        return accept[MSGPACK_MIMETYPE] > accept['application/json']
+
+    def get_stats(self) -> Dict:
+        return {
+            'backend': self.backend,
+            'orjson': ORJSON_AVAILABLE,
+            'msgspec': MSGSPEC_AVAILABLE,
+            'msgpack': MSGPACK_AVAILABLE
+        }
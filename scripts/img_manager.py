@@ -11,6 +11,8 @@ import json
 import requests
 from urllib.parse import urlparse
 
+from db_pool import get_pool
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,6 +23,7 @@ class ImageManager:
     def __init__(self, config):
         self.config = config
         self.db_path = config.get('database', {}).get('path', '/app/data/musica.sqlite')
+        self.pool = get_pool(self.db_path, config)
         self.images_dir = config.get('paths', {}).get('images', '/app/images')
         self.cache_enabled = config.get('images', {}).get('cache_enabled', True)
         self.max_size = config.get('images', {}).get('max_size', 1024)
@@ -141,11 +144,9 @@ class ImageManager:
             logger.warning(f"Error creando imágenes por defecto: {e}")
     
     def get_db_connection(self):
-        """Obtiene conexión a la base de datos"""
+        """Obtiene la conexión de lectura del hilo actual desde el pool"""
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self.pool.get_connection()
         except Exception as e:
             logger.error(f"Error conectando a la base de datos: {e}")
             raise
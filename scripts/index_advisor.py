@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from time_columns import apply_time_columns, pending_time_columns
+
+logger = logging.getLogger(__name__)
+
+# Índices que necesitan las consultas calientes de la aplicación.
+# Solo se crean si la tabla y todas las columnas existen.
+RECOMMENDED_INDEXES = [
+    {
+        'name': 'idx_mwe_songs_artist_title',
+        'table': 'songs',
+        'columns': ['artist', 'title'],
+        'reason': 'JOIN scrobbles -> songs por artist/title en ScrobblesAnalysisEndpoints'
+    },
+    {
+        'name': 'idx_mwe_songs_album_artist',
+        'table': 'songs',
+        'columns': ['album', 'artist', 'track_number'],
+        'reason': 'get_album_tracks_by_id filtra por album/artist y ordena por track_number'
+    },
+    {
+        'name': 'idx_mwe_albums_artist_name',
+        'table': 'albums',
+        'columns': ['artist_id', 'name'],
+        'reason': 'JOIN songs -> albums por artist_id/name (sellos, colaboradores)'
+    },
+    {
+        'name': 'idx_mwe_artists_name',
+        'table': 'artists',
+        'columns': ['name'],
+        'reason': 'Listado y búsqueda de artistas ordenados por nombre'
+    },
+    {
+        'name': 'idx_mwe_scrobbles_paqueradejere_artist_track',
+        'table': 'scrobbles_paqueradejere',
+        'columns': ['artist_name', 'track_name'],
+        'reason': 'JOIN por artist_name/track_name y agregados por artista'
+    },
+    {
+        'name': 'idx_mwe_scrobbles_paqueradejere_date',
+        'table': 'scrobbles_paqueradejere',
+        'columns': ['scrobble_date'],
+        'reason': 'Filtros por rango de fechas en análisis temporales'
+    },
+    {
+        'name': 'idx_mwe_scrobbles_paqueradejere_artist_id',
+        'table': 'scrobbles_paqueradejere',
+        'columns': ['artist_id', 'track_name', 'scrobble_date'],
+        'reason': 'Escuchas de un artista/álbum (análisis de escuchas)'
+    },
+    {
+        'name': 'idx_mwe_listens_guevifrito_artist_id',
+        'table': 'listens_guevifrito',
+        'columns': ['artist_id', 'track_name', 'listen_date'],
+        'reason': 'Escuchas de ListenBrainz de un artista/álbum'
+    },
+    {
+        'name': 'idx_mwe_artists_setlistfm_artist_date',
+        'table': 'artists_setlistfm',
+        'columns': ['artist_id', 'eventDate'],
+        'reason': 'Conciertos de un artista ordenados por fecha'
+    },
+    {
+        'name': 'idx_mwe_scrobbles_artist_name',
+        'table': 'scrobbles',
+        'columns': ['artist_name'],
+        'reason': 'Artistas populares (LEFT JOIN scrobbles por artist_name)'
+    },
+]
+
+# Consultas calientes que se auditan siempre, además de las registradas en ejecución
+HOT_STATEMENTS = [
+    ('get_album_tracks_by_id',
+     "SELECT * FROM songs WHERE album = ? AND artist = ? ORDER BY track_number"),
+    ('get_popular_artists',
+     "SELECT a.*, COUNT(s.id) as play_count FROM artists a "
+     "LEFT JOIN scrobbles s ON a.name = s.artist_name "
+     "GROUP BY a.id, a.name ORDER BY play_count DESC, a.name LIMIT ?"),
+    ('artists_list',
+     "SELECT id, name FROM artists WHERE name IS NOT NULL AND name != '' ORDER BY name LIMIT ?"),
+    ('scrobbles_generos',
+     "SELECT s.genre, COUNT(*) as scrobbles FROM scrobbles_paqueradejere sp "
+     "JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name "
+     "WHERE s.genre IS NOT NULL AND s.genre != '' GROUP BY s.genre ORDER BY scrobbles DESC"),
+    ('scrobbles_sellos',
+     "SELECT a.label, COUNT(*) as scrobbles FROM scrobbles_paqueradejere sp "
+     "JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name "
+     "JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album "
+     "WHERE a.label IS NOT NULL AND a.label != '' GROUP BY a.label ORDER BY scrobbles DESC"),
+    ('scrobbles_ultimo_anio',
+     "SELECT strftime('%Y-%m', scrobble_date) as month, COUNT(*) as scrobbles "
+     "FROM scrobbles_paqueradejere WHERE scrobble_date >= date('now', '-12 months') "
+     "GROUP BY month ORDER BY month"),
+    ('artist_listens_lastfm',
+     "SELECT track_name, scrobble_date, COUNT(*) as plays FROM scrobbles_paqueradejere "
+     "WHERE artist_id = ? GROUP BY track_name, DATE(scrobble_date) ORDER BY scrobble_date"),
+    ('artist_listens_listenbrainz',
+     "SELECT track_name, listen_date, COUNT(*) as plays FROM listens_guevifrito "
+     "WHERE artist_id = ? GROUP BY track_name, DATE(listen_date) ORDER BY listen_date"),
+    ('artist_concerts',
+     "SELECT eventDate, venue_name, city_name, country_name, sets FROM artists_setlistfm "
+     "WHERE artist_id = ? AND sets IS NOT NULL AND sets != '' ORDER BY eventDate DESC"),
+]
+
+# Consultas registradas en tiempo de ejecución (sql -> nº de parámetros)
+_recorded_statements: Dict[str, int] = {}
+MAX_RECORDED_STATEMENTS = 500
+
+
+def record_statement(query: str, params=None):
+    """Registra una consulta ejecutada para incluirla en la auditoría"""
+    if query in _recorded_statements or len(_recorded_statements) >= MAX_RECORDED_STATEMENTS:
+        return
+    _recorded_statements[query] = len(params) if params else 0
+
+
+class IndexAdvisor:
+    """Auditoría de planes de consulta y creación de los índices que faltan
+
+    Los índices de SQLite tienen que vivir en el mismo fichero que la tabla,
+    así que se crean sobre el snapshot de la réplica local (antes de activarlo)
+    o, si la réplica está desactivada, sobre la base de datos original cuando
+    es escribible. En cualquier otro caso solo se informa de ellos.
+    """
+
+    def __init__(self, pool, config: dict):
+        advisor_config = config.get('database', {}).get('index_advisor', {})
+
+        self.pool = pool
+        self.enabled = advisor_config.get('enabled', True)
+        self.audit_on_startup = advisor_config.get('audit_on_startup', True)
+        self.create_indexes = advisor_config.get('create_indexes', True)
+        self.allow_source_writes = advisor_config.get('allow_source_writes', False)
+        self.run_analyze = advisor_config.get('analyze', True)
+        # Columnas de fecha generadas (epoch, año, mes, día de la semana, hora)
+        self.time_columns = advisor_config.get('time_columns', True)
+
+        self.last_report = None
+        self.created_indexes: List[str] = []
+        self._lock = threading.Lock()
+
+    # === CICLO DE VIDA ===
+
+    def start(self, replica_active: bool = False):
+        """Aplica índices sobre el origen (si procede) y audita en segundo plano"""
+        if not self.enabled:
+            return
+
+        def run():
+            try:
+                if self.create_indexes and not replica_active and self.allow_source_writes:
+                    if os.access(self.pool.db_path, os.W_OK):
+                        self.apply_indexes(self.pool.db_path)
+                    else:
+                        logger.info("BD origen en solo lectura: los índices solo se reportan")
+                elif self.time_columns and not replica_active:
+                    # Las consultas siguen con las expresiones sobre el texto
+                    logger.info("Columnas de fecha generadas inactivas: requieren la réplica "
+                                "o allow_source_writes con la BD origen escribible")
+                if self.audit_on_startup:
+                    self.audit()
+            except Exception as e:
+                logger.error(f"Error en el asesor de índices: {e}")
+
+        threading.Thread(target=run, name='index-advisor', daemon=True).start()
+
+    # === ÍNDICES ===
+
+    def _existing_schema(self, conn: sqlite3.Connection):
+        """Devuelve columnas por tabla y nombres de índices existentes"""
+        columns = {}
+        indexes = set()
+        for row in conn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"):
+            if row[0] == 'index':
+                indexes.add(row[1])
+            else:
+                try:
+                    columns[row[1]] = {c[1] for c in conn.execute(f"PRAGMA table_info('{row[1]}')")}
+                except sqlite3.Error:
+                    continue
+        return columns, indexes
+
+    def missing_indexes(self, conn: sqlite3.Connection) -> List[Dict]:
+        """Índices recomendados aplicables a este esquema que aún no existen"""
+        columns, indexes = self._existing_schema(conn)
+        missing = []
+        for index in RECOMMENDED_INDEXES:
+            table_columns = columns.get(index['table'])
+            if not table_columns or not set(index['columns']).issubset(table_columns):
+                continue
+            if index['name'] not in indexes:
+                missing.append(index)
+        return missing
+
+    def apply_indexes(self, db_path: str) -> List[str]:
+        """Crea los índices que faltan en una base de datos escribible"""
+        if not self.enabled or not self.create_indexes:
+            return []
+
+        created = []
+        started = time.time()
+        conn = sqlite3.connect(db_path, timeout=self.pool.timeout)
+        try:
+            for index in self.missing_indexes(conn):
+                cols = ', '.join(f'"{c}"' for c in index['columns'])
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {index["name"]} ON "{index["table"]}" ({cols})')
+                created.append(index['name'])
+            if self.time_columns:
+                created += apply_time_columns(conn)
+            if created and self.run_analyze:
+                conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+
+        if created:
+            logger.info(f"Creados {len(created)} índices y columnas en {db_path} en {time.time() - started:.2f}s")
+        with self._lock:
+            self.created_indexes = sorted(set(self.created_indexes) | set(created))
+        return created
+
+    # === AUDITORÍA ===
+
+    def explain(self, conn: sqlite3.Connection, query: str, param_count: int = None) -> Dict:
+        """EXPLAIN QUERY PLAN de una consulta marcando escaneos completos y B-trees temporales"""
+        if param_count is None:
+            param_count = query.count('?')
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", (None,) * param_count).fetchall()
+        except sqlite3.Error as e:
+            return {'error': str(e), 'plan': [], 'full_scans': [], 'temp_btrees': []}
+
+        plan = [row[3] for row in rows]
+        full_scans = []
+        temp_btrees = []
+        for detail in plan:
+            if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail:
+                target = detail[5:].split(' ')[0]
+                # Escanear una CTE o subconsulta materializada no se arregla con índices
+                if target not in ('CONSTANT', '(subquery') and not target.startswith('('):
+                    full_scans.append(target)
+            elif detail.startswith('USE TEMP B-TREE'):
+                temp_btrees.append(detail[len('USE TEMP B-TREE FOR '):])
+        return {'plan': plan, 'full_scans': full_scans, 'temp_btrees': temp_btrees}
+
+    def audit(self) -> Dict:
+        """Audita las consultas calientes y las registradas en ejecución"""
+        started = time.time()
+        statements = [(name, sql, None) for name, sql in HOT_STATEMENTS]
+        statements += [('runtime', sql, count) for sql, count in list(_recorded_statements.items())]
+
+        conn = self.pool.get_connection()
+        results = []
+        for name, sql, param_count in statements:
+            analysis = self.explain(conn, sql, param_count)
+            analysis['name'] = name
+            analysis['sql'] = ' '.join(sql.split())[:500]
+            analysis['flagged'] = bool(analysis['full_scans'] or analysis['temp_btrees'])
+            results.append(analysis)
+
+        missing = self.missing_indexes(conn)
+        pending_time = pending_time_columns(conn) if self.time_columns else []
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'duration_s': round(time.time() - started, 3),
+            'read_path': self.pool.read_path,
+            'statements_audited': len(results),
+            'statements_flagged': sum(1 for r in results if r['flagged']),
+            'statements_failed': sum(1 for r in results if r.get('error')),
+            'missing_indexes': [
+                {'name': i['name'], 'table': i['table'], 'columns': i['columns'], 'reason': i['reason']}
+                for i in missing
+            ],
+            'missing_time_columns': [
+                {'table': c['table'], 'column': c['column'], 'expression': c['expression'], 'index': c['index']}
+                for c in pending_time
+            ],
+            'created_indexes': list(self.created_indexes),
+            'statements': sorted(results, key=lambda r: (not r['flagged'], r['name']))
+        }
+
+        with self._lock:
+            self.last_report = report
+        logger.info(f"Auditoría de consultas: {report['statements_flagged']}/{len(results)} marcadas, "
+                    f"{len(missing)} índices y {len(pending_time)} columnas de fecha pendientes")
+        return report
+
+    def get_report(self, refresh: bool = False) -> Optional[Dict]:
+        """Último informe de auditoría (lo genera si no existe o se pide)"""
+        if refresh or self.last_report is None:
+            return self.audit()
+        return self.last_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auditoría de planes de consulta e índices recomendados')
+    parser.add_argument('--config', default='config.yml', help='Ruta al config.yml')
+    parser.add_argument('--db', help='Ruta a la base de datos (sobrescribe la configuración)')
+    parser.add_argument('--apply', action='store_true', help='Crear los índices que faltan en la BD indicada')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    import yaml
+    from db_pool import get_pool
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    db_path = args.db or config.get('database', {}).get('path', '/app/data/musica.sqlite')
+
+    advisor = IndexAdvisor(get_pool(db_path, config), config)
+    if args.apply:
+        created = advisor.apply_indexes(db_path)
+        print(f"Índices creados: {', '.join(created) if created else 'ninguno'}")
+
+    report = advisor.audit()
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+
+    print(f"Consultas auditadas: {report['statements_audited']} "
+          f"(marcadas: {report['statements_flagged']}, con error: {report['statements_failed']})")
+    for stmt in report['statements']:
+        if stmt['flagged'] or stmt.get('error'):
+            print(f"\n[{stmt['name']}] {stmt['sql'][:120]}")
+            if stmt.get('error'):
+                print(f"  error: {stmt['error']}")
+            for table in stmt['full_scans']:
+                print(f"  escaneo completo: {table}")
+            for reason in stmt['temp_btrees']:
+                print(f"  B-tree temporal: {reason}")
+    if report['missing_indexes']:
+        print("\nÍndices recomendados pendientes:")
+        for index in report['missing_indexes']:
+            print(f"  {index['name']} ON {index['table']}({', '.join(index['columns'])}) - {index['reason']}")
+    if report['missing_time_columns']:
+        print("\nColumnas de fecha generadas pendientes:")
+        for column in report['missing_time_columns']:
+            print(f"  {column['table']}.{column['column']} AS ({column['expression']})")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
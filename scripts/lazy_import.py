@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import logging
+import threading
+import importlib.util
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Módulo que se importa en el primer acceso a uno de sus atributos
+
+    Sustituye a `import pandas as pd` en módulos que solo lo necesitan en
+    algunas peticiones: importar la app no paga la carga y el primer uso (o el
+    calentamiento en segundo plano) la hace una sola vez.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._load_s = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                # __import__ (y no importlib) para que lo vea el perfil de arranque
+                __import__(self._name)
+                self._load_s = time.perf_counter() - start
+                self._module = sys.modules[self._name]
+                logger.info(f"Módulo {self._name} cargado en {self._load_s:.3f}s")
+            return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self) -> str:
+        state = 'cargado' if self._module is not None else 'sin cargar'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+_modules: Dict[str, LazyModule] = {}
+_modules_lock = threading.Lock()
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Proxy compartido del módulo `name` (p.ej. 'plotly.express')"""
+    with _modules_lock:
+        module = _modules.get(name)
+        if module is None:
+            module = LazyModule(name)
+            _modules[name] = module
+        return module
+
+
+def module_available(name: str) -> bool:
+    """Si el paquete está instalado, sin importarlo"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load_modules(*modules: LazyModule) -> float:
+    """Carga los módulos indicados (calentamiento); devuelve los segundos empleados"""
+    start = time.perf_counter()
+    for module in modules:
+        module._load()
+    return time.perf_counter() - start
+
+
+def get_lazy_stats() -> List[Dict]:
+    with _modules_lock:
+        modules = list(_modules.values())
+    return [
+        {
+            'module': module._name,
+            'loaded': module.loaded,
+            'load_s': round(module._load_s, 3) if module._load_s is not None else None
+        }
+        for module in modules
+    ]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import zlib
+import logging
+import sqlite3
+from collections import Counter
+from typing import Dict, Optional
+
+from derived_store import DerivedJob
+
+logger = logging.getLogger(__name__)
+
+# Palabras de 3 o más letras (incluidas las acentuadas del español) en minúsculas
+TERM_PATTERN = re.compile(r'\b[a-záéíóúñü]{3,}\b')
+
+# Letras que se tokenizan e insertan por bloque
+BATCH_SIZE = 500
+
+
+def tokenize(lyrics: Optional[str]) -> Counter:
+    """Frecuencia de cada palabra de una letra"""
+    if not lyrics:
+        return Counter()
+    return Counter(TERM_PATTERN.findall(lyrics.lower()))
+
+
+def lyrics_hash(lyrics: Optional[str]) -> int:
+    """Huella del texto de una letra para detectar cambios"""
+    if lyrics is None:
+        return 0
+    return zlib.crc32(lyrics.encode('utf-8'))
+
+
+class LyricsTermsJob(DerivedJob):
+    """Índice invertido de palabras de la tabla `lyrics`
+
+    Materializa `lyrics_terms(lyrics_id, term, count)` con las palabras de
+    cada letra y `lyrics_term_docs(lyrics_id, hash, words)` con la huella
+    del texto indexado. Los análisis de palabras más frecuentes agregan
+    este índice en lugar de trocear las letras en cada petición. En cada
+    ejecución solo se vuelven a tokenizar las letras nuevas o modificadas
+    y se eliminan las borradas.
+    """
+
+    name = 'lyrics_terms'
+    version = 1
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        conn.create_function('mwe_lyrics_hash', 1, lyrics_hash, deterministic=True)
+
+        if not self._source_exists(conn):
+            self._create_tables(conn, drop=True)
+            return {'watermark': None, 'rows': 0, 'mode': 'full'}
+
+        full = previous is None or not self._tables_exist(conn)
+        self._create_tables(conn, drop=full)
+
+        # Huella actual de cada letra frente a la indexada
+        conn.execute("DROP TABLE IF EXISTS temp.lyrics_current")
+        conn.execute("""
+            CREATE TEMP TABLE lyrics_current AS
+            SELECT id AS lyrics_id, mwe_lyrics_hash(lyrics) AS hash
+            FROM src.lyrics
+        """)
+        conn.execute("DROP TABLE IF EXISTS temp.lyrics_stale")
+        conn.execute("""
+            CREATE TEMP TABLE lyrics_stale AS
+            SELECT d.lyrics_id FROM lyrics_term_docs d
+            LEFT JOIN temp.lyrics_current c ON c.lyrics_id = d.lyrics_id
+            WHERE c.lyrics_id IS NULL OR c.hash != d.hash
+        """)
+        conn.execute("DELETE FROM lyrics_terms WHERE lyrics_id IN (SELECT lyrics_id FROM temp.lyrics_stale)")
+        conn.execute("DELETE FROM lyrics_term_docs WHERE lyrics_id IN (SELECT lyrics_id FROM temp.lyrics_stale)")
+
+        pending = conn.execute("""
+            SELECT l.id, l.lyrics, c.hash
+            FROM temp.lyrics_current c
+            JOIN src.lyrics l ON l.id = c.lyrics_id
+            WHERE c.lyrics_id NOT IN (SELECT lyrics_id FROM lyrics_term_docs)
+        """)
+        indexed = 0
+        while True:
+            batch = pending.fetchmany(BATCH_SIZE)
+            if not batch:
+                break
+            self._index_batch(conn, batch)
+            indexed += len(batch)
+
+        conn.execute("DROP TABLE IF EXISTS temp.lyrics_current")
+        conn.execute("DROP TABLE IF EXISTS temp.lyrics_stale")
+
+        documents = conn.execute("SELECT COUNT(*) FROM lyrics_term_docs").fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM lyrics_terms").fetchone()[0]
+        return {
+            'watermark': {'documents': documents, 'indexed': indexed},
+            'rows': rows,
+            'mode': 'full' if full else 'incremental'
+        }
+
+    # === ESQUEMA ===
+
+    @staticmethod
+    def _source_exists(conn) -> bool:
+        return conn.execute(
+            "SELECT COUNT(*) FROM src.sqlite_master WHERE type = 'table' AND name = 'lyrics'"
+        ).fetchone()[0] > 0
+
+    @staticmethod
+    def _tables_exist(conn) -> bool:
+        return conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name IN ('lyrics_terms', 'lyrics_term_docs')
+        """).fetchone()[0] == 2
+
+    @staticmethod
+    def _create_tables(conn, drop: bool):
+        if drop:
+            conn.execute("DROP TABLE IF EXISTS lyrics_terms")
+            conn.execute("DROP TABLE IF EXISTS lyrics_term_docs")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lyrics_terms (
+                lyrics_id INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (lyrics_id, term)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_lyrics_terms_term ON lyrics_terms(term)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lyrics_term_docs (
+                lyrics_id INTEGER PRIMARY KEY,
+                hash INTEGER NOT NULL,
+                words INTEGER NOT NULL
+            )
+        """)
+
+    # === TOKENIZACIÓN ===
+
+    @staticmethod
+    def _index_batch(conn, batch):
+        terms = []
+        docs = []
+        for lyrics_id, lyrics, text_hash in batch:
+            counts = tokenize(lyrics)
+            terms.extend((lyrics_id, term, count) for term, count in counts.items())
+            docs.append((lyrics_id, text_hash, sum(counts.values())))
+        conn.executemany("INSERT INTO lyrics_terms (lyrics_id, term, count) VALUES (?, ?, ?)", terms)
+        conn.executemany("INSERT INTO lyrics_term_docs (lyrics_id, hash, words) VALUES (?, ?, ?)", docs)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import base64
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+# Filas que se acumulan antes de escribir un bloque en modo streaming
+STREAM_CHUNK_ROWS = 500
+
+
+class CursorError(ValueError):
+    """Cursor de paginación inválido o de otra consulta"""
+
+
+def encode_cursor(data: Dict) -> str:
+    """Cursor opaco (JSON en base64 url-safe) para la siguiente página"""
+    raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str], expected: Dict = None) -> Optional[Dict]:
+    """Decodifica un cursor; `expected` son campos que deben coincidir (p.ej. la consulta)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise CursorError('Cursor inválido')
+    if not isinstance(data, dict):
+        raise CursorError('Cursor inválido')
+    for key, value in (expected or {}).items():
+        if data.get(key) != value:
+            raise CursorError('El cursor no corresponde a esta consulta')
+    return data
+
+
+def check_cursor_version(cursor: Optional[Dict], version) -> None:
+    """Rechaza los cursores emitidos con otra versión de los datos
+
+    Las claves del ranking de búsqueda incluyen la puntuación bm25, que cambia
+    al reconstruir el índice: un cursor anterior saltaría o repetiría filas.
+    """
+    if cursor is not None and cursor.get('v') != version:
+        raise CursorError('El cursor ha caducado')
+
+
+def split_page(rows: Sequence, limit: int, key_fn: Callable[[Any], List]) -> Tuple[List, Optional[List]]:
+    """Recorta `limit + 1` filas a una página y devuelve la clave de la última si hay más"""
+    rows = list(rows)
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, key_fn(page[-1]) if page else None
+    return rows, None
+
+
+def stream_json_list(list_key: str, rows: Iterable[Dict], head: Dict = None,
+                     tail_fn: Callable[[int, Optional[Dict]], Dict] = None) -> Response:
+    """Respuesta JSON que se escribe a medida que se leen las filas del cursor
+
+    Genera `{...head, "<list_key>": [filas...], ...tail}`; `tail_fn` recibe el
+    número de filas y la última fila, y devuelve los campos finales (total,
+    next_cursor...). La memoria por petición queda limitada a un bloque.
+    """
+    def generate():
+        yield '{'
+        for key, value in (head or {}).items():
+            yield f"{json.dumps(key)}:{json.dumps(value)},"
+        yield f"{json.dumps(list_key)}:["
+
+        count = 0
+        last = None
+        buffer = []
+        for row in rows:
+            buffer.append(json.dumps(row))
+            count += 1
+            last = row
+            if len(buffer) >= STREAM_CHUNK_ROWS:
+                yield (',' if count > len(buffer) else '') + ','.join(buffer)
+                buffer = []
+        if buffer:
+            yield (',' if count > len(buffer) else '') + ','.join(buffer)
+        yield ']'
+
+        try:
+            tail = tail_fn(count, last) if tail_fn else {}
+        except Exception as e:
+            logger.error(f"Error generando cierre de respuesta en streaming: {e}")
+            tail = {'error': str(e)}
+        for key, value in tail.items():
+            yield f",{json.dumps(key)}:{json.dumps(value)}"
+        yield '}'
+
+    return Response(generate(), mimetype='application/json')
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import sqlite3
+from typing import Dict, Optional
+
+from derived_store import DerivedJob, rows_hash
+
+logger = logging.getLogger(__name__)
+
+# Referencia fija para las puntuaciones con decaimiento (2020-01-01 UTC).
+# Se guarda Σ 2^((t - EPOCH) / vida_media): al añadir escuchas basta con
+# sumar, y la puntuación actual es ese valor por 2^(-(ahora - EPOCH) / vida_media).
+DECAY_EPOCH = 1577836800
+
+# Columnas de los scrobbles que entran en la huella de las filas procesadas
+HASHED_COLUMNS = ['artist_name', 'track_name', 'scrobble_date']
+
+# Segundos Unix de `scrobble_date` (texto 'YYYY-MM-DD HH:MM:SS'), como en columnar_store
+EPOCH_EXPR = "CAST(strftime('%s', scrobble_date) AS INTEGER)"
+
+
+def register_decay(conn, half_life_days: float):
+    """Registra mwe_decay_weight(segundos): peso 2^((t - DECAY_EPOCH) / vida_media)"""
+    half_life = half_life_days * 86400.0
+
+    def decay_weight(ts):
+        try:
+            return 2.0 ** ((float(ts) - DECAY_EPOCH) / half_life)
+        except (TypeError, ValueError, OverflowError):
+            return 0.0
+
+    conn.create_function('mwe_decay_weight', 1, decay_weight, deterministic=True)
+
+
+class PlayCountsJob(DerivedJob):
+    """Escuchas acumuladas por artista y por canción a partir de `scrobbles`
+
+    Mantiene `artist_play_counts` y `track_play_counts` con el total de
+    escuchas, la última escucha y una puntuación de tendencia con
+    decaimiento exponencial, a partir de `scrobble_date`. Solo procesa los
+    scrobbles con rowid posterior al último procesado; si se han borrado o
+    editado filas ya procesadas (según su huella), reconstruye.
+    """
+
+    name = 'play_counts'
+    version = 2
+
+    def __init__(self, config: dict = None):
+        play_config = (config or {}).get('database', {}).get('play_counts', {})
+        self.table = play_config.get('table', 'scrobbles')
+        self.half_life_days = play_config.get('half_life_days', 30)
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        register_decay(conn, self.half_life_days)
+
+        if not self._source_exists(conn):
+            self._create_tables(conn, drop=True)
+            return {'watermark': None, 'rows': 0, 'mode': 'full'}
+
+        max_rowid, total = conn.execute(
+            f"SELECT COALESCE(MAX(rowid), 0), COUNT(*) FROM src.{self.table}"
+        ).fetchone()
+        old = (previous or {}).get('watermark')
+        source = f"src.{self.table}"
+
+        if self._can_append(conn, old):
+            self._create_tables(conn, drop=False)
+            self._accumulate(conn, old['last_rowid'])
+            content_hash = old['hash'] + rows_hash(conn, source, HASHED_COLUMNS, old['last_rowid'], max_rowid)
+            mode = 'incremental'
+        else:
+            self._create_tables(conn, drop=True)
+            self._accumulate(conn, 0)
+            content_hash = rows_hash(conn, source, HASHED_COLUMNS, 0, max_rowid)
+            mode = 'full'
+
+        rows = conn.execute("SELECT COUNT(*) FROM artist_play_counts").fetchone()[0]
+        watermark = {
+            'table': self.table,
+            'half_life_days': self.half_life_days,
+            'epoch': DECAY_EPOCH,
+            'last_rowid': max_rowid,
+            'count': total,
+            'hash': content_hash
+        }
+        return {'watermark': watermark, 'rows': rows, 'mode': mode}
+
+    # === ESQUEMA ===
+
+    def _source_exists(self, conn) -> bool:
+        return conn.execute(
+            "SELECT COUNT(*) FROM src.sqlite_master WHERE type = 'table' AND name = ?",
+            (self.table,)
+        ).fetchone()[0] > 0
+
+    @staticmethod
+    def _create_tables(conn, drop: bool):
+        if drop:
+            conn.execute("DROP TABLE IF EXISTS artist_play_counts")
+            conn.execute("DROP TABLE IF EXISTS track_play_counts")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS artist_play_counts (
+                artist_name TEXT PRIMARY KEY,
+                plays INTEGER NOT NULL,
+                last_played INTEGER,
+                decay_score REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_play_counts (
+                artist_name TEXT NOT NULL,
+                track_name TEXT NOT NULL,
+                plays INTEGER NOT NULL,
+                last_played INTEGER,
+                decay_score REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (artist_name, track_name)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artist_play_counts_plays ON artist_play_counts(plays DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artist_play_counts_decay ON artist_play_counts(decay_score DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_track_play_counts_plays ON track_play_counts(plays DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_track_play_counts_decay ON track_play_counts(decay_score DESC)")
+
+    # === ACUMULACIÓN ===
+
+    def _can_append(self, conn, old: Optional[Dict]) -> bool:
+        """True si desde la última ejecución solo se han añadido scrobbles"""
+        if not old or old.get('table') != self.table:
+            return False
+        if old.get('half_life_days') != self.half_life_days or old.get('epoch') != DECAY_EPOCH:
+            return False
+        tables = conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name IN ('artist_play_counts', 'track_play_counts')
+        """).fetchone()[0]
+        if tables != 2:
+            return False
+        # Las filas ya procesadas deben seguir siendo las mismas (número y contenido)
+        kept = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (old['last_rowid'],)
+        ).fetchone()[0]
+        if kept != old['count']:
+            return False
+        return rows_hash(conn, f"src.{self.table}", HASHED_COLUMNS, 0, old['last_rowid']) == old.get('hash')
+
+    def _accumulate(self, conn, after_rowid: int):
+        """Suma a los agregados los scrobbles con rowid > after_rowid"""
+        conn.execute(f"""
+            INSERT INTO artist_play_counts (artist_name, plays, last_played, decay_score)
+            SELECT artist_name, COUNT(*), MAX({EPOCH_EXPR}), SUM(mwe_decay_weight({EPOCH_EXPR}))
+            FROM src.{self.table}
+            WHERE rowid > ? AND artist_name IS NOT NULL AND artist_name != ''
+            GROUP BY artist_name
+            ON CONFLICT(artist_name) DO UPDATE SET
+                plays = plays + excluded.plays,
+                last_played = MAX(COALESCE(last_played, 0), COALESCE(excluded.last_played, 0)),
+                decay_score = decay_score + excluded.decay_score
+        """, (after_rowid,))
+        conn.execute(f"""
+            INSERT INTO track_play_counts (artist_name, track_name, plays, last_played, decay_score)
+            SELECT artist_name, track_name, COUNT(*), MAX({EPOCH_EXPR}), SUM(mwe_decay_weight({EPOCH_EXPR}))
+            FROM src.{self.table}
+            WHERE rowid > ? AND artist_name IS NOT NULL AND artist_name != ''
+              AND track_name IS NOT NULL AND track_name != ''
+            GROUP BY artist_name, track_name
+            ON CONFLICT(artist_name, track_name) DO UPDATE SET
+                plays = plays + excluded.plays,
+                last_played = MAX(COALESCE(last_played, 0), COALESCE(excluded.last_played, 0)),
+                decay_score = decay_score + excluded.decay_score
+        """, (after_rowid,))
+
+
+def trending_factor(half_life_days: float, now: float = None) -> float:
+    """Multiplicador que convierte decay_score en "escuchas recientes equivalentes" """
+    now = time.time() if now is None else now
+    return 2.0 ** (-(now - DECAY_EPOCH) / (half_life_days * 86400.0))
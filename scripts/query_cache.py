@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _copy_result(value: Any) -> Any:
+    """Copia superficial de lo que el llamante puede modificar (dicts y listas de dicts)
+
+    RowSet y sqlite3.Row no se modifican en el código y se devuelven tal cual.
+    """
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+class QueryCache:
+    """Caché LRU con TTL de resultados de consultas de solo lectura
+
+    Las entradas se invalidan todas a la vez cuando cambian los datos leídos:
+    nuevo snapshot de la réplica (`pool.change_token`), cambio de fecha /
+    tamaño del fichero o de su WAL (`pool.data_token()`) o tablas derivadas
+    reconstruidas (`pool.attachments_token`). El token se
+    comprueba como mucho cada `check_interval` segundos para no hacer un
+    stat() por consulta.
+    """
+
+    def __init__(self, pool, config: dict = None):
+        cache_config = (config or {}).get('database', {}).get('query_cache', {})
+
+        self.pool = pool
+        self.enabled = cache_config.get('enabled', True)
+        self.max_entries = cache_config.get('max_entries', 2048)
+        self.ttl = cache_config.get('ttl', 300)
+        self.check_interval = cache_config.get('check_interval', 1.0)
+
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._token = None
+        self._last_check = 0.0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    # === INVALIDACIÓN ===
+
+    def _data_token(self) -> Tuple:
+        return (self.pool.change_token, self.pool.data_token(), self.pool.attachments_token)
+
+    def _check_token(self):
+        """Vacía la caché si han cambiado los datos desde la última comprobación"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        token = self._data_token()
+        if token != self._token:
+            with self._lock:
+                if self._entries:
+                    self._stats['invalidations'] += 1
+                    logger.debug(f"Caché de consultas invalidada ({len(self._entries)} entradas)")
+                self._entries.clear()
+                self._token = token
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # === ACCESO ===
+
+    def get(self, key: Hashable) -> Any:
+        """Valor guardado o `_MISSING`"""
+        if not self.enabled:
+            return _MISSING
+        self._check_token()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_or_compute(self, key: Hashable, compute, cache_empty: bool = False) -> Any:
+        """Devuelve el valor cacheado o lo calcula y lo guarda
+
+        Los resultados vacíos no se guardan por defecto: los métodos de los
+        managers devuelven [] / None también cuando la consulta falla.
+        """
+        value = self.get(key)
+        if value is _MISSING:
+            token = self._token
+            value = compute()
+            # Si los datos cambiaron mientras se calculaba, el resultado ya no vale
+            if (cache_empty or value) and token == self._token:
+                self.set(key, value)
+        return _copy_result(value)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0,
+            **stats
+        }
+
+
+def cached(namespace: str):
+    """Memoiza un método de un manager que tenga atributo `query_cache`
+
+    La clave es el nombre del método más sus argumentos.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache: Optional[QueryCache] = getattr(self, 'query_cache', None)
+            if cache is None or not cache.enabled:
+                return func(self, *args, **kwargs)
+            key = (namespace, args, tuple(sorted(kwargs.items())))
+            return cache.get_or_compute(key, lambda: func(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def is_cacheable_statement(query: str) -> bool:
+    """Solo consultas de lectura (SELECT / WITH)"""
+    head = query.lstrip()[:6].upper()
+    return head.startswith('SELECT') or head.startswith('WITH')
+
+
+_caches: Dict[str, QueryCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_cache(pool, config: dict = None) -> QueryCache:
+    """Caché compartida por todos los managers que leen de la misma BD"""
+    with _caches_lock:
+        cache = _caches.get(pool.db_path)
+        if cache is None:
+            cache = QueryCache(pool, config)
+            _caches[pool.db_path] = cache
+        return cache
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from typing import Dict, Optional
+
+from derived_store import DerivedJob, rows_hash
+from scrobble_resolver import SONG_KEYS_SELECT, ScrobbleSongMapJob, library_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Días sin escuchar una canción a partir de los que se considera redescubierta
+REDISCOVERY_GAP_DAYS = 180
+
+# Columnas del scrobble que determinan el historial (y su canción)
+HASHED_COLUMNS = ['artist_name', 'track_name', 'scrobble_date']
+
+
+def history_select(table: str) -> str:
+    """SELECT con las columnas de song_listening_history calculado sobre los scrobbles
+
+    Lo usan los análisis mientras la tabla derivada no está lista (mismo
+    resultado, recorriendo todo el historial con funciones de ventana). La
+    canción se busca con las claves normalizadas del mapa de scrobbles.
+    """
+    return f"""
+        SELECT g.artist_name, g.track_name, k.song_id,
+               g.plays, g.first_played, g.last_played, g.longest_gap_days, g.rediscoveries
+        FROM (
+            SELECT artist_name, track_name,
+                   COUNT(*) AS plays,
+                   datetime(MIN(jd)) AS first_played,
+                   datetime(MAX(jd)) AS last_played,
+                   MAX(gap) AS longest_gap_days,
+                   COUNT(CASE WHEN gap > {REDISCOVERY_GAP_DAYS} THEN 1 END) AS rediscoveries
+            FROM (
+                SELECT COALESCE(artist_name, '') AS artist_name,
+                       COALESCE(track_name, '') AS track_name,
+                       julianday(scrobble_date) AS jd,
+                       julianday(scrobble_date) - LAG(julianday(scrobble_date)) OVER (
+                           PARTITION BY COALESCE(artist_name, ''), COALESCE(track_name, '')
+                           ORDER BY julianday(scrobble_date)
+                       ) AS gap
+                FROM {table}
+            )
+            GROUP BY artist_name, track_name
+        ) g
+        LEFT JOIN ({SONG_KEYS_SELECT.format(songs='songs')}) k
+            ON k.song_key = mwe_song_key(g.artist_name, g.track_name)
+    """
+
+
+class ScrobbleHistoryJob(DerivedJob):
+    """Historial de escucha por canción para el análisis de descubrimiento
+
+    Materializa `song_listening_history(artist_name, track_name, song_id,
+    plays, first_played, last_played, longest_gap_days, rediscoveries)`:
+    primera y última escucha, mayor intervalo entre dos escuchas
+    consecutivas y cuántos intervalos superan REDISCOVERY_GAP_DAYS. Los
+    scrobbles nuevos continúan el historial desde la última escucha
+    guardada; si llegan escuchas anteriores a ella, cambia la biblioteca o
+    se borran o editan scrobbles ya procesados, se reconstruye. Debe registrarse después de
+    ScrobbleSongMapJob.
+    """
+
+    name = 'scrobble_history'
+    version = 2
+
+    def __init__(self, config: dict = None):
+        map_config = (config or {}).get('database', {}).get('scrobble_map', {})
+        self.table = map_config.get('table', 'scrobbles_paqueradejere')
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        if not self._map_exists(conn):
+            self._create_tables(conn, drop=True)
+            return {'watermark': None, 'rows': 0, 'mode': 'full'}
+
+        # Solo hasta donde llega el mapa (igual que los agregados diarios)
+        last_rowid = conn.execute(
+            "SELECT COALESCE(MAX(scrobble_rowid), 0) FROM main.scrobble_song_map"
+        ).fetchone()[0]
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (last_rowid,)
+        ).fetchone()[0]
+        library = library_fingerprint(conn)
+        old = (previous or {}).get('watermark')
+
+        source = f"src.{self.table}"
+        mode = 'full'
+        if self._can_append(conn, old, library):
+            self._load_new_plays(conn, old['last_rowid'], last_rowid)
+            if self._in_order(conn):
+                self._accumulate(conn)
+                content_hash = old['hash'] + rows_hash(conn, source, HASHED_COLUMNS, old['last_rowid'], last_rowid)
+                mode = 'incremental'
+        if mode == 'full':
+            self._create_tables(conn, drop=True)
+            self._load_new_plays(conn, 0, last_rowid)
+            self._accumulate(conn)
+            content_hash = rows_hash(conn, source, HASHED_COLUMNS, 0, last_rowid)
+        conn.execute("DROP TABLE IF EXISTS temp.history_new_plays")
+
+        rows = conn.execute("SELECT COUNT(*) FROM song_listening_history").fetchone()[0]
+        watermark = {
+            'table': self.table,
+            'last_rowid': last_rowid,
+            'count': total,
+            'library': library,
+            'hash': content_hash
+        }
+        return {'watermark': watermark, 'rows': rows, 'mode': mode}
+
+    # === ESQUEMA ===
+
+    @staticmethod
+    def _map_exists(conn) -> bool:
+        return conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name = ?
+        """, (ScrobbleSongMapJob.name,)).fetchone()[0] > 0
+
+    @staticmethod
+    def _create_tables(conn, drop: bool):
+        if drop:
+            conn.execute("DROP TABLE IF EXISTS song_listening_history")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS song_listening_history (
+                artist_name TEXT NOT NULL,
+                track_name TEXT NOT NULL,
+                song_id INTEGER,
+                plays INTEGER NOT NULL,
+                first_played TEXT,
+                last_played TEXT,
+                longest_gap_days REAL,
+                rediscoveries INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (artist_name, track_name)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_song_history_gap ON song_listening_history(longest_gap_days)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_song_history_song ON song_listening_history(song_id)")
+
+    # === MARCA DE AGUA ===
+
+    def _can_append(self, conn, old: Optional[Dict], library: Dict) -> bool:
+        """True si desde la última ejecución solo se han añadido scrobbles"""
+        if not old or old.get('table') != self.table or old.get('library') != library:
+            return False
+        exists = conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name = 'song_listening_history'
+        """).fetchone()[0]
+        if not exists:
+            return False
+        kept = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (old['last_rowid'],)
+        ).fetchone()[0]
+        if kept != old['count']:
+            return False
+        # Una escucha ya contada puede haber cambiado de canción o de fecha
+        return rows_hash(conn, f"src.{self.table}", HASHED_COLUMNS, 0, old['last_rowid']) == old.get('hash')
+
+    @staticmethod
+    def _in_order(conn) -> bool:
+        """True si ninguna escucha nueva es anterior a la última guardada de su canción"""
+        return conn.execute("""
+            SELECT COUNT(*)
+            FROM temp.history_new_plays n
+            JOIN song_listening_history h
+              ON h.artist_name = n.artist_name AND h.track_name = n.track_name
+            WHERE n.jd < julianday(h.last_played)
+        """).fetchone()[0] == 0
+
+    # === ACUMULACIÓN ===
+
+    def _load_new_plays(self, conn, after_rowid: int, up_to_rowid: int):
+        """Tabla temporal con los scrobbles after_rowid < rowid <= up_to_rowid"""
+        conn.execute("DROP TABLE IF EXISTS temp.history_new_plays")
+        conn.execute(f"""
+            CREATE TEMP TABLE history_new_plays AS
+            SELECT COALESCE(sp.artist_name, '') AS artist_name,
+                   COALESCE(sp.track_name, '') AS track_name,
+                   m.song_id,
+                   julianday(sp.scrobble_date) AS jd
+            FROM src.{self.table} sp
+            LEFT JOIN main.scrobble_song_map m ON m.scrobble_rowid = sp.rowid
+            WHERE sp.rowid > ? AND sp.rowid <= ?
+        """, (after_rowid, up_to_rowid))
+
+    @staticmethod
+    def _accumulate(conn):
+        """Suma las escuchas nuevas al historial
+
+        Los intervalos se calculan sobre la última escucha guardada de cada
+        canción seguida de las nuevas (todas posteriores, ver _in_order).
+        """
+        conn.execute(f"""
+            INSERT INTO song_listening_history
+                (artist_name, track_name, song_id, plays, first_played,
+                 last_played, longest_gap_days, rediscoveries)
+            SELECT n.artist_name, n.track_name, n.song_id, n.plays,
+                   datetime(n.first_jd), datetime(n.last_jd),
+                   g.longest_gap_days, COALESCE(g.rediscoveries, 0)
+            FROM (
+                SELECT artist_name, track_name, MAX(song_id) AS song_id, COUNT(*) AS plays,
+                       MIN(jd) AS first_jd, MAX(jd) AS last_jd
+                FROM temp.history_new_plays
+                GROUP BY artist_name, track_name
+            ) n
+            LEFT JOIN (
+                SELECT artist_name, track_name,
+                       MAX(gap) AS longest_gap_days,
+                       COUNT(CASE WHEN gap > {REDISCOVERY_GAP_DAYS} THEN 1 END) AS rediscoveries
+                FROM (
+                    SELECT artist_name, track_name,
+                           jd - LAG(jd) OVER (PARTITION BY artist_name, track_name ORDER BY jd) AS gap
+                    FROM (
+                        SELECT artist_name, track_name, jd
+                        FROM temp.history_new_plays
+                        WHERE jd IS NOT NULL
+                        UNION ALL
+                        SELECT h.artist_name, h.track_name, julianday(h.last_played)
+                        FROM song_listening_history h
+                        JOIN (SELECT DISTINCT artist_name, track_name FROM temp.history_new_plays) k
+                          ON k.artist_name = h.artist_name AND k.track_name = h.track_name
+                        WHERE h.last_played IS NOT NULL
+                    )
+                )
+                GROUP BY artist_name, track_name
+            ) g ON g.artist_name = n.artist_name AND g.track_name = n.track_name
+            WHERE true
+            ON CONFLICT(artist_name, track_name) DO UPDATE SET
+                song_id = COALESCE(song_id, excluded.song_id),
+                plays = plays + excluded.plays,
+                first_played = COALESCE(MIN(first_played, excluded.first_played), first_played, excluded.first_played),
+                last_played = COALESCE(MAX(last_played, excluded.last_played), last_played, excluded.last_played),
+                longest_gap_days = COALESCE(MAX(longest_gap_days, excluded.longest_gap_days),
+                                            longest_gap_days, excluded.longest_gap_days),
+                rediscoveries = rediscoveries + excluded.rediscoveries
+        """)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Optional
+
+from derived_store import DerivedJob, rows_hash
+from typeahead import normalize
+
+logger = logging.getLogger(__name__)
+
+# Columnas del scrobble que deciden su canción
+HASHED_COLUMNS = ['artist_name', 'track_name']
+
+# Separador de artista y título en las claves normalizadas (normalize() no lo genera)
+_KEY_SEPARATOR = '\x1f'
+
+
+# Los scrobbles repiten mucho los mismos artistas y títulos: las claves se
+# calculan en Python fila a fila, así que se memorizan
+_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def song_key(artist, title) -> str:
+    """Clave de emparejamiento scrobble → canción sin mayúsculas ni acentos"""
+    return f"{normalize(artist)}{_KEY_SEPARATOR}{normalize(title)}"
+
+
+# Funciones SQL del emparejamiento: nombre → (nº de argumentos, función)
+KEY_FUNCTIONS = {
+    'mwe_normalize': (1, lru_cache(maxsize=_CACHE_SIZE)(normalize)),
+    'mwe_song_key': (2, song_key)
+}
+
+# Clave normalizada → canción de menor id (la usan el mapa y la unión de respaldo)
+SONG_KEYS_SELECT = """
+    SELECT mwe_song_key(artist, title) AS song_key, MIN(id) AS song_id
+    FROM {songs}
+    WHERE artist IS NOT NULL AND title IS NOT NULL
+    GROUP BY 1
+"""
+
+# (artista, nombre normalizado) → álbum de menor id
+ALBUM_KEYS_SELECT = """
+    SELECT artist_id, mwe_normalize(name) AS name_key, MIN(id) AS album_id
+    FROM {albums}
+    WHERE artist_id IS NOT NULL AND name IS NOT NULL
+    GROUP BY artist_id, name_key
+"""
+
+
+def register_functions(conn):
+    """Registra mwe_normalize() y mwe_song_key() en la conexión del trabajo"""
+    for name, (num_params, func) in KEY_FUNCTIONS.items():
+        conn.create_function(name, num_params, func, deterministic=True)
+
+
+def library_fingerprint(conn) -> Dict:
+    """Tamaño y huella de las claves normalizadas de songs/albums/artists usadas al emparejar
+
+    Se resume el contenido (no la longitud) de lo que compara el emparejamiento,
+    así que cualquier cambio que altere el mapa cambia la huella y un cambio
+    solo de mayúsculas o acentos no obliga a reconstruir.
+    """
+    register_functions(conn)
+    songs = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(mwe_row_hash(id, mwe_song_key(artist, title),
+               artist_id, mwe_normalize(album))), 0)
+        FROM src.songs
+    """).fetchone()
+    albums = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(mwe_row_hash(id, artist_id, mwe_normalize(name))), 0)
+        FROM src.albums
+    """).fetchone()
+    artists = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(mwe_row_hash(id, mwe_normalize(name))), 0)
+        FROM src.artists
+    """).fetchone()
+    return {
+        'songs': list(songs),
+        'albums': list(albums),
+        'artists': list(artists)
+    }
+
+
+class ScrobbleSongMapJob(DerivedJob):
+    """Resuelve cada scrobble a su canción, artista y álbum de la biblioteca
+
+    Materializa `scrobble_song_map(scrobble_rowid, song_id, artist_id, album_id)`
+    para que los análisis de escuchas unan por claves enteras indexadas en
+    lugar de comparar `artist_name`/`track_name` con `songs` en cada consulta.
+    El emparejamiento ignora mayúsculas, acentos y puntuación. Se guardan
+    todos los scrobbles (song_id a NULL si no hay canción) y solo se procesan
+    los nuevos; si cambian songs, albums o artists o se borran o editan
+    scrobbles ya emparejados, se reconstruye.
+    """
+
+    name = 'scrobble_song_map'
+    version = 2
+
+    def __init__(self, config: dict = None):
+        map_config = (config or {}).get('database', {}).get('scrobble_map', {})
+        self.table = map_config.get('table', 'scrobbles_paqueradejere')
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        register_functions(conn)
+
+        if not self._source_exists(conn):
+            self._create_tables(conn, drop=True)
+            return {'watermark': None, 'rows': 0, 'mode': 'full'}
+
+        max_rowid, total = conn.execute(
+            f"SELECT COALESCE(MAX(rowid), 0), COUNT(*) FROM src.{self.table}"
+        ).fetchone()
+        library = library_fingerprint(conn)
+        old = (previous or {}).get('watermark')
+
+        self._load_keys(conn)
+        source = f"src.{self.table}"
+        if self._can_append(conn, old, library):
+            self._create_tables(conn, drop=False)
+            self._resolve(conn, old['last_rowid'])
+            content_hash = old['hash'] + rows_hash(conn, source, HASHED_COLUMNS, old['last_rowid'], max_rowid)
+            mode = 'incremental'
+        else:
+            self._create_tables(conn, drop=True)
+            self._resolve(conn, 0)
+            content_hash = rows_hash(conn, source, HASHED_COLUMNS, 0, max_rowid)
+            mode = 'full'
+
+        conn.execute("DROP TABLE IF EXISTS temp.map_song_keys")
+        conn.execute("DROP TABLE IF EXISTS temp.map_artist_keys")
+
+        rows = conn.execute("SELECT COUNT(*) FROM scrobble_song_map").fetchone()[0]
+        watermark = {
+            'table': self.table,
+            'last_rowid': max_rowid,
+            'count': total,
+            'library': library,
+            'hash': content_hash
+        }
+        return {'watermark': watermark, 'rows': rows, 'mode': mode}
+
+    # === ESQUEMA ===
+
+    def _source_exists(self, conn) -> bool:
+        return conn.execute(
+            "SELECT COUNT(*) FROM src.sqlite_master WHERE type = 'table' AND name = ?",
+            (self.table,)
+        ).fetchone()[0] > 0
+
+    @staticmethod
+    def _create_tables(conn, drop: bool):
+        if drop:
+            conn.execute("DROP TABLE IF EXISTS scrobble_song_map")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS scrobble_song_map (
+                scrobble_rowid INTEGER PRIMARY KEY,
+                song_id INTEGER,
+                artist_id INTEGER,
+                album_id INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_scrobble_song_map_song ON scrobble_song_map(song_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_scrobble_song_map_artist ON scrobble_song_map(artist_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_scrobble_song_map_album ON scrobble_song_map(album_id)")
+
+    # === MARCA DE AGUA ===
+
+    def _can_append(self, conn, old: Optional[Dict], library: Dict) -> bool:
+        """True si desde la última ejecución solo se han añadido scrobbles"""
+        if not old or old.get('table') != self.table or old.get('library') != library:
+            return False
+        exists = conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name = 'scrobble_song_map'
+        """).fetchone()[0]
+        if not exists:
+            return False
+        kept = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (old['last_rowid'],)
+        ).fetchone()[0]
+        if kept != old['count']:
+            return False
+        # Un scrobble ya emparejado puede haber cambiado de artista o título
+        return rows_hash(conn, f"src.{self.table}", HASHED_COLUMNS, 0, old['last_rowid']) == old.get('hash')
+
+    # === EMPAREJAMIENTO ===
+
+    @staticmethod
+    def _load_keys(conn):
+        """Tablas temporales con las claves normalizadas de canciones y artistas
+
+        Si hay varias canciones con el mismo artista y título se usa la de
+        menor id (la unión por texto las contaba todas, duplicando escuchas).
+        El álbum se busca entre los del artista por nombre normalizado.
+        """
+        conn.execute("DROP TABLE IF EXISTS temp.map_song_keys")
+        conn.execute("DROP TABLE IF EXISTS temp.map_artist_keys")
+        conn.execute("""
+            CREATE TEMP TABLE map_artist_keys (
+                name_key TEXT PRIMARY KEY,
+                artist_id INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            INSERT INTO temp.map_artist_keys (name_key, artist_id)
+            SELECT mwe_normalize(name), MIN(id)
+            FROM src.artists
+            WHERE name IS NOT NULL AND name != ''
+            GROUP BY 1
+        """)
+        conn.execute("""
+            CREATE TEMP TABLE map_song_keys (
+                song_key TEXT PRIMARY KEY,
+                song_id INTEGER NOT NULL,
+                artist_id INTEGER,
+                album_id INTEGER
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"""
+            WITH album_keys AS ({ALBUM_KEYS_SELECT.format(albums='src.albums')}),
+            song_keys AS ({SONG_KEYS_SELECT.format(songs='src.songs')})
+            INSERT INTO temp.map_song_keys (song_key, song_id, artist_id, album_id)
+            SELECT k.song_key, s.id, s.artist_id,
+                   (SELECT ak.album_id FROM album_keys ak
+                    WHERE ak.artist_id = s.artist_id AND ak.name_key = mwe_normalize(s.album))
+            FROM song_keys k
+            JOIN src.songs s ON s.id = k.song_id
+        """)
+
+    def _resolve(self, conn, after_rowid: int):
+        """Añade al mapa los scrobbles con rowid > after_rowid"""
+        conn.execute(f"""
+            INSERT OR REPLACE INTO scrobble_song_map (scrobble_rowid, song_id, artist_id, album_id)
+            SELECT sp.rowid, k.song_id,
+                   COALESCE(ak.artist_id, k.artist_id),
+                   k.album_id
+            FROM src.{self.table} sp
+            LEFT JOIN temp.map_song_keys k
+                ON k.song_key = mwe_song_key(sp.artist_name, sp.track_name)
+            LEFT JOIN temp.map_artist_keys ak
+                ON ak.name_key = mwe_normalize(sp.artist_name)
+            WHERE sp.rowid > ?
+        """, (after_rowid,))
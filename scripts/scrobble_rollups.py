@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from typing import Dict, Optional
+
+from derived_store import DerivedJob, rows_hash
+from scrobble_resolver import ScrobbleSongMapJob, library_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Día del scrobble y primer día de su mes (la tabla mensual usa el mismo esquema)
+DAY_EXPR = "COALESCE(substr(sp.scrobble_date, 1, 10), '')"
+MONTH_EXPR = "COALESCE(substr(sp.scrobble_date, 1, 7) || '-01', '')"
+
+# Columnas del scrobble que determinan su aportación (artist_name/track_name
+# deciden además la canción del mapa)
+HASHED_COLUMNS = ['artist_name', 'track_name', 'scrobble_date']
+
+# Tabla derivada → periodo de la columna `day`
+ROLLUP_TABLES = {
+    'scrobble_daily': DAY_EXPR,
+    'scrobble_monthly': MONTH_EXPR
+}
+
+# Columnas de los agregados a partir de `sp` (scrobble), `s` (canción) y `a` (álbum).
+# Las dimensiones desconocidas se guardan como '' para que formen parte de la clave.
+ROLLUP_COLUMNS = """
+    {day} AS day,
+    COALESCE(sp.artist_name, '') AS artist_name,
+    COALESCE(s.genre, '') AS genre,
+    COALESCE(a.label, '') AS label,
+    COUNT(*) AS plays,
+    COUNT(CASE WHEN s.duration > 0 THEN 1 END) AS duration_plays,
+    COALESCE(SUM(CASE WHEN s.duration > 0 THEN s.duration END), 0) AS duration_total
+"""
+
+
+def rollup_select(table: str, joins: str, where: str = '', day_expr: str = DAY_EXPR) -> str:
+    """SELECT agrupado con las columnas de scrobble_daily / scrobble_monthly
+
+    Lo usan el trabajo que materializa las tablas y los análisis cuando aún
+    no están listas (mismo resultado calculado al vuelo).
+    """
+    return f"""
+        SELECT {ROLLUP_COLUMNS.format(day=day_expr)}
+        FROM {table} sp
+        {joins}
+        {where}
+        GROUP BY 1, 2, 3, 4
+    """
+
+
+class ScrobbleRollupJob(DerivedJob):
+    """Agregados diarios y mensuales de escuchas por artista, género y sello
+
+    Materializa `scrobble_daily(day, artist_name, genre, label, plays,
+    duration_plays, duration_total)` a partir de los scrobbles resueltos en
+    `scrobble_song_map`, y `scrobble_monthly` con el mismo esquema y `day`
+    igual al primer día de cada mes. Los análisis agrupan por días/meses y
+    artistas en lugar de recorrer todos los scrobbles. Los scrobbles nuevos
+    se suman a las filas existentes; si se borran o editan scrobbles ya
+    procesados (huella de su contenido) o cambian los géneros, sellos o
+    duraciones de la biblioteca, se reconstruye.
+    Debe registrarse después de ScrobbleSongMapJob.
+    """
+
+    name = 'scrobble_rollups'
+    version = 2
+
+    def __init__(self, config: dict = None):
+        map_config = (config or {}).get('database', {}).get('scrobble_map', {})
+        self.table = map_config.get('table', 'scrobbles_paqueradejere')
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        if not self._map_exists(conn):
+            self._create_tables(conn, drop=True)
+            return {'watermark': None, 'rows': 0, 'mode': 'full'}
+
+        # Solo hasta donde llega el mapa: si su trabajo falló, el resto se suma después
+        last_rowid = conn.execute(
+            "SELECT COALESCE(MAX(scrobble_rowid), 0) FROM main.scrobble_song_map"
+        ).fetchone()[0]
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (last_rowid,)
+        ).fetchone()[0]
+        library = library_fingerprint(conn)
+        attributes = self._attributes_fingerprint(conn)
+        old = (previous or {}).get('watermark')
+
+        source = f"src.{self.table}"
+        if self._can_append(conn, old, library, attributes):
+            self._create_tables(conn, drop=False)
+            self._accumulate(conn, old['last_rowid'], last_rowid)
+            content_hash = old['hash'] + rows_hash(conn, source, HASHED_COLUMNS, old['last_rowid'], last_rowid)
+            mode = 'incremental'
+        else:
+            self._create_tables(conn, drop=True)
+            self._accumulate(conn, 0, last_rowid)
+            content_hash = rows_hash(conn, source, HASHED_COLUMNS, 0, last_rowid)
+            mode = 'full'
+
+        rows = conn.execute("SELECT COUNT(*) FROM scrobble_daily").fetchone()[0]
+        watermark = {
+            'table': self.table,
+            'last_rowid': last_rowid,
+            'count': total,
+            'library': library,
+            'attributes': attributes,
+            'hash': content_hash
+        }
+        return {'watermark': watermark, 'rows': rows, 'mode': mode}
+
+    # === ESQUEMA ===
+
+    @staticmethod
+    def _map_exists(conn) -> bool:
+        return conn.execute("""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name = ?
+        """, (ScrobbleSongMapJob.name,)).fetchone()[0] > 0
+
+    @staticmethod
+    def _create_tables(conn, drop: bool):
+        for table in ROLLUP_TABLES:
+            if drop:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    day TEXT NOT NULL,
+                    artist_name TEXT NOT NULL,
+                    genre TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    plays INTEGER NOT NULL,
+                    duration_plays INTEGER NOT NULL DEFAULT 0,
+                    duration_total INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, artist_name, genre, label)
+                ) WITHOUT ROWID
+            """)
+            # Sin índices secundarios: los rangos de fechas usan la clave primaria y
+            # los totales recorren la tabla mensual (un índice por artista o género
+            # haría que SQLite recorriera la tabla entera para evitar ordenar)
+
+    # === MARCA DE AGUA ===
+
+    @staticmethod
+    def _attributes_fingerprint(conn) -> list:
+        """Huella de los atributos agregados (género y duración de canciones, sello de álbumes)"""
+        songs = conn.execute("""
+            SELECT COALESCE(SUM(mwe_row_hash(id, genre, duration)), 0)
+            FROM src.songs
+        """).fetchone()[0]
+        albums = conn.execute("""
+            SELECT COALESCE(SUM(mwe_row_hash(id, label)), 0)
+            FROM src.albums
+        """).fetchone()[0]
+        return [songs, albums]
+
+    def _can_append(self, conn, old: Optional[Dict], library: Dict, attributes: list) -> bool:
+        """True si desde la última ejecución solo se han añadido scrobbles"""
+        if not old or old.get('table') != self.table:
+            return False
+        if old.get('library') != library or old.get('attributes') != attributes:
+            return False
+        exists = conn.execute(f"""
+            SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name IN ({', '.join('?' for _ in ROLLUP_TABLES)})
+        """, tuple(ROLLUP_TABLES)).fetchone()[0]
+        if exists != len(ROLLUP_TABLES):
+            return False
+        kept = conn.execute(
+            f"SELECT COUNT(*) FROM src.{self.table} WHERE rowid <= ?", (old['last_rowid'],)
+        ).fetchone()[0]
+        if kept != old['count']:
+            return False
+        # Mismo número de filas no basta: un scrobble ya sumado puede haberse editado
+        return rows_hash(conn, f"src.{self.table}", HASHED_COLUMNS, 0, old['last_rowid']) == old.get('hash')
+
+    # === ACUMULACIÓN ===
+
+    def _accumulate(self, conn, after_rowid: int, up_to_rowid: int):
+        """Suma los scrobbles con after_rowid < rowid <= up_to_rowid"""
+        joins = """LEFT JOIN main.scrobble_song_map m ON m.scrobble_rowid = sp.rowid
+               LEFT JOIN src.songs s ON s.id = m.song_id
+               LEFT JOIN src.albums a ON a.id = m.album_id"""
+        for table, day_expr in ROLLUP_TABLES.items():
+            select = rollup_select(f"src.{self.table}", joins,
+                                   "WHERE sp.rowid > ? AND sp.rowid <= ?", day_expr)
+            conn.execute(f"""
+                INSERT INTO {table}
+                    (day, artist_name, genre, label, plays, duration_plays, duration_total)
+                {select}
+                ON CONFLICT(day, artist_name, genre, label) DO UPDATE SET
+                    plays = plays + excluded.plays,
+                    duration_plays = duration_plays + excluded.duration_plays,
+                    duration_total = duration_total + excluded.duration_total
+            """, (after_rowid, up_to_rowid))
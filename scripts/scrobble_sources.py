@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from collections import Counter
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Servicio → (prefijo de las tablas por usuario, columna de fecha)
+SOURCE_KINDS = {
+    'lastfm': ('scrobbles_', 'scrobble_date'),
+    'listenbrainz': ('listens_', 'listen_date'),
+}
+
+# Valores de ?user= que seleccionan todos los usuarios
+ALL_USERS = ('all', '*')
+
+
+def parse_users(values: Iterable[str]) -> Optional[List[str]]:
+    """Usuarios de ?user= (repetido o separado por comas); None si no se indica ninguno"""
+    users = []
+    for value in values or ():
+        for user in value.split(','):
+            user = user.strip()
+            if user and user not in users:
+                users.append(user)
+    return users or None
+
+
+def merge_counts(partials: Iterable):
+    """Suma los agregados parciales de cada tabla
+
+    Cada parcial es un Counter o un dict {nombre: Counter}; en ese caso se
+    suma cada Counter con los del mismo nombre.
+    """
+    total = None
+    for partial in partials:
+        if isinstance(partial, Counter):
+            total = total if total is not None else Counter()
+            total.update(partial)
+        else:
+            total = total if total is not None else {}
+            for name, counts in partial.items():
+                total.setdefault(name, Counter()).update(counts)
+    return total if total is not None else Counter()
+
+
+class ScrobbleSources:
+    """Registro de las tablas de escuchas de cada usuario
+
+    Descubre las tablas `scrobbles_<usuario>` (Last.fm) y `listens_<usuario>`
+    (ListenBrainz) de la BD que se está leyendo; la lista se vuelve a leer
+    cuando cambian los datos. Los análisis de varios usuarios consultan
+    cada tabla por separado en paralelo y suman los agregados parciales
+    (ver sum_by), sin unir las tablas en una sola.
+    """
+
+    def __init__(self, pool, config: dict):
+        database_config = config.get('database', {})
+        sources_config = database_config.get('scrobble_sources', {})
+        map_table = database_config.get('scrobble_map', {}).get('table', 'scrobbles_paqueradejere')
+
+        self.pool = pool
+        # Usuario de cada servicio cuando no se indica ?user= (solo de la
+        # configuración; Last.fm usa por defecto el de scrobble_map)
+        self.default_users = {service: None for service in SOURCE_KINDS}
+        if map_table.startswith('scrobbles_'):
+            self.default_users['lastfm'] = map_table[len('scrobbles_'):]
+        self.default_users.update(sources_config.get('default_users') or {})
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, sources_config.get('workers', 4)),
+            thread_name_prefix='scrobble-sources'
+        )
+
+        self._cache = (None, [])
+        self._lock = threading.Lock()
+
+    # === DESCUBRIMIENTO ===
+
+    def discover(self) -> List[Dict]:
+        """Tablas de escuchas por usuario: [{user, service, table, date_column}]"""
+        token = self.pool.data_token()
+        with self._lock:
+            cached_token, sources = self._cache
+            if cached_token == token:
+                return sources
+
+        sources = []
+        try:
+            conn = self.pool.get_connection()
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+            )]
+            for table in tables:
+                for service, (prefix, date_column) in SOURCE_KINDS.items():
+                    if not table.startswith(prefix) or len(table) == len(prefix):
+                        continue
+                    columns = {row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")}
+                    if date_column in columns:
+                        sources.append({
+                            'user': table[len(prefix):],
+                            'service': service,
+                            'table': table,
+                            'date_column': date_column
+                        })
+        except Exception as e:
+            logger.error(f"Error descubriendo tablas de escuchas: {e}")
+            return []
+
+        with self._lock:
+            self._cache = (token, sources)
+        return sources
+
+    def get_users(self) -> Dict:
+        """Usuarios disponibles por servicio y los usados por defecto"""
+        users = {service: [] for service in SOURCE_KINDS}
+        for source in self.discover():
+            users[source['service']].append(source['user'])
+        return {'users': users, 'default_users': dict(self.default_users)}
+
+    def resolve(self, users: Optional[List[str]] = None, service: str = 'lastfm') -> List[Dict]:
+        """Tablas de `service` de los usuarios pedidos
+
+        Sin usuarios se usa el de por defecto del servicio; 'all' o '*'
+        selecciona todos. Lanza ValueError si algún usuario no tiene tablas
+        de ningún servicio (los que solo tienen del otro se ignoran).
+        """
+        sources = self.discover()
+        of_service = [source for source in sources if source['service'] == service]
+        if not users:
+            default = self.default_users.get(service)
+            return [source for source in of_service if source['user'] == default]
+        if any(user in ALL_USERS for user in users):
+            return of_service
+
+        known = {source['user'] for source in sources}
+        unknown = [user for user in users if user not in known]
+        if unknown:
+            raise ValueError(f"Usuarios sin tablas de escuchas: {', '.join(unknown)}")
+        return [source for source in of_service if source['user'] in users]
+
+    # === AGREGACIÓN POR PARTICIONES ===
+
+    def map(self, fn: Callable[[Dict], object], sources: List[Dict]) -> List:
+        """fn(source) para cada tabla, en paralelo si hay más de una
+
+        Cada hilo ejecuta fn en una copia del contexto del llamante (p.ej. el
+        motor analítico elegido por el benchmark).
+        """
+        if len(sources) <= 1:
+            return [fn(source) for source in sources]
+        contexts = [copy_context() for _ in sources]
+        return list(self.executor.map(lambda source, context: context.run(fn, source), sources, contexts))
+
+    def sum_by(self, sources: List[Dict], partial: Callable[[Dict], object]):
+        """Agregado de todas las tablas: suma los Counter de partial(source)"""
+        return merge_counts(self.map(partial, sources))
@@ -9,16 +9,71 @@ from flask import jsonify, request
 import re
 from datetime import datetime, timedelta
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Response
+from typing import Dict, List, Optional, Tuple
+
+from columnar_store import WEEKDAY_NAMES
+from scrobble_history import REDISCOVERY_GAP_DAYS
+from scrobble_sources import parse_users
 
 logger = logging.getLogger(__name__)
 
 class ScrobblesAnalysisEndpoints:
     """Endpoints específicos para análisis detallado de escuchas/scrobbles"""
     
+    # Pestaña → (método, admite rango ?from=&to=)
+    ANALYSES = {
+        'tiempo': ('_get_scrobbles_time_analysis', True),
+        'generos': ('_get_scrobbles_genres_analysis', True),
+        'calidad': ('_get_scrobbles_quality_analysis', False),
+        'descubrimiento': ('_get_scrobbles_discovery_analysis', False),
+        'evolucion': ('_get_scrobbles_evolution_analysis', True),
+        'sellos': ('_get_scrobbles_labels_analysis', True),
+        'colaboradores': ('_get_scrobbles_collaborators_analysis', False),
+        'duracion': ('_get_scrobbles_duration_analysis', True),
+        'idiomas': ('_get_scrobbles_languages_analysis', False)
+    }
+
+    # Intervalos de la distribución de tiempo de descubrimiento (días, hasta)
+    DISCOVERY_RANGES = (
+        (1, 'Mismo día'),
+        (7, '1-7 días'),
+        (30, '1-4 semanas'),
+        (90, '1-3 meses'),
+        (365, '3-12 meses'),
+        (None, 'Más de 1 año')
+    )
+    
+    # Orden de los intervalos de duración y de longitud de letras
+    DURATION_RANGES = ('0-2 min', '2-3 min', '3-4 min', '4-5 min', '5-6 min', '6-8 min', '8+ min')
+    LYRICS_LENGTHS = ('Cortas', 'Medianas', 'Largas', 'Muy largas')
+    
+    # Palabras que no se cuentan en las palabras más frecuentes de las letras
+    LYRICS_STOP_WORDS = (
+        'the', 'and', 'with', 'that', 'this', 'from', 'they', 'have', 'were', 'been', 'their',
+        'said', 'each', 'which', 'them', 'than', 'many', 'some', 'what', 'would', 'make', 'like',
+        'into', 'time', 'very', 'when', 'come', 'here', 'just', 'know', 'take', 'people', 'year',
+        'good', 'work', 'much', 'other', 'also', 'around', 'must', 'well', 'large', 'add', 'such',
+        'because', 'turn', 'why', 'ask', 'went', 'men', 'read', 'need', 'land', 'different',
+        'home', 'move', 'try', 'kind', 'hand', 'picture', 'again', 'change', 'off', 'play',
+        'spell', 'air', 'away', 'animal', 'house', 'point', 'page', 'letter', 'mother', 'answer',
+        'found', 'study', 'still', 'learn', 'should', 'america', 'world'
+    )
+    
     def __init__(self, app, db_manager, config):
         self.app = app
         self.db_manager = db_manager
         self.config = config
+        
+        # Hilos para /all: cada uno usa su propia conexión de lectura del pool
+        analysis_config = config.get('scrobbles_analysis', {})
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, analysis_config.get('workers', 4)),
+            thread_name_prefix='scrobbles-analysis'
+        )
+        
         self.setup_scrobbles_analysis_routes()
     
     def setup_scrobbles_analysis_routes(self):
@@ -30,78 +85,400 @@ class ScrobblesAnalysisEndpoints:
             try:
                 logger.info(f"Análisis de scrobbles: tipo={analysis_type}")
                 
-                # Crear análisis según el tipo
-                if analysis_type == 'tiempo':
-                    return jsonify(self._get_scrobbles_time_analysis())
-                elif analysis_type == 'generos':
-                    return jsonify(self._get_scrobbles_genres_analysis())
-                elif analysis_type == 'calidad':
-                    return jsonify(self._get_scrobbles_quality_analysis())
-                elif analysis_type == 'descubrimiento':
-                    return jsonify(self._get_scrobbles_discovery_analysis())
-                elif analysis_type == 'evolucion':
-                    return jsonify(self._get_scrobbles_evolution_analysis())
-                elif analysis_type == 'sellos':
-                    return jsonify(self._get_scrobbles_labels_analysis())
-                elif analysis_type == 'colaboradores':
-                    return jsonify(self._get_scrobbles_collaborators_analysis())
-                elif analysis_type == 'duracion':
-                    return jsonify(self._get_scrobbles_duration_analysis())
-                elif analysis_type == 'idiomas':
-                    return jsonify(self._get_scrobbles_languages_analysis())
-                else:
+                # Rango opcional ?from=&to= para los análisis sobre los agregados diarios
+                try:
+                    date_range = self._get_date_range()
+                except ValueError:
+                    return jsonify({'error': 'Formato de fecha inválido (AAAA, AAAA-MM o AAAA-MM-DD)'}), 400
+                
+                if analysis_type not in self.ANALYSES:
                     return jsonify({'error': f'Tipo de análisis no soportado: {analysis_type}'}), 400
+                
+                # Usuarios ?user= (uno, varios separados por comas o 'all')
+                try:
+                    sources = self._get_sources()
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                
+                return jsonify(self._run_analysis(analysis_type, date_range, sources))
                     
             except Exception as e:
                 logger.error(f"Error en análisis {analysis_type} de scrobbles: {e}")
                 import traceback
                 traceback.print_exc()
                 return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/scrobbles/analysis/all')
+        def api_scrobbles_analysis_all():
+            """Todas las pestañas de análisis calculadas en paralelo
+            
+            Devuelve {analyses: {pestaña: resultado}, timings_ms, total_ms}; con
+            ?stream=1 escribe una línea JSON por pestaña según van terminando.
+            """
+            try:
+                try:
+                    date_range = self._get_date_range()
+                except ValueError:
+                    return jsonify({'error': 'Formato de fecha inválido (AAAA, AAAA-MM o AAAA-MM-DD)'}), 400
+                try:
+                    sources = self._get_sources()
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                
+                started = time.perf_counter()
+                futures = [self.executor.submit(self._run_timed, analysis_type, date_range, sources)
+                           for analysis_type in self.ANALYSES]
+                
+                if request.args.get('stream', '').lower() in ('1', 'true'):
+                    def generate():
+                        for future in as_completed(futures):
+                            analysis_type, result, elapsed_ms = future.result()
+                            yield self.app.json.dumps({
+                                'tab': analysis_type,
+                                'data': result,
+                                'elapsed_ms': elapsed_ms
+                            }) + '\n'
+                        yield self.app.json.dumps({'done': True, 'total_ms': self._elapsed_ms(started)}) + '\n'
+                    
+                    return Response(generate(), mimetype='application/x-ndjson')
+                
+                analyses = {}
+                timings = {}
+                for future in futures:
+                    analysis_type, result, elapsed_ms = future.result()
+                    analyses[analysis_type] = result
+                    timings[analysis_type] = elapsed_ms
+                
+                total_ms = self._elapsed_ms(started)
+                logger.info(f"Análisis de scrobbles (todas las pestañas) en {total_ms}ms: {timings}")
+                return jsonify({'analyses': analyses, 'timings_ms': timings, 'total_ms': total_ms})
+                
+            except Exception as e:
+                logger.error(f"Error en análisis conjunto de scrobbles: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/scrobbles/users')
+        def api_scrobbles_users():
+            """Usuarios con tablas de scrobbles/escuchas (valores válidos de ?user=)"""
+            try:
+                return jsonify(self.db_manager.scrobble_sources.get_users())
+            except Exception as e:
+                logger.error(f"Error obteniendo usuarios de scrobbles: {e}")
+                return jsonify({'error': str(e)}), 500
+
+        @self.app.route('/api/scrobbles/analysis/benchmark')
+        def api_scrobbles_analysis_benchmark():
+            """Compara los motores analíticos (SQLite / DuckDB) en cada pestaña
+
+            Admite ?tabs= (separadas por comas; por defecto todas), ?repeat=,
+            ?user= y ?from=&to=. Devuelve el tiempo de cada motor sin caché y
+            si ambos dan el mismo resultado.
+            """
+            try:
+                try:
+                    date_range = self._get_date_range()
+                except ValueError:
+                    return jsonify({'error': 'Formato de fecha inválido (AAAA, AAAA-MM o AAAA-MM-DD)'}), 400
+                try:
+                    sources = self._get_sources()
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+
+                tabs = [tab.strip() for value in request.args.getlist('tabs')
+                        for tab in value.split(',') if tab.strip()] or list(self.ANALYSES)
+                unknown = [tab for tab in tabs if tab not in self.ANALYSES]
+                if unknown:
+                    return jsonify({'error': f"Tipos de análisis no soportados: {', '.join(unknown)}"}), 400
+                repeat = min(max(request.args.get('repeat', 1, type=int), 1), 10)
+
+                cases = {tab: (lambda tab=tab: self._run_analysis(tab, date_range, sources)) for tab in tabs}
+                return jsonify(self.db_manager.analytics.benchmark(cases, repeat))
+
+            except Exception as e:
+                logger.error(f"Error en benchmark de análisis de scrobbles: {e}")
+                return jsonify({'error': str(e)}), 500
+
+    def _run_analysis(self, analysis_type: str, date_range=None, sources: List[Dict] = None) -> Dict:
+        """Ejecuta el análisis de una pestaña (el rango solo se aplica si lo admite)
+
+        Si se pidió un rango, el resultado indica en `range_applied` si se ha
+        tenido en cuenta, para que no se confunda un total histórico con uno
+        del periodo.
+        """
+        method_name, accepts_range = self.ANALYSES[analysis_type]
+        method = getattr(self, method_name)
+        if accepts_range:
+            result = method(date_range, sources=sources)
+        else:
+            result = method(sources=sources)
+        if any(date_range or ()) and isinstance(result, dict):
+            # Copia: el resultado puede venir de la caché de consultas
+            result = dict(result, range_applied=accepts_range)
+        return result
+    
+    def _run_timed(self, analysis_type: str, date_range=None,
+                   sources: List[Dict] = None) -> Tuple[str, Dict, float]:
+        """Análisis de una pestaña con su duración, para el pool de /all"""
+        started = time.perf_counter()
+        try:
+            result = self._run_analysis(analysis_type, date_range, sources)
+        except Exception as e:
+            logger.error(f"Error en análisis {analysis_type} de scrobbles: {e}")
+            result = {'error': str(e)}
+        return analysis_type, result, self._elapsed_ms(started)
+    
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    # === USUARIOS Y PARTICIONES ===
+    
+    def _get_sources(self) -> List[Dict]:
+        """Tablas de scrobbles de ?user= (ValueError si algún usuario no existe)"""
+        users = parse_users(request.args.getlist('user'))
+        sources = self.db_manager.scrobble_sources.resolve(users, 'lastfm')
+        if not sources:
+            raise ValueError('No hay tablas de scrobbles para los usuarios indicados')
+        return sources
+    
+    def _resolve_sources(self, sources: List[Dict] = None) -> List[Dict]:
+        """Las tablas indicadas o, si no se indican, las del usuario por defecto"""
+        if sources is None:
+            sources = self.db_manager.scrobble_sources.resolve(None, 'lastfm')
+        if not sources:
+            raise ValueError('No hay tablas de scrobbles')
+        return sources
+    
+    def _sum_by(self, sources: List[Dict], partial) -> Counter:
+        """Agregado parcial de cada tabla (en paralelo si hay varias) sumado"""
+        return self.db_manager.scrobble_sources.sum_by(sources, partial)
+    
+    def _grouped(self, query: str, params=(), values: Tuple[str, ...] = None):
+        """Agregados de una consulta agrupada como Counter {clave: valor}
+        
+        La última columna es el valor y la clave es la primera columna (o la
+        tupla de las anteriores). Se ejecuta en el motor analítico
+        (DuckDB o SQLite, ver analytics_engine). Con `values` las últimas len(values)
+        columnas son valores y se devuelve un Counter por cada nombre.
+        """
+        width = len(values) if values else 1
+        counters = [Counter() for _ in range(width)]
+        for row in self.db_manager.analytics.query(query, tuple(params)):
+            row = tuple(row)
+            keys = row[:-width]
+            key = keys[0] if len(keys) == 1 else keys
+            for counter, value in zip(counters, row[-width:]):
+                counter[key] += value or 0
+        return dict(zip(values, counters)) if values else counters[0]
+    
+    @staticmethod
+    def _ranked(counts: Counter, limit: int = None) -> List[Tuple]:
+        """(clave, valor) de mayor a menor valor"""
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+    
+    def _scrobble_joins(self, source: Dict, scrobble_alias: str = 'sp', song_alias: str = 's',
+                        album_alias: str = None) -> str:
+        """JOIN de la tabla de scrobbles a songs/albums (por ids si el mapa derivado está listo)"""
+        return self.db_manager.scrobble_song_joins(
+            source['table'], scrobble_alias, song_alias, album_alias
+        )
+    
+    def _rollup_source(self, source: Dict, date_range=None, by_month: bool = False) -> str:
+        """Agregados (día × artista × género × sello) de una tabla para usar en FROM
+        
+        Con `by_month` se usan los mensuales, siempre que el rango empiece y
+        termine en un cambio de mes (from/to con formato AAAA o AAAA-MM).
+        """
+        aligned = all(not day or day.endswith('-01') for day in (date_range or ()))
+        return self.db_manager.scrobble_rollup_source(source['table'],
+                                                      monthly=by_month and aligned)
+    
+    @staticmethod
+    def _get_date_range() -> Tuple[Optional[str], Optional[str]]:
+        """Rango ?from=&to= como días [desde, hasta) en formato AAAA-MM-DD
+        
+        Ambos extremos admiten AAAA, AAAA-MM o AAAA-MM-DD y son inclusivos:
+        to=2023 incluye todo 2023. Lanza ValueError si el formato no es válido.
+        """
+        def parse(value: str, end: bool) -> Optional[str]:
+            if not value:
+                return None
+            # strptime acepta años de 1 a 3 cifras ('%Y' con '23' sería el año 23)
+            if not re.fullmatch(r'\d{4}(-\d{2}(-\d{2})?)?', value):
+                raise ValueError(f"Fecha inválida: {value}")
+            for fmt, step in (('%Y-%m-%d', 'day'), ('%Y-%m', 'month'), ('%Y', 'year')):
+                try:
+                    start = datetime.strptime(value, fmt)
+                except ValueError:
+                    continue
+                if end:
+                    if step == 'day':
+                        start += timedelta(days=1)
+                    elif step == 'month':
+                        start = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+                    else:
+                        start = start.replace(year=start.year + 1)
+                return start.strftime('%Y-%m-%d')
+            raise ValueError(f"Fecha inválida: {value}")
+        
+        return parse(request.args.get('from', ''), False), parse(request.args.get('to', ''), True)
+    
+    @staticmethod
+    def _range_filter(date_range, column: str = 'day', epoch: bool = False) -> Tuple[str, list]:
+        """Condiciones ` AND ...` y parámetros para limitar `column` al rango
+
+        Con `epoch` la columna es un timestamp en segundos y los límites se
+        convierten una sola vez en SQLite (el índice sigue sirviendo).
+        """
+        date_from, date_to = date_range or (None, None)
+        bound = "CAST(strftime('%s', ?) AS INTEGER)" if epoch else "?"
+        sql, params = '', []
+        if date_from:
+            sql += f" AND {column} >= {bound}"
+            params.append(date_from)
+        if date_to:
+            sql += f" AND {column} < {bound}"
+            params.append(date_to)
+        return sql, params
+    
+    @staticmethod
+    def _range_anchor(date_range) -> str:
+        """Fecha de referencia de las ventanas relativas (últimos N meses): fin del rango o hoy"""
+        date_to = (date_range or (None, None))[1]
+        return date_to or 'now'
+    
+    def _relative_date(self, anchor: str, modifier: str) -> str:
+        """date(anchor, modifier) de SQLite, para que las ventanas coincidan con las consultas"""
+        return self.db_manager.execute_query("SELECT date(?, ?) as day", (anchor, modifier))[0]['day']
+    
+    def _time_partial(self, source: Dict, date_range=None, last_year_start: str = None) -> Dict[str, Counter]:
+        """Escuchas de una tabla por año, por mes (desde `last_year_start`) y por día de la semana"""
+        columns = self.db_manager.columnar.get(source['table'])
+        if columns is not None:
+            date_from, date_to = date_range or (None, None)
+            in_range = columns.select(start=date_from, end=date_to, dated=True)
+            last_year = in_range & columns.select(start=last_year_start)
+            return {
+                'yearly': Counter(dict(columns.count_by_year(in_range))),
+                'monthly': Counter(dict(columns.count_by_month(last_year))),
+                'weekday': Counter(dict(columns.count_by_weekday(in_range)))
+            }
+        
+        daily = self._rollup_source(source)
+        monthly = self._rollup_source(source, date_range, by_month=True)
+        range_sql, range_params = self._range_filter(date_range)
+        
+        # Evolución de scrobbles por año
+        yearly_query = f"""
+            SELECT substr(day, 1, 4) as year, 
+                   SUM(plays) as scrobbles
+            FROM {monthly}
+            WHERE day != ''{range_sql}
+            GROUP BY year
+        """
+        
+        # Scrobbles por mes del último año (del rango)
+        monthly_query = f"""
+            SELECT substr(day, 1, 7) as month,
+                   SUM(plays) as scrobbles
+            FROM {daily}
+            WHERE day >= ?{range_sql}
+            GROUP BY month
+        """
+        
+        # Patrones por día de la semana (se agrupa antes por día: strftime una vez por día)
+        weekday_query = f"""
+            WITH days AS (
+                SELECT day, SUM(plays) as plays
+                FROM {daily}
+                WHERE day != ''{range_sql}
+                GROUP BY day
+            )
+            SELECT 
+                CASE cast(strftime('%w', day) as integer)
+                    WHEN 0 THEN 'Domingo'
+                    WHEN 1 THEN 'Lunes'
+                    WHEN 2 THEN 'Martes'
+                    WHEN 3 THEN 'Miércoles'
+                    WHEN 4 THEN 'Jueves'
+                    WHEN 5 THEN 'Viernes'
+                    WHEN 6 THEN 'Sábado'
+                END as weekday,
+                SUM(plays) as scrobbles
+            FROM days
+            GROUP BY strftime('%w', day)
+        """
+        return {
+            'yearly': self._grouped(yearly_query, range_params),
+            'monthly': self._grouped(monthly_query, (last_year_start, *range_params)),
+            'weekday': self._grouped(weekday_query, range_params)
+        }
     
-    def _get_scrobbles_time_analysis(self):
+    def _artist_totals_partial(self, source: Dict, date_range, last_12: str, last_24: str) -> Dict[str, Counter]:
+        """Escuchas por artista de una tabla: en el rango, en los últimos 12 meses
+        y en los 12 anteriores (hasta el final del rango)"""
+        date_from, date_to = date_range or (None, None)
+        columns = self.db_manager.columnar.get(source['table'])
+        if columns is not None:
+            return {
+                'top': Counter(dict(columns.top('artist', columns.select(start=date_from, end=date_to)))),
+                'recent': Counter(dict(columns.top('artist', columns.select(start=last_12, end=date_to)))),
+                'previous': Counter(dict(columns.top('artist', columns.select(start=last_24, end=last_12))))
+            }
+        
+        daily = self._rollup_source(source)
+        monthly = self._rollup_source(source, date_range, by_month=True)
+        range_sql, range_params = self._range_filter(date_range)
+        window_sql, window_params = self._range_filter((None, date_to))
+        return {
+            'top': self._grouped(f"""
+                SELECT artist_name, SUM(plays) as scrobbles
+                FROM {monthly}
+                WHERE artist_name != ''{range_sql}
+                GROUP BY artist_name
+            """, range_params),
+            'recent': self._grouped(f"""
+                SELECT artist_name, SUM(plays) as recent_scrobbles
+                FROM {daily}
+                WHERE artist_name != '' AND day >= ?{window_sql}
+                GROUP BY artist_name
+            """, (last_12, *window_params)),
+            'previous': self._grouped(f"""
+                SELECT artist_name, SUM(plays) as previous_scrobbles
+                FROM {daily}
+                WHERE artist_name != '' AND day >= ? AND day < ?
+                GROUP BY artist_name
+            """, (last_24, last_12))
+        }
+    
+    def _artist_months_partial(self, source: Dict, artists: List[str], start: str, date_to: str = None) -> Counter:
+        """Escuchas por (artista, mes) de los artistas indicados desde `start`"""
+        columns = self.db_manager.columnar.get(source['table'])
+        if columns is not None:
+            window = columns.select(start=start, end=date_to)
+            return Counter({(name, month): count
+                            for name, month, count in columns.count_by_month_for('artist', artists, window)})
+        
+        daily = self._rollup_source(source)
+        window_sql, window_params = self._range_filter((None, date_to))
+        return self._grouped(f"""
+            SELECT artist_name, substr(day, 1, 7) as month, SUM(plays) as monthly_scrobbles
+            FROM {daily}
+            WHERE artist_name IN ({','.join('?' for _ in artists)}) AND day >= ?{window_sql}
+            GROUP BY artist_name, month
+        """, (*artists, start, *window_params))
+    
+    def _get_scrobbles_time_analysis(self, date_range=None, sources=None):
         """Análisis temporal de scrobbles"""
         try:
-            # Evolución de scrobbles por año
-            yearly_query = """
-                SELECT substr(scrobble_date, 1, 4) as year, 
-                       COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere 
-                WHERE scrobble_date IS NOT NULL 
-                GROUP BY year
-                ORDER BY year
-            """
-            yearly_data = self.db_manager.execute_query(yearly_query)
-            
-            # Scrobbles por mes del último año
-            monthly_query = """
-                SELECT substr(scrobble_date, 1, 7) as month,
-                       COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere 
-                WHERE scrobble_date >= date('now', '-12 months')
-                GROUP BY month
-                ORDER BY month
-            """
-            monthly_data = self.db_manager.execute_query(monthly_query)
-            
-            # Patrones por día de la semana
-            weekday_query = """
-                SELECT 
-                    CASE cast(strftime('%w', scrobble_date) as integer)
-                        WHEN 0 THEN 'Domingo'
-                        WHEN 1 THEN 'Lunes'
-                        WHEN 2 THEN 'Martes'
-                        WHEN 3 THEN 'Miércoles'
-                        WHEN 4 THEN 'Jueves'
-                        WHEN 5 THEN 'Viernes'
-                        WHEN 6 THEN 'Sábado'
-                    END as weekday,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere 
-                WHERE scrobble_date IS NOT NULL
-                GROUP BY strftime('%w', scrobble_date)
-                ORDER BY cast(strftime('%w', scrobble_date) as integer)
-            """
-            weekday_data = self.db_manager.execute_query(weekday_query)
+            sources = self._resolve_sources(sources)
+            last_year_start = self._relative_date(self._range_anchor(date_range), '-12 months')
+            buckets = self._sum_by(sources, lambda source: self._time_partial(source, date_range, last_year_start))
+            
+            yearly_data = [{'year': year, 'scrobbles': count} for year, count in sorted(buckets['yearly'].items())]
+            monthly_data = [{'month': month, 'scrobbles': count} for month, count in sorted(buckets['monthly'].items())]
+            weekday_data = [{'weekday': name, 'scrobbles': buckets['weekday'][name]}
+                            for name in WEEKDAY_NAMES if buckets['weekday'][name]]
             
             # Preparar datos para gráficos
             yearly_chart_data = [{'year': int(row['year']), 'scrobbles': row['scrobbles']} 
@@ -113,8 +490,7 @@ class ScrobblesAnalysisEndpoints:
             weekday_chart_data = [{'weekday': row['weekday'], 'scrobbles': row['scrobbles']} 
                                 for row in weekday_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -144,74 +520,82 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis temporal de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_genres_analysis(self):
+    def _get_scrobbles_genres_analysis(self, date_range=None, sources=None):
         """Análisis de géneros en scrobbles"""
         try:
-            # Géneros más escuchados
-            genres_query = """
-                SELECT s.genre, COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.genre IS NOT NULL AND s.genre != ''
-                GROUP BY s.genre
-                ORDER BY scrobbles DESC
-                LIMIT 15
-            """
-            genres_data = self.db_manager.execute_query(genres_query)
+            sources = self._resolve_sources(sources)
+            range_sql, range_params = self._range_filter(date_range)
+            _, date_to = date_range or (None, None)
+            window_sql, window_params = self._range_filter((None, date_to))
+            anchor = self._range_anchor(date_range)
+            last_6 = self._relative_date(anchor, '-6 months')
+            last_12 = self._relative_date(anchor, '-12 months')
+            
+            def totals_partial(source):
+                daily = self._rollup_source(source)
+                monthly = self._rollup_source(source, date_range, by_month=True)
+                return {
+                    # Géneros más escuchados
+                    'genres': self._grouped(f"""
+                        SELECT genre, SUM(plays) as scrobbles
+                        FROM {monthly}
+                        WHERE genre != ''{range_sql}
+                        GROUP BY genre
+                    """, range_params),
+                    # Últimos 6 meses y los 6 anteriores (hasta el final del rango)
+                    'recent': self._grouped(f"""
+                        SELECT genre, SUM(plays) as recent_count
+                        FROM {daily}
+                        WHERE day >= ?{window_sql}
+                        AND genre != ''
+                        GROUP BY genre
+                    """, (last_6, *window_params)),
+                    'previous': self._grouped(f"""
+                        SELECT genre, SUM(plays) as previous_count
+                        FROM {daily}
+                        WHERE day >= ? AND day < ?
+                        AND genre != ''
+                        GROUP BY genre
+                    """, (last_12, last_6))
+                }
+            
+            totals = self._sum_by(sources, totals_partial)
+            top_genres = self._ranked(totals['genres'], 15)
+            genres_data = [{'genre': genre, 'scrobbles': count} for genre, count in top_genres]
             
             # Evolución de géneros top en el tiempo
-            genre_evolution_query = """
-                SELECT s.genre, 
-                       substr(sp.scrobble_date, 1, 4) as year,
-                       COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.genre IN (
-                    SELECT s2.genre 
-                    FROM scrobbles_paqueradejere sp2
-                    JOIN songs s2 ON s2.artist = sp2.artist_name AND s2.title = sp2.track_name
-                    WHERE s2.genre IS NOT NULL 
-                    GROUP BY s2.genre 
-                    ORDER BY COUNT(*) DESC 
-                    LIMIT 5
-                )
-                GROUP BY s.genre, year
-                ORDER BY year, scrobbles DESC
-            """
-            evolution_data = self.db_manager.execute_query(genre_evolution_query)
-            
-            # Géneros emergentes (últimos 6 meses vs anteriores)
-            emerging_query = """
-                WITH recent AS (
-                    SELECT s.genre, COUNT(*) as recent_count
-                    FROM scrobbles_paqueradejere sp
-                    JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                    WHERE sp.scrobble_date >= date('now', '-6 months')
-                    AND s.genre IS NOT NULL
-                    GROUP BY s.genre
-                ), 
-                previous AS (
-                    SELECT s.genre, COUNT(*) as previous_count
-                    FROM scrobbles_paqueradejere sp
-                    JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                    WHERE sp.scrobble_date BETWEEN date('now', '-12 months') AND date('now', '-6 months')
-                    AND s.genre IS NOT NULL
-                    GROUP BY s.genre
-                )
-                SELECT r.genre,
-                       r.recent_count,
-                       COALESCE(p.previous_count, 0) as previous_count,
-                       CASE 
-                           WHEN COALESCE(p.previous_count, 0) = 0 THEN 100
-                           ELSE ROUND((r.recent_count - p.previous_count) * 100.0 / p.previous_count, 1)
-                       END as growth_percentage
-                FROM recent r
-                LEFT JOIN previous p ON r.genre = p.genre
-                WHERE r.recent_count >= 5
-                ORDER BY growth_percentage DESC
-                LIMIT 10
-            """
-            emerging_data = self.db_manager.execute_query(emerging_query)
+            top_names = [genre for genre, _ in top_genres[:5]]
+            
+            def evolution_partial(source):
+                monthly = self._rollup_source(source, date_range, by_month=True)
+                return self._grouped(f"""
+                    SELECT genre, substr(day, 1, 4) as year, SUM(plays) as scrobbles
+                    FROM {monthly}
+                    WHERE genre IN ({','.join('?' for _ in top_names)}) AND day != ''{range_sql}
+                    GROUP BY genre, year
+                """, (*top_names, *range_params))
+            
+            evolution = self._sum_by(sources, evolution_partial) if top_names else Counter()
+            evolution_data = sorted(
+                ({'genre': genre, 'year': year, 'scrobbles': count} for (genre, year), count in evolution.items()),
+                key=lambda row: (row['year'], -row['scrobbles'])
+            )
+            
+            # Géneros emergentes (últimos 6 meses vs anteriores, hasta el final del rango)
+            emerging_data = []
+            for genre, recent_count in totals['recent'].items():
+                if recent_count < 5:
+                    continue
+                previous_count = totals['previous'][genre]
+                emerging_data.append({
+                    'genre': genre,
+                    'recent_count': recent_count,
+                    'previous_count': previous_count,
+                    'growth_percentage': 100 if previous_count == 0
+                    else round((recent_count - previous_count) * 100.0 / previous_count, 1)
+                })
+            emerging_data.sort(key=lambda row: row['growth_percentage'], reverse=True)
+            emerging_data = emerging_data[:10]
             
             # Preparar datos para gráficos
             genres_chart_data = [{'genre': row['genre'], 'scrobbles': row['scrobbles']} 
@@ -223,8 +607,7 @@ class ScrobblesAnalysisEndpoints:
             emerging_chart_data = [{'genre': row['genre'], 'growth': row['growth_percentage']} 
                                  for row in emerging_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'top_genres': stats_manager.create_chart('pie', genres_chart_data,
@@ -249,50 +632,57 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de géneros de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_quality_analysis(self):
+    def _get_scrobbles_quality_analysis(self, sources=None):
         """Análisis de calidad de audio vs scrobbles"""
         try:
-            # Scrobbles por bitrate
-            bitrate_query = """
-                SELECT s.bitrate, COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.bitrate IS NOT NULL AND s.bitrate > 0
-                GROUP BY s.bitrate
-                ORDER BY scrobbles DESC
-            """
-            bitrate_data = self.db_manager.execute_query(bitrate_query)
-            
-            # Scrobbles por sample rate
-            samplerate_query = """
-                SELECT s.sample_rate, COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.sample_rate IS NOT NULL AND s.sample_rate > 0
-                GROUP BY s.sample_rate
-                ORDER BY scrobbles DESC
-            """
-            samplerate_data = self.db_manager.execute_query(samplerate_query)
-            
-            # Scrobbles por formato de archivo (extraído de file_path)
-            format_query = """
-                SELECT 
-                    CASE 
-                        WHEN s.file_path LIKE '%.mp3' THEN 'MP3'
-                        WHEN s.file_path LIKE '%.flac' THEN 'FLAC'
-                        WHEN s.file_path LIKE '%.ogg' THEN 'OGG'
-                        WHEN s.file_path LIKE '%.m4a' THEN 'M4A'
-                        WHEN s.file_path LIKE '%.wav' THEN 'WAV'
-                        ELSE 'Otro'
-                    END as format,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.file_path IS NOT NULL
-                GROUP BY format
-                ORDER BY scrobbles DESC
-            """
-            format_data = self.db_manager.execute_query(format_query)
+            sources = self._resolve_sources(sources)
+            
+            def partial(source):
+                song_joins = self._scrobble_joins(source)
+                table = source['table']
+                return {
+                    # Scrobbles por bitrate
+                    'bitrate': self._grouped(f"""
+                        SELECT s.bitrate, COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {song_joins}
+                        WHERE s.bitrate IS NOT NULL AND s.bitrate > 0
+                        GROUP BY s.bitrate
+                    """),
+                    # Scrobbles por sample rate
+                    'sample_rate': self._grouped(f"""
+                        SELECT s.sample_rate, COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {song_joins}
+                        WHERE s.sample_rate IS NOT NULL AND s.sample_rate > 0
+                        GROUP BY s.sample_rate
+                    """),
+                    # Scrobbles por formato de archivo (extraído de file_path)
+                    'format': self._grouped(f"""
+                        SELECT 
+                            CASE 
+                                WHEN lower(s.file_path) LIKE '%.mp3' THEN 'MP3'
+                                WHEN lower(s.file_path) LIKE '%.flac' THEN 'FLAC'
+                                WHEN lower(s.file_path) LIKE '%.ogg' THEN 'OGG'
+                                WHEN lower(s.file_path) LIKE '%.m4a' THEN 'M4A'
+                                WHEN lower(s.file_path) LIKE '%.wav' THEN 'WAV'
+                                ELSE 'Otro'
+                            END as format,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {song_joins}
+                        WHERE s.file_path IS NOT NULL
+                        GROUP BY format
+                    """)
+                }
+            
+            totals = self._sum_by(sources, partial)
+            bitrate_data = [{'bitrate': bitrate, 'scrobbles': count}
+                            for bitrate, count in self._ranked(totals['bitrate'])]
+            samplerate_data = [{'sample_rate': sample_rate, 'scrobbles': count}
+                               for sample_rate, count in self._ranked(totals['sample_rate'])]
+            format_data = [{'format': file_format, 'scrobbles': count}
+                           for file_format, count in self._ranked(totals['format'])]
             
             # Preparar datos para gráficos
             bitrate_chart_data = [{'bitrate': f"{row['bitrate']} kbps", 'scrobbles': row['scrobbles']} 
@@ -304,8 +694,7 @@ class ScrobblesAnalysisEndpoints:
             format_chart_data = [{'format': row['format'], 'scrobbles': row['scrobbles']} 
                                for row in format_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {
                 'bitrate_distribution': stats_manager.create_chart('pie', bitrate_chart_data,
@@ -330,79 +719,71 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de calidad de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_discovery_analysis(self):
+    def _get_scrobbles_discovery_analysis(self, sources=None):
         """Análisis de descubrimiento de música"""
         try:
-            # Tiempo promedio entre añadir canción y primera escucha
-            discovery_time_query = """
-                SELECT 
-                    AVG(julianday(MIN(sp.scrobble_date)) - julianday(s.added_timestamp)) as avg_discovery_days
-                FROM songs s
-                JOIN scrobbles_paqueradejere sp ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.added_timestamp IS NOT NULL 
-                AND sp.scrobble_date IS NOT NULL
-                GROUP BY s.id
-                HAVING avg_discovery_days >= 0
-            """
-            discovery_result = self.db_manager.execute_query(discovery_time_query)
+            sources = self._resolve_sources(sources)
             
-            # Distribución de tiempo de descubrimiento
-            discovery_dist_query = """
-                WITH discovery_times AS (
+            def partial(source):
+                history = self.db_manager.song_history_source(source['table'])
+                
+                # Tiempo entre añadir cada canción y su primera escucha
+                discovery_query = f"""
                     SELECT 
                         s.id,
-                        julianday(MIN(sp.scrobble_date)) - julianday(s.added_timestamp) as days_to_discover
-                    FROM songs s
-                    JOIN scrobbles_paqueradejere sp ON s.artist = sp.artist_name AND s.title = sp.track_name
+                        julianday(MIN(h.first_played)) - julianday(s.added_timestamp) as days_to_discover
+                    FROM {history} h
+                    JOIN songs s ON s.id = h.song_id
                     WHERE s.added_timestamp IS NOT NULL 
-                    AND sp.scrobble_date IS NOT NULL
+                    AND h.first_played IS NOT NULL
                     GROUP BY s.id
-                    HAVING days_to_discover >= 0
-                )
-                SELECT 
-                    CASE 
-                        WHEN days_to_discover <= 1 THEN 'Mismo día'
-                        WHEN days_to_discover <= 7 THEN '1-7 días'
-                        WHEN days_to_discover <= 30 THEN '1-4 semanas'
-                        WHEN days_to_discover <= 90 THEN '1-3 meses'
-                        WHEN days_to_discover <= 365 THEN '3-12 meses'
-                        ELSE 'Más de 1 año'
-                    END as time_range,
-                    COUNT(*) as songs_count
-                FROM discovery_times
-                GROUP BY time_range
-                ORDER BY 
-                    CASE time_range
-                        WHEN 'Mismo día' THEN 1
-                        WHEN '1-7 días' THEN 2
-                        WHEN '1-4 semanas' THEN 3
-                        WHEN '1-3 meses' THEN 4
-                        WHEN '3-12 meses' THEN 5
-                        ELSE 6
-                    END
-            """
-            discovery_dist_data = self.db_manager.execute_query(discovery_dist_query)
-            
-            # Canciones redescubiertas (con gaps largos entre scrobbles)
-            rediscovery_query = """
-                WITH scrobble_gaps AS (
-                    SELECT 
-                        sp.artist_name || ' - ' || sp.track_name as song,
-                        julianday(sp.scrobble_date) - 
-                        julianday(LAG(sp.scrobble_date) OVER (
-                            PARTITION BY sp.artist_name, sp.track_name 
-                            ORDER BY sp.scrobble_date
-                        )) as gap_days
-                    FROM scrobbles_paqueradejere sp
-                )
-                SELECT song, MAX(gap_days) as longest_gap
-                FROM scrobble_gaps
-                WHERE gap_days > 180  -- 6 meses o más
-                GROUP BY song
-                ORDER BY longest_gap DESC
-                LIMIT 10
-            """
-            rediscovery_data = self.db_manager.execute_query(rediscovery_query)
+                """
+                discovery = {row['id']: row['days_to_discover']
+                             for row in self.db_manager.execute_query(discovery_query)}
+                
+                # Canciones redescubiertas (con gaps largos entre scrobbles)
+                rediscovery_query = f"""
+                    SELECT artist_name || ' - ' || track_name as song,
+                           longest_gap_days as longest_gap,
+                           rediscoveries
+                    FROM {history}
+                    WHERE longest_gap_days > {REDISCOVERY_GAP_DAYS}  -- 6 meses o más
+                    AND artist_name != '' AND track_name != ''
+                    ORDER BY longest_gap_days DESC
+                    LIMIT 10
+                """
+                rediscoveries = [dict(row, user=source['user'])
+                                 for row in self.db_manager.execute_query(rediscovery_query)]
+                return discovery, rediscoveries
+            
+            partials = self.db_manager.scrobble_sources.map(partial, sources)
+            
+            # Primera escucha de cada canción entre todos los usuarios
+            days_by_song = {}
+            for discovery, _ in partials:
+                for song_id, days in discovery.items():
+                    if days is not None and (song_id not in days_by_song or days < days_by_song[song_id]):
+                        days_by_song[song_id] = days
+            
+            # Distribución por intervalos de tiempo
+            distribution = {label: [0, 0.0] for _, label in self.DISCOVERY_RANGES}
+            for days in days_by_song.values():
+                if days < 0:
+                    continue
+                label = next(label for limit, label in self.DISCOVERY_RANGES if limit is None or days <= limit)
+                distribution[label][0] += 1
+                distribution[label][1] += days
+            discovery_dist_data = [
+                {'time_range': label, 'songs_count': count, 'total_days': total_days}
+                for label, (count, total_days) in distribution.items() if count
+            ]
+            
+            # Los gaps son de cada usuario: con varios se indica de quién es
+            rediscovery_data = sorted((row for _, rows in partials for row in rows),
+                                      key=lambda row: row['longest_gap'], reverse=True)[:10]
+            if len(sources) > 1:
+                for row in rediscovery_data:
+                    row['song'] = f"{row['song']} ({row['user']})"
             
             # Preparar datos para gráficos
             discovery_chart_data = [{'time_range': row['time_range'], 'count': row['songs_count']} 
@@ -412,8 +793,7 @@ class ScrobblesAnalysisEndpoints:
                                      'gap_days': round(row['longest_gap'])} 
                                     for row in rediscovery_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -425,13 +805,15 @@ class ScrobblesAnalysisEndpoints:
                 charts['rediscovery_gaps'] = stats_manager.create_chart('bar', rediscovery_chart_data,
                                             'Canciones Redescubiertas (días sin escuchar)', 'song', 'gap_days')
             
-            avg_discovery = discovery_result[0]['avg_discovery_days'] if discovery_result else 0
+            songs_analyzed = sum(row['songs_count'] for row in discovery_dist_data)
+            avg_discovery = (sum(row['total_days'] for row in discovery_dist_data) / songs_analyzed
+                             if songs_analyzed else 0)
             
             return {
                 'charts': charts,
                 'stats': {
                     'avg_discovery_days': round(avg_discovery, 1) if avg_discovery else 0,
-                    'songs_analyzed': len(discovery_dist_data),
+                    'songs_analyzed': songs_analyzed,
                     'rediscovered_songs': len(rediscovery_data),
                     'longest_rediscovery_gap': round(rediscovery_data[0]['longest_gap']) if rediscovery_data else 0
                 }
@@ -441,68 +823,47 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de descubrimiento de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_evolution_analysis(self):
+    def _get_scrobbles_evolution_analysis(self, date_range=None, sources=None):
         """Análisis de evolución de artistas en el tiempo"""
         try:
+            sources = self._resolve_sources(sources)
+            _, date_to = date_range or (None, None)
+            anchor = self._range_anchor(date_range)
+            last_12 = self._relative_date(anchor, '-12 months')
+            last_24 = self._relative_date(anchor, '-24 months')
+            
+            totals = self._sum_by(
+                sources, lambda source: self._artist_totals_partial(source, date_range, last_12, last_24))
+            
             # Top artistas más escuchados
-            top_artists_query = """
-                SELECT artist_name, COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere
-                GROUP BY artist_name
-                ORDER BY scrobbles DESC
-                LIMIT 15
-            """
-            top_artists_data = self.db_manager.execute_query(top_artists_query)
-            
-            # Evolución temporal de top 5 artistas
-            evolution_query = """
-                SELECT 
-                    artist_name,
-                    substr(scrobble_date, 1, 7) as month,
-                    COUNT(*) as monthly_scrobbles
-                FROM scrobbles_paqueradejere
-                WHERE artist_name IN (
-                    SELECT artist_name 
-                    FROM scrobbles_paqueradejere 
-                    GROUP BY artist_name 
-                    ORDER BY COUNT(*) DESC 
-                    LIMIT 5
-                )
-                AND scrobble_date >= date('now', '-24 months')
-                GROUP BY artist_name, month
-                ORDER BY month, monthly_scrobbles DESC
-            """
-            evolution_data = self.db_manager.execute_query(evolution_query)
-            
-            # Artistas en ascenso (comparando último año vs anterior)
-            rising_artists_query = """
-                WITH recent AS (
-                    SELECT artist_name, COUNT(*) as recent_scrobbles
-                    FROM scrobbles_paqueradejere
-                    WHERE scrobble_date >= date('now', '-12 months')
-                    GROUP BY artist_name
-                ), 
-                previous AS (
-                    SELECT artist_name, COUNT(*) as previous_scrobbles
-                    FROM scrobbles_paqueradejere
-                    WHERE scrobble_date BETWEEN date('now', '-24 months') AND date('now', '-12 months')
-                    GROUP BY artist_name
-                )
-                SELECT 
-                    r.artist_name,
-                    r.recent_scrobbles,
-                    COALESCE(p.previous_scrobbles, 0) as previous_scrobbles,
-                    CASE 
-                        WHEN COALESCE(p.previous_scrobbles, 0) = 0 THEN 999
-                        ELSE ROUND((r.recent_scrobbles - p.previous_scrobbles) * 100.0 / p.previous_scrobbles, 1)
-                    END as growth_percentage
-                FROM recent r
-                LEFT JOIN previous p ON r.artist_name = p.artist_name
-                WHERE r.recent_scrobbles >= 10
-                ORDER BY growth_percentage DESC
-                LIMIT 10
-            """
-            rising_data = self.db_manager.execute_query(rising_artists_query)
+            top = self._ranked(totals['top'], 15)
+            top_artists_data = [{'artist_name': name, 'scrobbles': count} for name, count in top]
+            
+            # Evolución temporal de top 5 artistas (últimos 24 meses del rango)
+            top_names = [name for name, _ in top[:5]]
+            months = self._sum_by(
+                sources, lambda source: self._artist_months_partial(source, top_names, last_24, date_to)
+            ) if top_names else Counter()
+            evolution_data = sorted(
+                ({'artist_name': name, 'month': month, 'monthly_scrobbles': count}
+                 for (name, month), count in months.items()),
+                key=lambda row: (row['month'], -row['monthly_scrobbles'])
+            )
+            
+            # Artistas en ascenso (último año vs anterior, hasta el final del rango)
+            rising_data = []
+            for name, count in self._ranked(totals['recent']):
+                if count < 10:
+                    break
+                before = totals['previous'][name]
+                rising_data.append({
+                    'artist_name': name,
+                    'recent_scrobbles': count,
+                    'previous_scrobbles': before,
+                    'growth_percentage': 999 if before == 0 else round((count - before) * 100.0 / before, 1)
+                })
+            rising_data.sort(key=lambda row: row['growth_percentage'], reverse=True)
+            rising_data = rising_data[:10]
             
             # Preparar datos para gráficos
             top_artists_chart_data = [{'artist': row['artist_name'], 'scrobbles': row['scrobbles']} 
@@ -514,8 +875,7 @@ class ScrobblesAnalysisEndpoints:
             rising_chart_data = [{'artist': row['artist_name'], 'growth': row['growth_percentage']} 
                                for row in rising_data if row['growth_percentage'] < 500]  # Filtrar crecimientos extremos
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -545,45 +905,42 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de evolución de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_labels_analysis(self):
+    def _get_scrobbles_labels_analysis(self, date_range=None, sources=None):
         """Análisis de sellos discográficos vs scrobbles"""
         try:
+            sources = self._resolve_sources(sources)
+            range_sql, range_params = self._range_filter(date_range)
+            
             # Scrobbles por sello
-            labels_query = """
-                SELECT a.label, COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album
-                WHERE a.label IS NOT NULL AND a.label != ''
-                GROUP BY a.label
-                ORDER BY scrobbles DESC
-                LIMIT 15
-            """
-            labels_data = self.db_manager.execute_query(labels_query)
+            def labels_partial(source):
+                monthly = self._rollup_source(source, date_range, by_month=True)
+                return self._grouped(f"""
+                    SELECT label, SUM(plays) as scrobbles
+                    FROM {monthly}
+                    WHERE label != ''{range_sql}
+                    GROUP BY label
+                """, range_params)
+            
+            top_labels = self._ranked(self._sum_by(sources, labels_partial), 15)
+            labels_data = [{'label': label, 'scrobbles': count} for label, count in top_labels]
             
             # Evolución temporal de top sellos
-            labels_evolution_query = """
-                SELECT 
-                    a.label,
-                    substr(sp.scrobble_date, 1, 4) as year,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album
-                WHERE a.label IN (
-                    SELECT a2.label
-                    FROM scrobbles_paqueradejere sp2
-                    JOIN songs s2 ON s2.artist = sp2.artist_name AND s2.title = sp2.track_name
-                    JOIN albums a2 ON a2.artist_id = s2.artist_id AND a2.name = s2.album
-                    WHERE a2.label IS NOT NULL 
-                    GROUP BY a2.label 
-                    ORDER BY COUNT(*) DESC 
-                    LIMIT 5
-                )
-                GROUP BY a.label, year
-                ORDER BY year, scrobbles DESC
-            """
-            evolution_data = self.db_manager.execute_query(labels_evolution_query)
+            top_names = [label for label, _ in top_labels[:5]]
+            
+            def evolution_partial(source):
+                monthly = self._rollup_source(source, date_range, by_month=True)
+                return self._grouped(f"""
+                    SELECT label, substr(day, 1, 4) as year, SUM(plays) as scrobbles
+                    FROM {monthly}
+                    WHERE label IN ({','.join('?' for _ in top_names)}) AND day != ''{range_sql}
+                    GROUP BY label, year
+                """, (*top_names, *range_params))
+            
+            evolution = self._sum_by(sources, evolution_partial) if top_names else Counter()
+            evolution_data = sorted(
+                ({'label': label, 'year': year, 'scrobbles': count} for (label, year), count in evolution.items()),
+                key=lambda row: (row['year'], -row['scrobbles'])
+            )
             
             # Preparar datos para gráficos
             labels_chart_data = [{'label': row['label'], 'scrobbles': row['scrobbles']} 
@@ -592,8 +949,7 @@ class ScrobblesAnalysisEndpoints:
             evolution_chart_data = [{'label': row['label'], 'year': int(row['year']), 'scrobbles': row['scrobbles']} 
                                   for row in evolution_data if row['year'].isdigit()]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -618,55 +974,72 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de sellos de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_collaborators_analysis(self):
+    def _get_scrobbles_collaborators_analysis(self, sources=None):
         """Análisis de colaboradores vs popularidad"""
         try:
-            # Productores más asociados con canciones populares (simplificado)
-            producers_query = """
-                SELECT 
-                    a.producers as producer_info,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album
-                WHERE a.producers IS NOT NULL AND a.producers != ''
-                GROUP BY a.producers
-                ORDER BY scrobbles DESC
-                LIMIT 10
-            """
-            producers_data = self.db_manager.execute_query(producers_query)
-            
-            # Ingenieros más asociados con canciones populares
-            engineers_query = """
-                SELECT 
-                    a.engineers as engineer_info,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album
-                WHERE a.engineers IS NOT NULL AND a.engineers != ''
-                GROUP BY a.engineers
-                ORDER BY scrobbles DESC
-                LIMIT 10
-            """
-            engineers_data = self.db_manager.execute_query(engineers_query)
+            sources = self._resolve_sources(sources)
+            
+            def partial(source):
+                album_joins = self._scrobble_joins(source, album_alias='a')
+                table = source['table']
+                return {
+                    # Productores más asociados con canciones populares (simplificado)
+                    'producers': self._grouped(f"""
+                        SELECT 
+                            a.producers as producer_info,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {album_joins}
+                        WHERE a.producers IS NOT NULL AND a.producers != ''
+                        GROUP BY a.producers
+                    """),
+                    # Ingenieros más asociados con canciones populares
+                    'engineers': self._grouped(f"""
+                        SELECT 
+                            a.engineers as engineer_info,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {album_joins}
+                        WHERE a.engineers IS NOT NULL AND a.engineers != ''
+                        GROUP BY a.engineers
+                    """),
+                    # Productores/ingenieros de cada artista (se cuentan los distintos al sumar)
+                    'collaborators': self._grouped(f"""
+                        SELECT 
+                            sp.artist_name,
+                            a.producers,
+                            a.engineers,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {album_joins}
+                        WHERE (a.producers IS NOT NULL OR a.engineers IS NOT NULL)
+                        GROUP BY sp.artist_name, a.producers, a.engineers
+                    """)
+                }
+            
+            totals = self._sum_by(sources, partial)
+            producers_data = [{'producer_info': producer, 'scrobbles': count}
+                              for producer, count in self._ranked(totals['producers'], 10)]
+            engineers_data = [{'engineer_info': engineer, 'scrobbles': count}
+                              for engineer, count in self._ranked(totals['engineers'], 10)]
             
             # Análisis de diversidad de colaboradores por artista
-            collaboration_diversity_query = """
-                SELECT 
-                    sp.artist_name,
-                    COUNT(DISTINCT a.producers) + COUNT(DISTINCT a.engineers) as unique_collaborators,
-                    COUNT(*) as total_scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN albums a ON a.artist_id = s.artist_id AND a.name = s.album
-                WHERE (a.producers IS NOT NULL OR a.engineers IS NOT NULL)
-                GROUP BY sp.artist_name
-                HAVING total_scrobbles >= 20
-                ORDER BY unique_collaborators DESC
-                LIMIT 15
-            """
-            diversity_data = self.db_manager.execute_query(collaboration_diversity_query)
+            by_artist = {}
+            for (artist_name, producers, engineers), count in totals['collaborators'].items():
+                artist = by_artist.setdefault(artist_name, {'producers': set(), 'engineers': set(), 'scrobbles': 0})
+                if producers is not None:
+                    artist['producers'].add(producers)
+                if engineers is not None:
+                    artist['engineers'].add(engineers)
+                artist['scrobbles'] += count
+            diversity_data = sorted((
+                {
+                    'artist_name': artist_name,
+                    'unique_collaborators': len(artist['producers']) + len(artist['engineers']),
+                    'total_scrobbles': artist['scrobbles']
+                }
+                for artist_name, artist in by_artist.items() if artist['scrobbles'] >= 20
+            ), key=lambda row: row['unique_collaborators'], reverse=True)[:15]
             
             # Preparar datos para gráficos
             producers_chart_data = []
@@ -683,8 +1056,7 @@ class ScrobblesAnalysisEndpoints:
             diversity_chart_data = [{'artist': row['artist_name'], 'collaborators': row['unique_collaborators']} 
                                   for row in diversity_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -714,71 +1086,97 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de colaboradores de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_duration_analysis(self):
+    def _get_scrobbles_duration_analysis(self, date_range=None, sources=None):
         """Análisis de duración vs popularidad"""
         try:
-            # Distribución de scrobbles por duración de canciones
-            duration_distribution_query = """
-                SELECT 
-                    CASE 
-                        WHEN s.duration <= 120 THEN '0-2 min'
-                        WHEN s.duration <= 180 THEN '2-3 min'
-                        WHEN s.duration <= 240 THEN '3-4 min'
-                        WHEN s.duration <= 300 THEN '4-5 min'
-                        WHEN s.duration <= 360 THEN '5-6 min'
-                        WHEN s.duration <= 480 THEN '6-8 min'
-                        ELSE '8+ min'
-                    END as duration_range,
-                    COUNT(*) as scrobbles,
-                    AVG(s.duration) as avg_duration
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.duration IS NOT NULL AND s.duration > 0
-                GROUP BY duration_range
-                ORDER BY 
-                    CASE duration_range
-                        WHEN '0-2 min' THEN 1
-                        WHEN '2-3 min' THEN 2
-                        WHEN '3-4 min' THEN 3
-                        WHEN '4-5 min' THEN 4
-                        WHEN '5-6 min' THEN 5
-                        WHEN '6-8 min' THEN 6
-                        ELSE 7
-                    END
-            """
-            duration_data = self.db_manager.execute_query(duration_distribution_query)
-            
-            # Duración promedio de álbumes más escuchados
-            album_duration_query = """
-                SELECT 
-                    s.album,
-                    sp.artist_name,
-                    SUM(s.duration) as total_duration,
-                    COUNT(*) as scrobbles,
-                    COUNT(DISTINCT s.id) as unique_tracks
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.duration IS NOT NULL AND s.album IS NOT NULL
-                GROUP BY s.album, sp.artist_name
-                HAVING scrobbles >= 10
-                ORDER BY scrobbles DESC
-                LIMIT 15
-            """
-            album_duration_data = self.db_manager.execute_query(album_duration_query)
-            
-            # Evolución de preferencias de duración en el tiempo
-            duration_evolution_query = """
-                SELECT 
-                    substr(sp.scrobble_date, 1, 4) as year,
-                    AVG(s.duration) as avg_duration
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                WHERE s.duration IS NOT NULL AND s.duration > 0
-                AND sp.scrobble_date IS NOT NULL
-                GROUP BY year
-                ORDER BY year
-            """
-            evolution_data = self.db_manager.execute_query(duration_evolution_query)
+            sources = self._resolve_sources(sources)
+            range_sql, range_params = self._range_filter(date_range)
+            
+            def partial(source):
+                table = source['table']
+                song_joins = self._scrobble_joins(source)
+                monthly = self._rollup_source(source, date_range, by_month=True)
+                # Rango sobre el timestamp indexado si existe (si no, sobre el texto)
+                ts_column = self.db_manager.time_column(table, 'ts', 'sp')
+                if ts_column:
+                    scrobble_range_sql, _ = self._range_filter(date_range, ts_column, epoch=True)
+                else:
+                    scrobble_range_sql, _ = self._range_filter(date_range, 'sp.scrobble_date')
+                
+                # Distribución de scrobbles por duración de canciones
+                duration_distribution_query = f"""
+                    SELECT 
+                        CASE 
+                            WHEN s.duration <= 120 THEN '0-2 min'
+                            WHEN s.duration <= 180 THEN '2-3 min'
+                            WHEN s.duration <= 240 THEN '3-4 min'
+                            WHEN s.duration <= 300 THEN '4-5 min'
+                            WHEN s.duration <= 360 THEN '5-6 min'
+                            WHEN s.duration <= 480 THEN '6-8 min'
+                            ELSE '8+ min'
+                        END as duration_range,
+                        COUNT(*) as scrobbles,
+                        SUM(s.duration) as duration
+                    FROM {table} sp
+                    {song_joins}
+                    WHERE s.duration IS NOT NULL AND s.duration > 0{scrobble_range_sql}
+                    GROUP BY duration_range
+                """
+                
+                # Duración de los álbumes escuchados
+                album_duration_query = f"""
+                    SELECT 
+                        s.album,
+                        sp.artist_name,
+                        COUNT(*) as scrobbles,
+                        SUM(s.duration) as total_duration
+                    FROM {table} sp
+                    {song_joins}
+                    WHERE s.duration IS NOT NULL AND s.album IS NOT NULL{scrobble_range_sql}
+                    GROUP BY s.album, sp.artist_name
+                """
+                
+                # Evolución de preferencias de duración en el tiempo
+                duration_evolution_query = f"""
+                    SELECT 
+                        substr(day, 1, 4) as year,
+                        SUM(duration_total) as duration_total,
+                        SUM(duration_plays) as duration_plays
+                    FROM {monthly}
+                    WHERE duration_plays > 0 AND day != ''{range_sql}
+                    GROUP BY year
+                """
+                return {
+                    **self._grouped(duration_distribution_query, range_params,
+                                    values=('range_scrobbles', 'range_duration')),
+                    **self._grouped(album_duration_query, range_params,
+                                    values=('album_scrobbles', 'album_duration')),
+                    **self._grouped(duration_evolution_query, range_params,
+                                    values=('year_duration', 'year_plays'))
+                }
+            
+            totals = self._sum_by(sources, partial)
+            duration_data = [
+                {
+                    'duration_range': duration_range,
+                    'scrobbles': totals['range_scrobbles'][duration_range],
+                    'avg_duration': totals['range_duration'][duration_range] / totals['range_scrobbles'][duration_range]
+                }
+                for duration_range in self.DURATION_RANGES if totals['range_scrobbles'][duration_range]
+            ]
+            
+            # Álbumes más escuchados (al menos 10 scrobbles)
+            album_duration_data = [
+                {'album': album, 'artist_name': artist_name, 'scrobbles': count,
+                 'total_duration': totals['album_duration'][(album, artist_name)]}
+                for (album, artist_name), count in self._ranked(totals['album_scrobbles'])
+                if count >= 10
+            ][:15]
+            
+            evolution_data = [
+                {'year': year, 'avg_duration': totals['year_duration'][year] * 1.0 / plays}
+                for year, plays in sorted(totals['year_plays'].items()) if plays
+            ]
             
             # Preparar datos para gráficos
             duration_chart_data = [{'range': row['duration_range'], 'scrobbles': row['scrobbles']} 
@@ -791,8 +1189,7 @@ class ScrobblesAnalysisEndpoints:
             evolution_chart_data = [{'year': int(row['year']), 'avg_duration': round(row['avg_duration'], 1)} 
                                   for row in evolution_data if row['year'].isdigit()]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
@@ -822,81 +1219,73 @@ class ScrobblesAnalysisEndpoints:
             logger.error(f"Error en análisis de duración de scrobbles: {e}")
             return {'error': str(e)}
     
-    def _get_scrobbles_languages_analysis(self):
+    def _get_scrobbles_languages_analysis(self, sources=None):
         """Análisis de idiomas en letras vs scrobbles"""
         try:
-            # Análisis de letras disponibles vs scrobbles
-            lyrics_analysis_query = """
-                SELECT 
-                    CASE WHEN l.lyrics IS NOT NULL THEN 'Con letras' ELSE 'Sin letras' END as has_lyrics,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                LEFT JOIN lyrics l ON s.lyrics_id = l.id
-                GROUP BY has_lyrics
-            """
-            lyrics_data = self.db_manager.execute_query(lyrics_analysis_query)
-            
-            # Palabras más frecuentes en letras de canciones escuchadas
-            frequent_words_query = """
-                SELECT 
-                    word,
-                    word_count,
-                    song_count
-                FROM (
-                    SELECT 
-                        TRIM(LOWER(word.value)) as word,
-                        COUNT(*) as word_count,
-                        COUNT(DISTINCT l.id) as song_count
-                    FROM scrobbles_paqueradejere sp
-                    JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                    JOIN lyrics l ON s.lyrics_id = l.id
-                    JOIN json_each(
-                        '[' || REPLACE(
-                            REPLACE(
-                                REPLACE(
-                                    REPLACE(l.lyrics, ' ', '","'),
-                                    '.', ''
-                                ),
-                                ',', ''
-                            ),
-                            '"', ''
-                        ) || ']'
-                    ) as word
-                    WHERE LENGTH(word.value) > 3
-                    AND word.value NOT IN ('the', 'and', 'with', 'that', 'this', 'from', 'they', 'have', 'were', 'been', 'their', 'said', 'each', 'which', 'them', 'than', 'many', 'some', 'what', 'would', 'make', 'like', 'into', 'time', 'very', 'when', 'come', 'here', 'just', 'know', 'take', 'people', 'year', 'good', 'work', 'much', 'other', 'also', 'around', 'must', 'well', 'large', 'add', 'such', 'because', 'turn', 'why', 'ask', 'went', 'men', 'read', 'need', 'land', 'different', 'home', 'move', 'try', 'kind', 'hand', 'picture', 'again', 'change', 'off', 'play', 'spell', 'air', 'away', 'animal', 'house', 'point', 'page', 'letter', 'mother', 'answer', 'found', 'study', 'still', 'learn', 'should', 'america', 'world')
-                    GROUP BY TRIM(LOWER(word.value))
-                    HAVING word_count >= 5
-                    ORDER BY word_count DESC
-                    LIMIT 20
-                )
-            """
-            words_data = self.db_manager.execute_query(frequent_words_query)
-            
-            # Análisis de longitud de letras vs popularidad
-            lyrics_length_query = """
-                SELECT 
-                    CASE 
-                        WHEN LENGTH(l.lyrics) <= 500 THEN 'Cortas'
-                        WHEN LENGTH(l.lyrics) <= 1500 THEN 'Medianas'
-                        WHEN LENGTH(l.lyrics) <= 3000 THEN 'Largas'
-                        ELSE 'Muy largas'
-                    END as lyrics_length,
-                    COUNT(*) as scrobbles
-                FROM scrobbles_paqueradejere sp
-                JOIN songs s ON s.artist = sp.artist_name AND s.title = sp.track_name
-                JOIN lyrics l ON s.lyrics_id = l.id
-                WHERE l.lyrics IS NOT NULL
-                GROUP BY lyrics_length
-                ORDER BY 
-                    CASE lyrics_length
-                        WHEN 'Cortas' THEN 1
-                        WHEN 'Medianas' THEN 2
-                        WHEN 'Largas' THEN 3
-                        ELSE 4
-                    END
-            """
-            length_data = self.db_manager.execute_query(lyrics_length_query)
+            sources = self._resolve_sources(sources)
+            
+            def weights_query(source):
+                """Escuchas de cada letra (peso de sus palabras)"""
+                return f"""
+                    SELECT s.lyrics_id, COUNT(*) as weight
+                    FROM {source['table']} sp
+                    {self._scrobble_joins(source)}
+                    WHERE s.lyrics_id IS NOT NULL
+                    GROUP BY s.lyrics_id
+                """
+            
+            def partial(source):
+                table = source['table']
+                song_joins = self._scrobble_joins(source)
+                return {
+                    # Análisis de letras disponibles vs scrobbles
+                    'lyrics': self._grouped(f"""
+                        SELECT 
+                            CASE WHEN l.lyrics IS NOT NULL THEN 'Con letras' ELSE 'Sin letras' END as has_lyrics,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {song_joins}
+                        LEFT JOIN lyrics l ON s.lyrics_id = l.id
+                        GROUP BY has_lyrics
+                    """),
+                    # Análisis de longitud de letras vs popularidad
+                    'length': self._grouped(f"""
+                        SELECT 
+                            CASE 
+                                WHEN LENGTH(l.lyrics) <= 500 THEN 'Cortas'
+                                WHEN LENGTH(l.lyrics) <= 1500 THEN 'Medianas'
+                                WHEN LENGTH(l.lyrics) <= 3000 THEN 'Largas'
+                                ELSE 'Muy largas'
+                            END as lyrics_length,
+                            COUNT(*) as scrobbles
+                        FROM {table} sp
+                        {song_joins}
+                        JOIN lyrics l ON s.lyrics_id = l.id
+                        WHERE l.lyrics IS NOT NULL
+                        GROUP BY lyrics_length
+                    """)
+                }
+            
+            totals = self._sum_by(sources, partial)
+            lyrics_data = [{'has_lyrics': status, 'scrobbles': count}
+                           for status, count in sorted(totals['lyrics'].items())]
+            length_data = [{'lyrics_length': length, 'scrobbles': totals['length'][length]}
+                           for length in self.LYRICS_LENGTHS if totals['length'][length]]
+            
+            # Palabras más frecuentes en letras de canciones escuchadas (índice de palabras de las letras)
+            if len(sources) == 1:
+                words_data = self.db_manager.get_lyrics_term_counts(
+                    weights_query(sources[0]), exclude=self.LYRICS_STOP_WORDS,
+                    min_length=4, min_count=5, limit=20)
+            else:
+                # Con varios usuarios se suman las apariciones de cada palabra por usuario
+                words = self._sum_by(sources, lambda source: Counter({
+                    row['word']: row['word_count'] for row in self.db_manager.get_lyrics_term_counts(
+                        weights_query(source), exclude=self.LYRICS_STOP_WORDS, min_length=4, limit=None)
+                }))
+                words_data = [{'word': word, 'word_count': count}
+                              for word, count in sorted(words.items(), key=lambda item: (-item[1], item[0]))
+                              if count >= 5][:20]
             
             # Preparar datos para gráficos
             lyrics_chart_data = [{'status': row['has_lyrics'], 'scrobbles': row['scrobbles']} 
@@ -908,8 +1297,7 @@ class ScrobblesAnalysisEndpoints:
             length_chart_data = [{'length': row['lyrics_length'], 'scrobbles': row['scrobbles']} 
                                for row in length_data]
             
-            from stats_manager import StatsManager
-            stats_manager = StatsManager(self.db_manager.db_path, self.config)
+            stats_manager = self.db_manager.stats
             
             charts = {}
             
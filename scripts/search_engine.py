@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from derived_store import DerivedJob
+
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = ('artist', 'album', 'song')
+
+# Pesos bm25 de las columnas (name, context) del índice unicode61
+BM25_WEIGHTS = (10.0, 1.0)
+
+# El tokenizador trigram necesita al menos 3 caracteres
+TRIGRAM_MIN_LENGTH = 3
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Filas completas de cada tipo unidas a la página del ranking (misma consulta):
+# tipo → (condición de que la fila existe, columnas, JOIN sobre `p`)
+HYDRATION = {
+    'artist': ("hy_ar.id IS NOT NULL", "hy_ar.*",
+               "LEFT JOIN artists hy_ar ON p.kind = 'artist' AND hy_ar.id = p.entity_id"),
+    'album': ("hy_al.id IS NOT NULL AND hy_alar.id IS NOT NULL", "hy_al.*, hy_alar.name AS artist_name",
+              "LEFT JOIN albums hy_al ON p.kind = 'album' AND hy_al.id = p.entity_id "
+              "LEFT JOIN artists hy_alar ON hy_alar.id = hy_al.artist_id"),
+    'song': ("hy_s.id IS NOT NULL", "hy_s.*",
+             "LEFT JOIN songs hy_s ON p.kind = 'song' AND hy_s.id = p.entity_id")
+}
+
+
+class SearchIndexJob(DerivedJob):
+    """Índice de búsqueda único sobre artistas, álbumes y canciones
+
+    - `search_docs`: un documento por entidad con su nombre, contexto
+      (artista / álbum) y el texto que se muestra ("Artista - Álbum").
+    - `search_fts`: FTS5 unicode61 sin diacríticos y con índices de prefijo,
+      para ranking bm25 y búsquedas mientras se escribe.
+    - `search_trigram`: FTS5 trigram sobre el texto mostrado, para
+      coincidencias de subcadena (equivalente a LIKE '%q%') con índice.
+    """
+
+    name = 'search_index'
+    version = 2
+
+    def build(self, conn: sqlite3.Connection, previous: Optional[Dict]) -> Dict:
+        conn.execute("DROP TABLE IF EXISTS search_fts")
+        conn.execute("DROP TABLE IF EXISTS search_trigram")
+        conn.execute("DROP TABLE IF EXISTS search_docs")
+        conn.execute("""
+            CREATE TABLE search_docs (
+                doc_id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                name TEXT,
+                context TEXT,
+                display TEXT,
+                sort_key TEXT
+            )
+        """)
+
+        conn.execute("""
+            INSERT INTO search_docs (kind, entity_id, name, context, display, sort_key)
+            SELECT 'artist', id, name, NULL, name, lower(name)
+            FROM src.artists
+            WHERE name IS NOT NULL AND name != ''
+        """)
+        conn.execute("""
+            INSERT INTO search_docs (kind, entity_id, name, context, display, sort_key)
+            SELECT 'album', a.id, a.name, ar.name, COALESCE(ar.name, '') || ' - ' || a.name,
+                   lower(COALESCE(ar.name, '') || ' ' || a.name)
+            FROM src.albums a
+            JOIN src.artists ar ON a.artist_id = ar.id
+            WHERE a.name IS NOT NULL AND a.name != ''
+        """)
+        conn.execute("""
+            INSERT INTO search_docs (kind, entity_id, name, context, display, sort_key)
+            SELECT 'song', id, title,
+                   COALESCE(artist, '') || ' ' || COALESCE(album, ''),
+                   COALESCE(title, '') || ' - ' || COALESCE(artist, '') || ' - ' || COALESCE(album, ''),
+                   lower(title)
+            FROM src.songs
+            WHERE title IS NOT NULL AND title != ''
+        """)
+        conn.execute("CREATE INDEX idx_search_docs_kind ON search_docs(kind, sort_key)")
+
+        conn.execute("""
+            CREATE VIRTUAL TABLE search_fts USING fts5(
+                name, context,
+                content='search_docs', content_rowid='doc_id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        """)
+        conn.execute("""
+            CREATE VIRTUAL TABLE search_trigram USING fts5(
+                display,
+                content='search_docs', content_rowid='doc_id',
+                tokenize='trigram'
+            )
+        """)
+        conn.execute("INSERT INTO search_fts(search_fts) VALUES('rebuild')")
+        conn.execute("INSERT INTO search_trigram(search_trigram) VALUES('rebuild')")
+
+        rows = conn.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+        return {'rows': rows, 'watermark': None}
+
+
+class SearchEngine:
+    """Búsqueda unificada sobre derived.search_* con una sola consulta por petición"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @property
+    def available(self) -> bool:
+        return self.db_manager.derived.is_ready(SearchIndexJob.name)
+
+    @property
+    def index_version(self) -> Optional[str]:
+        """Construcción actual del índice: los cursores de búsqueda solo valen para ella"""
+        meta = self.db_manager.derived.get_meta(SearchIndexJob.name)
+        return meta['built_at'] if meta else None
+
+    # === CONSULTAS FTS ===
+
+    @staticmethod
+    def build_fts_query(query: str, prefix: bool = True) -> Optional[str]:
+        """Convierte el texto del usuario en una consulta FTS5 segura
+
+        Cada palabra va entre comillas (sin operadores) y la última se busca
+        como prefijo para que funcione mientras se escribe.
+        """
+        terms = _TERM_RE.findall(query or '')
+        if not terms:
+            return None
+        parts = ['"' + term.replace('"', '""') + '"' for term in terms]
+        if prefix:
+            parts[-1] += '*'
+        return ' '.join(parts)
+
+    @staticmethod
+    def build_trigram_query(query: str) -> Optional[str]:
+        """Subcadena literal para el índice trigram (None si es demasiado corta)"""
+        text = (query or '').strip()
+        if len(text) < TRIGRAM_MIN_LENGTH:
+            return None
+        return '"' + text.replace('"', '""') + '"'
+
+    def search(self, query: str, kinds: Sequence[str] = SEARCH_KINDS, limit: int = 50,
+               order: str = 'rank', prefix: bool = True) -> Optional[Dict[str, List[Dict]]]:
+        """Busca en todas las entidades pedidas con una única consulta
+
+        Combina coincidencias bm25 (unicode61 + prefijo) y de subcadena
+        (trigram) y devuelve hasta `limit` resultados por tipo. Con
+        order='name' se ordena alfabéticamente en lugar de por relevancia.
+        Devuelve None si el índice no está disponible.
+        """
+        page = self.search_page(query, kinds, limit, order, prefix)
+        return page[0] if page is not None else None
+
+    def search_page(self, query: str, kinds: Sequence[str] = SEARCH_KINDS, limit: int = 50,
+                    order: str = 'rank', prefix: bool = True, after: Dict[str, List] = None,
+                    hydrate: bool = False) -> Optional[Tuple[Dict[str, List[Dict]], Dict[str, List]]]:
+        """Como search() pero paginado por clave (keyset)
+
+        `after` indica, por tipo, la clave de orden del último resultado ya
+        devuelto. Devuelve (resultados, siguientes claves); un tipo sin más
+        resultados no aparece en las siguientes claves. Con `hydrate` cada
+        resultado lleva en `row` la fila completa de su tabla (None si ya no
+        existe), cargada en la misma consulta que el ranking.
+        """
+        if not self.available:
+            return None
+
+        kinds = [k for k in kinds if k in SEARCH_KINDS]
+        after = after or {}
+        fts_query = self.build_fts_query(query, prefix)
+        trigram_query = self.build_trigram_query(query)
+        if not kinds or (fts_query is None and not (query or '').strip()):
+            return {kind: [] for kind in kinds}, {}
+
+        branches = []
+        params = []
+        if fts_query:
+            branches.append(f"""
+                SELECT rowid AS doc_id, 0 AS tier, bm25(search_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}) AS score
+                FROM derived.search_fts WHERE search_fts MATCH ?
+            """)
+            params.append(fts_query)
+        if trigram_query:
+            branches.append("""
+                SELECT rowid AS doc_id, 1 AS tier, 0.0 AS score
+                FROM derived.search_trigram WHERE search_trigram MATCH ?
+            """)
+            params.append(trigram_query)
+        else:
+            # Consultas de 1-2 caracteres: el trigram no sirve, se recorre search_docs
+            branches.append("""
+                SELECT doc_id, 1 AS tier, 0.0 AS score
+                FROM derived.search_docs WHERE display LIKE ?
+            """)
+            params.append(f"%{query.strip()}%")
+
+        if order == 'name':
+            sort_columns = ['d.sort_key', 'd.entity_id']
+        else:
+            sort_columns = ['h.tier', 'h.score', 'd.sort_key', 'd.entity_id']
+        order_by = ', '.join(sort_columns)
+        kind_placeholders = ','.join('?' for _ in kinds)
+
+        # Keyset: por cada tipo con cursor, solo filas posteriores a su última clave
+        after_filter = ''
+        after_params = []
+        for kind in kinds:
+            key = after.get(kind)
+            if key and len(key) == len(sort_columns):
+                after_filter += (f" AND (d.kind != ? OR ({order_by}) > "
+                                 f"({', '.join('?' for _ in sort_columns)}))")
+                after_params.extend([kind] + list(key))
+
+        # Columnas de cada tabla tras un marcador (_hy_<tipo>) que indica si hay fila
+        hydrated_columns = ''
+        hydration_joins = ''
+        if hydrate:
+            for kind in kinds:
+                present, columns, join = HYDRATION[kind]
+                hydrated_columns += f", ({present}) AS _hy_{kind}, {columns}"
+                hydration_joins += f" {join}"
+
+        sql = f"""
+            WITH hits AS (
+                SELECT doc_id, MIN(tier) AS tier, MIN(score) AS score
+                FROM ({' UNION ALL '.join(branches)})
+                GROUP BY doc_id
+            ),
+            ranked AS (
+                SELECT d.kind, d.entity_id, d.display, d.sort_key, h.tier, h.score,
+                       ROW_NUMBER() OVER (PARTITION BY d.kind ORDER BY {order_by}) AS rn
+                FROM hits h
+                JOIN derived.search_docs d ON d.doc_id = h.doc_id
+                WHERE d.kind IN ({kind_placeholders}){after_filter}
+            )
+            SELECT p.kind, p.entity_id, p.display, p.sort_key, p.tier, p.score{hydrated_columns}
+            FROM ranked p{hydration_joins}
+            WHERE p.rn <= ?
+            ORDER BY p.kind, p.rn
+        """
+        params.extend(kinds)
+        params.extend(after_params)
+        # Una fila más por tipo para saber si hay página siguiente
+        params.append(limit + 1)
+
+        try:
+            # Filas tupla: las tablas hidratadas repiten nombres de columna (id, name...)
+            cursor = self.db_manager.get_connection().cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Error en búsqueda FTS ('{query}'): {e}")
+            return None
+
+        # Tipo → (posición del marcador, fin de sus columnas)
+        segments = {}
+        if hydrate:
+            markers = [i for i, name in enumerate(names) if name.startswith('_hy_')] + [len(names)]
+            for start, end in zip(markers, markers[1:]):
+                segments[names[start][len('_hy_'):]] = (start, end)
+
+        results = {kind: [] for kind in kinds}
+        next_after = {}
+        for row in rows:
+            kind, entity_id, display, sort_key, tier, score = row[:6]
+            kind_results = results[kind]
+            if order == 'name':
+                key = [sort_key, entity_id]
+            else:
+                key = [tier, score, sort_key, entity_id]
+            if len(kind_results) == limit:
+                # Con limit=0 no hay última fila ni página siguiente
+                if kind_results:
+                    next_after[kind] = kind_results[-1]['key']
+                continue
+            hit = {
+                'id': entity_id,
+                'display': display,
+                'match': 'fts' if tier == 0 else 'substring',
+                'score': score,
+                'key': key
+            }
+            if hydrate:
+                start, end = segments[kind]
+                hit['row'] = dict(zip(names[start + 1:end], row[start + 1:end])) if row[start] else None
+            kind_results.append(hit)
+        return results, next_after
+
+    # === HIDRATACIÓN ===
+
+    @staticmethod
+    def _rows(hits: List[Dict]) -> List[Dict]:
+        """Filas completas de una página hidratada, en el orden del ranking"""
+        return [hit['row'] for hit in hits if hit['row'] is not None]
+
+    # === ENDPOINTS ===
+
+    def search_global(self, query: str, limit: int = 50) -> Optional[Dict]:
+        """Equivalente a DatabaseManager.search_global con ranking bm25"""
+        page = self.search_global_page(query, limit)
+        return page[0] if page is not None else None
+
+    def search_global_page(self, query: str, limit: int = 50, after: Dict = None) -> Optional[Tuple[Dict, Dict]]:
+        """Búsqueda global paginada: (resultados, siguientes claves por tipo)"""
+        # Con cursor solo se piden los tipos que aún tienen resultados
+        kinds = SEARCH_KINDS if after is None else [k for k in SEARCH_KINDS if k in after]
+        page = self.search_page(query, kinds, limit, after=after, hydrate=True)
+        if page is None:
+            return None
+        hits, next_after = page
+        return {
+            'artists': self._rows(hits.get('artist', [])),
+            'albums': self._rows(hits.get('album', [])),
+            'tracks': self._rows(hits.get('song', []))
+        }, next_after
+
+    def search_artists(self, query: str, limit: int = 50) -> Optional[List[Dict]]:
+        page = self.search_artists_page(query, limit)
+        return page[0] if page is not None else None
+
+    def search_artists_page(self, query: str, limit: int = 50, after: List = None) -> Optional[Tuple[List[Dict], Optional[List]]]:
+        page = self.search_page(query, ('artist',), limit, after={'artist': after} if after else None,
+                                hydrate=True)
+        if page is None:
+            return None
+        hits, next_after = page
+        return self._rows(hits['artist']), next_after.get('artist')
+
+    def search_albums(self, query: str, limit: int = 15) -> Optional[List[Dict]]:
+        page = self.search_albums_page(query, limit)
+        return page[0] if page is not None else None
+
+    def search_albums_page(self, query: str, limit: int = 15, after: List = None) -> Optional[Tuple[List[Dict], Optional[List]]]:
+        """Álbumes con el texto mostrado "Artista - Álbum" para el buscador de análisis"""
+        page = self.search_page(query, ('album',), limit, after={'album': after} if after else None,
+                                hydrate=True)
+        if page is None:
+            return None
+        hits, next_after = page
+        albums = []
+        for hit in hits['album']:
+            if hit['row'] is not None:
+                albums.append(dict(hit['row'], display_name=hit['display']))
+        return albums, next_after.get('album')
+
+    def artist_names_page(self, query: str, limit: int = 5000, after: List = None) -> Optional[Tuple[List[Dict], Optional[List]]]:
+        """(id, name) de artistas que coinciden, en orden alfabético (selector)"""
+        page = self.search_page(query, ('artist',), limit, order='name',
+                                after={'artist': after} if after else None)
+        if page is None:
+            return None
+        hits, next_after = page
+        return [{'id': hit['id'], 'name': hit['display']} for hit in hits['artist']], next_after.get('artist')
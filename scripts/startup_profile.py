@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import logging
+import builtins
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Perfil de arranque (`python app.py --profile-startup`)
+
+    Mide el tiempo de importación de cada módulo nuevo envolviendo
+    `builtins.__import__` (inclusivo y propio, descontando los módulos que
+    importa él mismo), marca las fases del arranque y, al servir la primera
+    petición, escribe el informe en el log y deja de medir.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: List[Tuple[str, float]] = []
+        self.first_request_s: Optional[float] = None
+        self.first_request_path: Optional[str] = None
+        self._imports: Dict[str, Tuple[float, float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._original_import = None
+
+    @classmethod
+    def start(cls) -> 'StartupProfiler':
+        profiler = cls()
+        profiler.install()
+        return profiler
+
+    # === IMPORTACIONES ===
+
+    def install(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import or builtins.__import__
+        # Ya cargado o relativo: su coste (si lo hay) se suma al módulo que importa
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if name in sys.modules:
+                with self._lock:
+                    self._imports.setdefault(name, (elapsed, elapsed - children))
+
+    # === FASES ===
+
+    def mark(self, phase: str):
+        """Registra el instante (desde el inicio del perfil) en que termina una fase"""
+        elapsed = time.perf_counter() - self.started
+        self.marks.append((phase, elapsed))
+        logger.info(f"Arranque: {phase} a los {elapsed:.3f}s")
+
+    def request_served(self, path: str):
+        """Primera petición servida: escribe el informe y deja de medir"""
+        if self.first_request_s is not None:
+            return
+        self.first_request_s = time.perf_counter() - self.started
+        self.first_request_path = path
+        self.uninstall()
+        self.log_report()
+
+    # === INFORME ===
+
+    def get_report(self, top: int = 25) -> Dict:
+        with self._lock:
+            imports = dict(self._imports)
+        by_total = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)
+        by_self = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'phases': [{'phase': phase, 's': round(elapsed, 3)} for phase, elapsed in self.marks],
+            'first_request_s': round(self.first_request_s, 3) if self.first_request_s is not None else None,
+            'first_request_path': self.first_request_path,
+            'modules_imported': len(imports),
+            'import_self_s': round(sum(own for _, own in imports.values()), 3),
+            'slowest_total': [
+                {'module': name, 'total_ms': round(total * 1000, 1), 'self_ms': round(own * 1000, 1)}
+                for name, (total, own) in by_total[:top]
+            ],
+            'slowest_self': [
+                {'module': name, 'self_ms': round(own * 1000, 1)}
+                for name, (_total, own) in by_self[:top]
+            ]
+        }
+
+    def log_report(self, top: int = 25):
+        report = self.get_report(top)
+        lines = [f"Perfil de arranque: {report['modules_imported']} módulos importados "
+                 f"({report['import_self_s']:.3f}s de importación)"]
+        for phase in report['phases']:
+            lines.append(f"  fase {phase['phase']:<20} {phase['s']:8.3f}s")
+        if report['first_request_s'] is not None:
+            lines.append(f"  primera petición servida {report['first_request_s']:8.3f}s "
+                         f"({report['first_request_path']})")
+        lines.append(f"  {'módulo':<40} {'total ms':>10} {'propio ms':>10}")
+        for item in report['slowest_total']:
+            lines.append(f"  {item['module']:<40} {item['total_ms']:10.1f} {item['self_ms']:10.1f}")
+        logger.info('\n'.join(lines))
@@ -4,50 +4,105 @@
 import sqlite3
 import logging
 import json
-from typing import List, Dict, Optional, Any
+import time
+import threading
+from typing import List, Dict, Optional, Any, Tuple, Union
 from datetime import datetime
 import os
 
+from db_pool import get_pool
+from analytics_engine import get_analytics_engine
+from chart_cache import chart_key, get_chart_cache
+from index_advisor import record_statement
+from lazy_import import lazy_module, load_modules, module_available
+from query_cache import get_query_cache, is_cacheable_statement
 
 
-# Importaciones opcionales para gráficos
-try:
-    import plotly.graph_objects as go
-    import plotly.express as px
-    import pandas as pd
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
+# Importaciones opcionales para gráficos: se cargan en el primer gráfico con
+# charts.format: plotly (o en el calentamiento tras arrancar el servidor)
+go = lazy_module('plotly.graph_objects')
+px = lazy_module('plotly.express')
+pd = lazy_module('pandas')
+PLOTLY_AVAILABLE = module_available('plotly') and module_available('pandas')
+if not PLOTLY_AVAILABLE:
     logging.warning("Plotly no disponible - los gráficos no estarán disponibles")
 
 logger = logging.getLogger(__name__)
 
+# Especificación compacta de gráficos: la expande static/js/charts.js
+CHART_FORMATS = ('spec', 'plotly')
+CHART_TYPES = ('pie', 'bar', 'line', 'scatter')
+CHART_STYLE = 'mwe-dark'
+
+# Gráficos de la página de sistema (/api/stats/charts/<categoría>/<tipo>)
+DASHBOARD_CHARTS = (
+    ('artists', 'countries'),
+    ('artists', 'top'),
+    ('albums', 'decades'),
+    ('albums', 'genres'),
+    ('albums', 'labels'),
+    ('songs', 'genres')
+)
+
+
+class _DashboardSnapshot:
+    """Estadísticas de la página de sistema calculadas de una vez"""
+
+    def __init__(self, sections: Dict[str, Any], token, duration: float):
+        self.sections = sections
+        self.token = token
+        self.duration = duration
+        self.built_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+
 class StatsManager:
-    """Manager principal para estadísticas de la base de datos musical"""
+    """Manager principal para estadísticas de la base de datos musical
+
+    Hay uno por BD (`get_stats_manager`). Las secciones de la página de
+    sistema se sirven desde un snapshot que se recalcula en segundo plano
+    cuando cambia la BD; mientras tanto se sigue sirviendo el anterior.
+    """
     
     def __init__(self, db_path: str, config: dict = None):
         self.db_path = db_path
         self.config = config or {}
-        self.conn = None
+        self.pool = None
+        self.analytics = None
+        self.chart_cache = get_chart_cache(self.config)
+        self.chart_format = self.config.get('charts', {}).get('format', 'spec')
+        if self.chart_format not in CHART_FORMATS:
+            self.chart_format = 'spec'
+        
+        dashboard_config = self.config.get('stats_dashboard', {})
+        self.dashboard_enabled = dashboard_config.get('enabled', True)
+        self.dashboard_check_interval = dashboard_config.get('check_interval', 30)
+        self._dashboard: Optional[_DashboardSnapshot] = None
+        self._dashboard_lock = threading.Lock()
+        self._dashboard_loading = False
+        self._dashboard_last_check = 0.0
+        self._dashboard_error = None
         self.init_connection()
     
     def init_connection(self):
-        """Inicializa la conexión a la base de datos"""
+        """Inicializa el acceso a la base de datos a través del pool compartido"""
         try:
             if os.path.exists(self.db_path):
-                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-                self.conn.row_factory = sqlite3.Row
-                logger.info(f"Conexión a BD establecida: {self.db_path}")
+                self.pool = get_pool(self.db_path, self.config)
+                self.analytics = get_analytics_engine(self.pool, self.config)
             else:
                 logger.error(f"Base de datos no encontrada: {self.db_path}")
         except Exception as e:
             logger.error(f"Error conectando a BD: {e}")
             
     def get_connection(self):
-        """Obtiene conexión a la BD con reconexión automática"""
-        if not self.conn:
+        """Obtiene la conexión de lectura del hilo actual desde el pool"""
+        if not self.pool:
             self.init_connection()
-        return self.conn
+        return self.pool.get_connection() if self.pool else None
     
 
     
@@ -96,6 +151,14 @@ class StatsManager:
     
     def execute_query(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
             """Ejecuta una consulta de forma segura y devuelve los resultados"""
+            if self.pool and is_cacheable_statement(query):
+                cache = get_query_cache(self.pool, self.config)
+                key = ('sql', query, tuple(params) if params else ())
+                return cache.get_or_compute(key, lambda: self._execute_query(query, params))
+            return self._execute_query(query, params)
+    
+    def _execute_query(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
+            record_statement(query, params)
             try:
                 with self.get_connection() as conn:
                     cursor = conn.cursor()
@@ -109,6 +172,12 @@ class StatsManager:
                 return []
 
 
+    def analytics_query(self, query: str, params: tuple = None) -> List:
+        """Consulta de agregación en el motor analítico (DuckDB o SQLite)"""
+        if not self.analytics:
+            return self.execute_query(query, params)
+        return self.analytics.query(query, params)
+
     def _get_db_size(self) -> int:
         """Obtiene el tamaño de la base de datos en bytes"""
         try:
@@ -130,10 +199,10 @@ class StatsManager:
                 FROM artists 
                 WHERE origin IS NOT NULL AND origin != ''
                 GROUP BY origin 
-                ORDER BY count DESC 
+                ORDER BY count DESC, origin
                 LIMIT 15
             """
-            countries = self.execute_query(country_query)
+            countries = self.analytics_query(country_query)
             
             # Artistas con más álbumes
             albums_query = """
@@ -141,10 +210,10 @@ class StatsManager:
                 FROM artists ar
                 LEFT JOIN albums al ON ar.id = al.artist_id
                 GROUP BY ar.id, ar.name
-                ORDER BY album_count DESC
+                ORDER BY album_count DESC, ar.id
                 LIMIT 15
             """
-            top_artists = self.execute_query(albums_query)
+            top_artists = self.analytics_query(albums_query)
             
             return {
                 'total_artists': total_artists,
@@ -170,7 +239,7 @@ class StatsManager:
                     CASE 
                         WHEN year IS NULL OR year = '' THEN 'Desconocido'
                         WHEN CAST(year AS INTEGER) < 1950 THEN 'Pre-1950'
-                        ELSE CAST(CAST(year AS INTEGER) / 10 * 10 AS TEXT) || 's'
+                        ELSE CAST(CAST(year AS INTEGER) - CAST(year AS INTEGER) % 10 AS TEXT) || 's'
                     END as decade,
                     COUNT(*) as count
                 FROM albums
@@ -178,7 +247,7 @@ class StatsManager:
                 GROUP BY decade
                 ORDER BY decade
             """
-            decades = self.execute_query(decades_query)
+            decades = self.analytics_query(decades_query)
             
             # Álbumes por género
             genres_query = """
@@ -186,10 +255,10 @@ class StatsManager:
                 FROM albums
                 WHERE genre IS NOT NULL AND genre != ''
                 GROUP BY genre
-                ORDER BY count DESC
+                ORDER BY count DESC, genre
                 LIMIT 15
             """
-            genres = self.execute_query(genres_query)
+            genres = self.analytics_query(genres_query)
             
             # Sellos con más álbumes
             labels_query = """
@@ -197,10 +266,10 @@ class StatsManager:
                 FROM albums
                 WHERE label IS NOT NULL AND label != ''
                 GROUP BY label
-                ORDER BY count DESC
+                ORDER BY count DESC, label
                 LIMIT 15
             """
-            labels = self.execute_query(labels_query)
+            labels = self.analytics_query(labels_query)
             
             return {
                 'total_albums': total_albums,
@@ -227,10 +296,10 @@ class StatsManager:
                 FROM songs
                 WHERE genre IS NOT NULL AND genre != ''
                 GROUP BY genre
-                ORDER BY count DESC
+                ORDER BY count DESC, genre
                 LIMIT 15
             """
-            genres = self.execute_query(genres_query)
+            genres = self.analytics_query(genres_query)
             
             # Duración total
             duration_query = """
@@ -242,7 +311,7 @@ class StatsManager:
                 FROM songs
                 WHERE duration IS NOT NULL AND duration > 0
             """
-            duration_result = self.execute_query(duration_query)
+            duration_result = self.analytics_query(duration_query)
             duration_stats = dict(duration_result[0]) if duration_result else {}
             
             # Canciones con letras
@@ -253,7 +322,7 @@ class StatsManager:
                 FROM songs s
                 LEFT JOIN lyrics l ON s.lyrics_id = l.id
             """
-            lyrics_result = self.execute_query(lyrics_query)
+            lyrics_result = self.analytics_query(lyrics_query)
             lyrics_stats = dict(lyrics_result[0]) if lyrics_result else {}
             
             return {
@@ -314,162 +383,204 @@ class StatsManager:
             return {}
     
     def create_chart(self, chart_type: str, data: List[Dict], title: str = "", 
-                 x_field: str = None, y_field: str = None) -> str:
-        """Crea un gráfico interactivo usando Plotly - VERSION MEJORADA"""
+                 x_field: str = None, y_field: str = None) -> Union[str, Dict[str, Any]]:
+        """Crea un gráfico interactivo usando Plotly - VERSION MEJORADA
+
+        Con `charts.format: spec` (por defecto) devuelve la especificación
+        compacta (tipo, campos, datos por columnas y preset de estilo) que
+        renderiza static/js/charts.js. Con `plotly` devuelve el JSON de la
+        figura completa, guardado en la caché de gráficos con clave (tipo,
+        título, campos, hash de los datos): con los mismos datos no se vuelve
+        a pasar por pandas ni Plotly.
+        """
         try:
+            if self.chart_format == 'spec':
+                return self._create_chart_spec(chart_type, data, title, x_field, y_field)
+            
             if not PLOTLY_AVAILABLE:
                 return self._create_simple_chart_fallback(chart_type, data, title)
             
             if not data:
                 return self._create_empty_chart(title)
             
-            # Convertir a DataFrame para facilitar el manejo
-            df = pd.DataFrame(data)
+            key = chart_key(chart_type, title, x_field, y_field, data)
+            chart = self.chart_cache.get(key)
+            if chart is None:
+                chart = self._render_chart(chart_type, data, title, x_field, y_field)
+                self.chart_cache.set(key, chart)
+            return chart
             
-            if chart_type == 'pie':
-                # Gráfico circular MEJORADO
-                fig = px.pie(df, 
-                        values=y_field or df.columns[1], 
-                        names=x_field or df.columns[0],
-                        title=title)
-                
-                # Configuración específica para gráficos circulares
-                fig.update_traces(
-                    textposition='inside',
-                    textinfo='label+percent+value',
-                    textfont_size=14,  # Texto más grande
-                    marker=dict(line=dict(color='#000000', width=2)),
-                    pull=[0.1 if i == 0 else 0 for i in range(len(data))]  # Destacar el primer sector
-                )
-                
-                # Mejorar leyenda para gráficos circulares
-                fig.update_layout(
-                    legend=dict(
-                        orientation="v",
-                        yanchor="top",
-                        y=1,
-                        xanchor="left",
-                        x=1.01,
-                        font=dict(size=12)
-                    )
+        except Exception as e:
+            logger.error(f"Error creando gráfico: {e}")
+            return self._create_empty_chart(f"Error: {str(e)}")
+    
+    def _create_chart_spec(self, chart_type: str, data: List[Dict], title: str,
+                           x_field: str = None, y_field: str = None) -> Dict[str, Any]:
+        """Especificación compacta: los valores de los ejes por columnas, sin layout"""
+        if not data:
+            return self._create_empty_chart(title)
+        if chart_type not in CHART_TYPES:
+            return self._create_empty_chart(f"Tipo de gráfico no soportado: {chart_type}")
+        
+        columns = list(data[0].keys())
+        x_field = x_field or columns[0]
+        y_field = y_field or columns[1]
+        return {
+            'spec': 1,
+            'type': chart_type,
+            'title': title,
+            'x': x_field,
+            'y': y_field,
+            'data': [[row.get(x_field) for row in data], [row.get(y_field) for row in data]],
+            'style': CHART_STYLE
+        }
+    
+    def _render_chart(self, chart_type: str, data: List[Dict], title: str,
+                      x_field: str = None, y_field: str = None) -> str:
+        """Construye la figura de Plotly y la serializa a JSON"""
+        # Convertir a DataFrame para facilitar el manejo
+        df = pd.DataFrame(data)
+        
+        if chart_type == 'pie':
+            # Gráfico circular MEJORADO
+            fig = px.pie(df, 
+                    values=y_field or df.columns[1], 
+                    names=x_field or df.columns[0],
+                    title=title)
+            
+            # Configuración específica para gráficos circulares
+            fig.update_traces(
+                textposition='inside',
+                textinfo='label+percent+value',
+                textfont_size=14,  # Texto más grande
+                marker=dict(line=dict(color='#000000', width=2)),
+                pull=[0.1 if i == 0 else 0 for i in range(len(data))]  # Destacar el primer sector
+            )
+            
+            # Mejorar leyenda para gráficos circulares
+            fig.update_layout(
+                legend=dict(
+                    orientation="v",
+                    yanchor="top",
+                    y=1,
+                    xanchor="left",
+                    x=1.01,
+                    font=dict(size=12)
                 )
-                
-            elif chart_type == 'bar':
-                # Gráfico de barras COMPLETAMENTE REDISEÑADO
-                fig = px.bar(df, 
+            )
+            
+        elif chart_type == 'bar':
+            # Gráfico de barras COMPLETAMENTE REDISEÑADO
+            fig = px.bar(df, 
+                    x=x_field or df.columns[0], 
+                    y=y_field or df.columns[1],
+                    title=title,
+                    color_discrete_sequence=['#a8e6cf'])  # Color verde de tu tema
+            
+            # Configuración específica para barras
+            fig.update_traces(
+                marker=dict(
+                    line=dict(color='rgba(255,255,255,0.3)', width=1),
+                    opacity=0.8
+                ),
+                texttemplate='%{y}',
+                textposition='outside',
+                textfont=dict(size=12, color='white')
+            )
+            
+            # Rotar etiquetas del eje X si son largas
+            fig.update_xaxes(
+                tickangle=45 if any(len(str(x)) > 10 for x in df.iloc[:, 0]) else 0,
+                tickfont=dict(size=11, color='white')
+            )
+            
+            fig.update_yaxes(
+                tickfont=dict(size=11, color='white'),
+                gridcolor='rgba(255,255,255,0.2)'
+            )
+            
+        elif chart_type == 'line':
+            # Gráfico de líneas MEJORADO
+            fig = px.line(df, 
                         x=x_field or df.columns[0], 
                         y=y_field or df.columns[1],
                         title=title,
-                        color_discrete_sequence=['#a8e6cf'])  # Color verde de tu tema
-                
-                # Configuración específica para barras
-                fig.update_traces(
-                    marker=dict(
-                        line=dict(color='rgba(255,255,255,0.3)', width=1),
-                        opacity=0.8
-                    ),
-                    texttemplate='%{y}',
-                    textposition='outside',
-                    textfont=dict(size=12, color='white')
-                )
-                
-                # Rotar etiquetas del eje X si son largas
-                fig.update_xaxes(
-                    tickangle=45 if any(len(str(x)) > 10 for x in df.iloc[:, 0]) else 0,
-                    tickfont=dict(size=11, color='white')
-                )
-                
-                fig.update_yaxes(
-                    tickfont=dict(size=11, color='white'),
-                    gridcolor='rgba(255,255,255,0.2)'
-                )
-                
-            elif chart_type == 'line':
-                # Gráfico de líneas MEJORADO
-                fig = px.line(df, 
-                            x=x_field or df.columns[0], 
-                            y=y_field or df.columns[1],
-                            title=title,
-                            markers=True)
-                
-                # Configuración específica para líneas
-                fig.update_traces(
-                    line=dict(color='#a8e6cf', width=3),
-                    marker=dict(size=8, color='#2a5298', line=dict(width=2, color='white')),
-                    textfont=dict(size=12, color='white')
-                )
-                
-                fig.update_xaxes(
-                    tickfont=dict(size=11, color='white'),
-                    gridcolor='rgba(255,255,255,0.2)'
-                )
-                
-                fig.update_yaxes(
-                    tickfont=dict(size=11, color='white'),
-                    gridcolor='rgba(255,255,255,0.2)'
-                )
-                
-            elif chart_type == 'scatter':
-                # Gráfico de dispersión MEJORADO
-                fig = px.scatter(df, 
-                            x=x_field or df.columns[0], 
-                            y=y_field or df.columns[1],
-                            title=title,
-                            size_max=15)
-                
-                fig.update_traces(
-                    marker=dict(
-                        size=10,
-                        color='#a8e6cf',
-                        line=dict(width=2, color='white'),
-                        opacity=0.8
-                    )
-                )
-                
-            else:
-                return self._create_empty_chart(f"Tipo de gráfico no soportado: {chart_type}")
+                        markers=True)
             
-            # Configurar tema oscuro personalizado que coincida con tu webapp
-            fig.update_layout(
-                template='plotly_dark',
-                plot_bgcolor='rgba(30, 60, 114, 0.1)',  # Fondo similar al de tu webapp
-                paper_bgcolor='rgba(30, 60, 114, 0.05)',
-                font=dict(
-                    family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", 
-                    size=13,
-                    color='white'
-                ),
-                title=dict(
-                    font=dict(size=18, color='#a8e6cf'),  # Verde de tu tema
-                    x=0.5,  # Centrar título
-                    xanchor='center'
-                ),
-                showlegend=True,
-                height=450,  # Un poco más alto
-                margin=dict(l=60, r=60, t=80, b=60),
-                # Añadir bordes y efectos
-                shapes=[
-                    dict(
-                        type="rect",
-                        xref="paper", yref="paper",
-                        x0=0, y0=0, x1=1, y1=1,
-                        line=dict(color="rgba(168, 230, 207, 0.3)", width=1)
-                    )
-                ]
+            # Configuración específica para líneas
+            fig.update_traces(
+                line=dict(color='#a8e6cf', width=3),
+                marker=dict(size=8, color='#2a5298', line=dict(width=2, color='white')),
+                textfont=dict(size=12, color='white')
             )
             
-            # Configurar hover personalizado
-            fig.update_traces(
-                hovertemplate='<b>%{label}</b><br>Valor: %{value}<br><extra></extra>' if chart_type == 'pie' 
-                            else '<b>%{x}</b><br>Valor: %{y}<br><extra></extra>',
+            fig.update_xaxes(
+                tickfont=dict(size=11, color='white'),
+                gridcolor='rgba(255,255,255,0.2)'
             )
             
-            # Convertir a JSON para el frontend
-            return fig.to_json()
+            fig.update_yaxes(
+                tickfont=dict(size=11, color='white'),
+                gridcolor='rgba(255,255,255,0.2)'
+            )
             
-        except Exception as e:
-            logger.error(f"Error creando gráfico: {e}")
-            return self._create_empty_chart(f"Error: {str(e)}")
+        elif chart_type == 'scatter':
+            # Gráfico de dispersión MEJORADO
+            fig = px.scatter(df, 
+                        x=x_field or df.columns[0], 
+                        y=y_field or df.columns[1],
+                        title=title,
+                        size_max=15)
+            
+            fig.update_traces(
+                marker=dict(
+                    size=10,
+                    color='#a8e6cf',
+                    line=dict(width=2, color='white'),
+                    opacity=0.8
+                )
+            )
+            
+        else:
+            return self._create_empty_chart(f"Tipo de gráfico no soportado: {chart_type}")
+        
+        # Configurar tema oscuro personalizado que coincida con tu webapp
+        fig.update_layout(
+            template='plotly_dark',
+            plot_bgcolor='rgba(30, 60, 114, 0.1)',  # Fondo similar al de tu webapp
+            paper_bgcolor='rgba(30, 60, 114, 0.05)',
+            font=dict(
+                family="'Segoe UI', Tahoma, Geneva, Verdana, sans-serif", 
+                size=13,
+                color='white'
+            ),
+            title=dict(
+                font=dict(size=18, color='#a8e6cf'),  # Verde de tu tema
+                x=0.5,  # Centrar título
+                xanchor='center'
+            ),
+            showlegend=True,
+            height=450,  # Un poco más alto
+            margin=dict(l=60, r=60, t=80, b=60),
+            # Añadir bordes y efectos
+            shapes=[
+                dict(
+                    type="rect",
+                    xref="paper", yref="paper",
+                    x0=0, y0=0, x1=1, y1=1,
+                    line=dict(color="rgba(168, 230, 207, 0.3)", width=1)
+                )
+            ]
+        )
+        
+        # Configurar hover personalizado
+        fig.update_traces(
+            hovertemplate='<b>%{label}</b><br>Valor: %{value}<br><extra></extra>' if chart_type == 'pie' 
+                        else '<b>%{x}</b><br>Valor: %{y}<br><extra></extra>',
+        )
+        
+        # Convertir a JSON para el frontend
+        return fig.to_json()
     
     def _create_simple_chart_fallback(self, chart_type: str, data: List[Dict], title: str) -> str:
         """Fallback simple cuando Plotly no está disponible"""
@@ -484,8 +595,10 @@ class StatsManager:
         return json.dumps(fallback_data)
     
 
-    def _create_empty_chart(self, message: str) -> str:
+    def _create_empty_chart(self, message: str) -> Union[str, Dict[str, Any]]:
         """Crea un gráfico vacío con mensaje - VERSION MEJORADA"""
+        if self.chart_format == 'spec':
+            return {'spec': 1, 'type': 'empty', 'title': message, 'style': CHART_STYLE}
         if PLOTLY_AVAILABLE:
             fig = go.Figure()
             fig.add_annotation(
@@ -511,11 +624,16 @@ class StatsManager:
             })
     
 
-    def get_chart_data_for_frontend(self, chart_type: str, category: str) -> Dict[str, Any]:
-        """Prepara datos de gráficos específicos para el frontend - VERSION MEJORADA"""
+    def get_chart_data_for_frontend(self, chart_type: str, category: str,
+                                    category_stats: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Prepara datos de gráficos específicos para el frontend - VERSION MEJORADA
+
+        `category_stats` evita recalcular las estadísticas de la categoría
+        (el snapshot del panel genera todos los gráficos con las mismas).
+        """
         try:
             if category == 'artists':
-                stats = self.get_artists_stats()
+                stats = category_stats or self.get_artists_stats()
                 if chart_type == 'countries':
                     # Limitar a top 8 países para mejor visualización
                     top_countries = stats['by_country'][:8]
@@ -534,7 +652,7 @@ class StatsManager:
                     }
                     
             elif category == 'albums':
-                stats = self.get_albums_stats()
+                stats = category_stats or self.get_albums_stats()
                 if chart_type == 'decades':
                     return {
                         'chart': self.create_chart('bar', stats['by_decade'], 
@@ -559,7 +677,7 @@ class StatsManager:
                     }
                     
             elif category == 'songs':
-                stats = self.get_songs_stats()
+                stats = category_stats or self.get_songs_stats()
                 if chart_type == 'genres':
                     # Limitar a top 10 géneros para gráfico circular
                     top_genres = stats['by_genre'][:10]
@@ -575,13 +693,21 @@ class StatsManager:
             logger.error(f"Error preparando datos para frontend: {e}")
             return {'chart': self._create_empty_chart(f'Error: {str(e)}'), 'data': []}
     
-    def get_system_overview(self) -> Dict[str, Any]:
-        """Resumen general del sistema"""
+    def get_system_overview(self, sections: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Resumen general del sistema (a partir de `sections` si ya están calculadas)"""
         try:
-            db_info = self.get_database_info()
-            artists_stats = self.get_artists_stats()
-            albums_stats = self.get_albums_stats()
-            songs_stats = self.get_songs_stats()
+            if sections is None:
+                sections = {
+                    'database': self.get_database_info(),
+                    'artists': self.get_artists_stats(),
+                    'albums': self.get_albums_stats(),
+                    'songs': self.get_songs_stats(),
+                    'missing_data': self.get_missing_data_stats()
+                }
+            db_info = sections['database']
+            artists_stats = sections['artists']
+            albums_stats = sections['albums']
+            songs_stats = sections['songs']
             
             return {
                 'database': {
@@ -597,17 +723,18 @@ class StatsManager:
                         songs_stats.get('duration_stats', {}).get('total_duration', 0) / 3600, 2
                     )
                 },
-                'completeness': self._calculate_overall_completeness()
+                'completeness': self._calculate_overall_completeness(sections['missing_data'])
             }
             
         except Exception as e:
             logger.error(f"Error en resumen del sistema: {e}")
             return {}
     
-    def _calculate_overall_completeness(self) -> float:
+    def _calculate_overall_completeness(self, missing_stats: Dict[str, Any] = None) -> float:
         """Calcula la completitud general de los datos"""
         try:
-            missing_stats = self.get_missing_data_stats()
+            if missing_stats is None:
+                missing_stats = self.get_missing_data_stats()
             if not missing_stats:
                 return 0.0
             
@@ -623,4 +750,144 @@ class StatsManager:
             
         except Exception as e:
             logger.error(f"Error calculando completitud: {e}")
-            return 0.0
\ No newline at end of file
+            return 0.0
+
+    
+    # === SNAPSHOT DEL PANEL DE SISTEMA ===
+    
+    def _data_token(self):
+        return (self.pool.change_token, self.pool.data_token()) if self.pool else None
+    
+    def start(self):
+        """Cálculo inicial del snapshot en segundo plano"""
+        if self.dashboard_enabled:
+            self._refresh_dashboard_async()
+    
+    def build_dashboard(self) -> bool:
+        """Calcula todas las secciones del panel si la BD ha cambiado"""
+        with self._dashboard_lock:
+            token = self._data_token()
+            if self._dashboard is not None and self._dashboard.token == token:
+                return False
+            
+            started = time.time()
+            try:
+                sections = {
+                    'database': self.get_database_info(),
+                    'artists': self.get_artists_stats(),
+                    'albums': self.get_albums_stats(),
+                    'songs': self.get_songs_stats(),
+                    'missing_data': self.get_missing_data_stats()
+                }
+                sections['overview'] = self.get_system_overview(sections)
+                # Los getters devuelven {} si fallan: no se guardan como datos válidos
+                empty = [name for name, data in sections.items() if not data]
+                if empty:
+                    raise RuntimeError(f"secciones sin datos: {', '.join(empty)}")
+                sections['charts'] = {
+                    f"{category}/{chart_type}": self.get_chart_data_for_frontend(
+                        chart_type, category, sections[category])
+                    for category, chart_type in DASHBOARD_CHARTS
+                }
+                self._dashboard = _DashboardSnapshot(sections, token, round(time.time() - started, 3))
+                self._dashboard_error = None
+                logger.info(f"Panel de estadísticas calculado en {self._dashboard.duration}s")
+                return True
+            except Exception as e:
+                self._dashboard_error = str(e)
+                logger.error(f"Error calculando panel de estadísticas: {e}")
+                return False
+    
+    def _refresh_dashboard_async(self):
+        if self._dashboard_loading:
+            return
+        self._dashboard_loading = True
+        
+        def run():
+            try:
+                self.build_dashboard()
+            finally:
+                self._dashboard_loading = False
+        
+        threading.Thread(target=run, name='stats-dashboard', daemon=True).start()
+    
+    def _current_dashboard(self) -> Optional[_DashboardSnapshot]:
+        """Snapshot actual; comprueba cambios en la BD como mucho cada check_interval"""
+        if not self.dashboard_enabled:
+            return None
+        snapshot = self._dashboard
+        now = time.time()
+        if now - self._dashboard_last_check >= self.dashboard_check_interval:
+            self._dashboard_last_check = now
+            if snapshot is None or self._data_token() != snapshot.token:
+                # Se sigue respondiendo con el snapshot anterior (o al momento si
+                # el cálculo inicial falló) mientras se recalcula
+                self._refresh_dashboard_async()
+        return snapshot
+    
+    def get_dashboard_section(self, section: str, chart: str = None) -> Tuple[Any, Optional[float]]:
+        """Sección del panel y su antigüedad en segundos (None si se ha calculado ahora)
+
+        Secciones: overview, database, artists, albums, songs, missing_data y
+        charts (con `chart` = 'categoría/tipo'). Sin snapshot se calcula al momento
+        solo la sección pedida y el snapshot se reintenta en segundo plano.
+        """
+        snapshot = self._current_dashboard()
+        if snapshot is not None:
+            data = snapshot.sections.get(section)
+            if chart is not None and data is not None:
+                data = data.get(chart)
+            if data is not None:
+                return data, snapshot.age
+        
+        if section == 'charts':
+            category, _, chart_type = (chart or '').partition('/')
+            return self.get_chart_data_for_frontend(chart_type, category), None
+        live = {
+            'overview': self.get_system_overview,
+            'database': self.get_database_info,
+            'artists': self.get_artists_stats,
+            'albums': self.get_albums_stats,
+            'songs': self.get_songs_stats,
+            'missing_data': self.get_missing_data_stats
+        }
+        return live[section](), None
+    
+    def get_dashboard_stats(self) -> Dict[str, Any]:
+        snapshot = self._dashboard
+        return {
+            'enabled': self.dashboard_enabled,
+            'loaded': snapshot is not None,
+            'age_s': round(snapshot.age, 1) if snapshot else None,
+            'build_duration_s': snapshot.duration if snapshot else None,
+            'refreshing': self._dashboard_loading,
+            'last_error': self._dashboard_error
+        }
+
+
+_managers: Dict[str, StatsManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_stats_manager(db_path: str, config: dict = None) -> StatsManager:
+    """StatsManager compartido por todos los endpoints que leen de la misma BD"""
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = StatsManager(db_path, config)
+            _managers[db_path] = manager
+        return manager
+
+
+def warm_up_charts(config: dict = None) -> Optional[float]:
+    """Carga pandas y Plotly antes del primer gráfico (solo charts.format: plotly)
+
+    Genera además una figura vacía para que Plotly cargue la plantilla oscura.
+    Devuelve los segundos empleados o None si no hace falta.
+    """
+    chart_format = (config or {}).get('charts', {}).get('format', 'spec')
+    if chart_format != 'plotly' or not PLOTLY_AVAILABLE:
+        return None
+    elapsed = load_modules(pd, px, go)
+    go.Figure(layout=dict(template='plotly_dark')).to_json()
+    return elapsed
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tablas con fecha en texto → (columna de fecha, prefijo de las columnas generadas).
+# Las claves terminadas en '_' se aplican a todas las tablas con ese prefijo
+# (scrobbles_<usuario>, listens_<usuario>).
+TIME_SOURCES = [
+    ('scrobbles_', 'scrobble_date', 'scrobble'),
+    ('listens_', 'listen_date', 'listen'),
+    ('artists_setlistfm', 'eventDate', 'event'),
+]
+
+# Columnas generadas de versiones anteriores que ya no usa ninguna consulta
+# (tabla, prefijo): se eliminan al aplicar la migración
+OBSOLETE_SOURCES = [
+    ('feeds', 'post'),
+]
+
+# Parte de la fecha → (tipo, expresión sobre la columna de texto, indexada).
+# `ts` son segundos desde 1970 (UTC, como strftime('%s')); `year`, `month` y
+# `day` mantienen el texto que devolvía substr() en las consultas anteriores.
+DATE_PARTS = {
+    'ts': ('INTEGER', "CAST(strftime('%s', {column}) AS INTEGER)", True),
+    'year': ('TEXT', "strftime('%Y', {column})", True),
+    'month': ('TEXT', "strftime('%Y-%m', {column})", True),
+    'day': ('TEXT', "date({column})", False),
+    'weekday': ('INTEGER', "CAST(strftime('%w', {column}) AS INTEGER)", True),
+    'hour': ('INTEGER', "CAST(strftime('%H', {column}) AS INTEGER)", True),
+}
+
+
+def time_source(table: str) -> Optional[Tuple[str, str]]:
+    """(columna de fecha, prefijo) de una tabla de TIME_SOURCES o None"""
+    for key, date_column, prefix in TIME_SOURCES:
+        if table == key or (key.endswith('_') and table.startswith(key)):
+            return date_column, prefix
+    return None
+
+
+def part_column(prefix: str, part: str) -> str:
+    """Nombre de la columna generada de una parte de la fecha"""
+    return f"{prefix}_{part}"
+
+
+def part_expression(date_column: str, part: str, alias: str = None) -> str:
+    """Expresión equivalente a la columna generada calculada sobre el texto"""
+    column = f"{alias}.{date_column}" if alias else date_column
+    return DATE_PARTS[part][1].format(column=column)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> Set[str]:
+    """Columnas de una tabla, incluidas las generadas (ocultas en table_info)"""
+    try:
+        return {row[1] for row in conn.execute(f"PRAGMA table_xinfo('{table}')")}
+    except sqlite3.Error:
+        return set()
+
+
+def pending_time_columns(conn: sqlite3.Connection) -> List[Dict]:
+    """Columnas generadas e índices de TIME_SOURCES que faltan en esta BD"""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    pending = []
+    for table in tables:
+        source = time_source(table)
+        if not source:
+            continue
+        date_column, prefix = source
+        columns = table_columns(conn, table)
+        if date_column not in columns:
+            continue
+        for part, (col_type, _, indexed) in DATE_PARTS.items():
+            column = part_column(prefix, part)
+            index = f"idx_mwe_{table}_{column}" if indexed else None
+            if column in columns and (index is None or index in indexes):
+                continue
+            pending.append({
+                'table': table,
+                'column': column,
+                'type': col_type,
+                'expression': part_expression(date_column, part),
+                'create_column': column not in columns,
+                'index': index if index and index not in indexes else None
+            })
+    return pending
+
+
+def apply_time_columns(conn: sqlite3.Connection) -> List[str]:
+    """Añade las columnas generadas y sus índices; devuelve lo creado
+
+    Son columnas VIRTUAL (ALTER TABLE no admite STORED): no ocupan espacio
+    en la tabla ni necesitan triggers, el valor se calcula al leer la fila
+    y se guarda solo en el índice. Los INSERT existentes no cambian porque
+    no se puede escribir en ellas.
+    """
+    drop_obsolete_time_columns(conn)
+    created = []
+    for item in pending_time_columns(conn):
+        if item['create_column']:
+            conn.execute(
+                f'ALTER TABLE "{item["table"]}" ADD COLUMN {item["column"]} {item["type"]} '
+                f'GENERATED ALWAYS AS ({item["expression"]}) VIRTUAL'
+            )
+            created.append(f'{item["table"]}.{item["column"]}')
+        if item['index']:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {item["index"]} ON "{item["table"]}" ({item["column"]})')
+            created.append(item['index'])
+    return created
+
+
+def drop_obsolete_time_columns(conn: sqlite3.Connection) -> List[str]:
+    """Elimina las columnas generadas de OBSOLETE_SOURCES y sus índices"""
+    dropped = []
+    for table, prefix in OBSOLETE_SOURCES:
+        columns = table_columns(conn, table)
+        for part in DATE_PARTS:
+            column = part_column(prefix, part)
+            if column not in columns:
+                continue
+            # DROP COLUMN falla si la columna está indexada
+            conn.execute(f"DROP INDEX IF EXISTS idx_mwe_{table}_{column}")
+            conn.execute(f'ALTER TABLE "{table}" DROP COLUMN {column}')
+            dropped.append(f"{table}.{column}")
+    if dropped:
+        logger.info(f"Eliminadas columnas de fecha generadas sin uso: {', '.join(dropped)}")
+    return dropped
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin acentos y con las palabras separadas por un espacio"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(_WORD_RE.findall(stripped.casefold()))
+
+
+class _PrefixIndex:
+    """Dos arrays ordenados de claves (nombre completo y desde cada palabra)"""
+
+    __slots__ = ('full_keys', 'full_refs', 'word_keys', 'word_refs')
+
+    def __init__(self, full: List[Tuple[str, int]], words: List[Tuple[str, int]]):
+        full.sort()
+        words.sort()
+        self.full_keys = [k for k, _ in full]
+        self.full_refs = [r for _, r in full]
+        self.word_keys = [k for k, _ in words]
+        self.word_refs = [r for _, r in words]
+
+    def lookup(self, prefix: str, limit: int) -> List[int]:
+        """Referencias cuyo nombre empieza por `prefix`, y luego las que tienen
+        una palabra que empieza por `prefix` (sin repetir)"""
+        found = []
+        seen = set()
+        for keys, refs in ((self.full_keys, self.full_refs), (self.word_keys, self.word_refs)):
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+                ref = refs[i]
+                if ref not in seen:
+                    seen.add(ref)
+                    found.append(ref)
+                i += 1
+            if len(found) >= limit:
+                break
+        return found
+
+    def __len__(self):
+        return len(self.full_keys) + len(self.word_keys)
+
+
+def _word_suffixes(normalized: str) -> List[str]:
+    """'disco 1 de artista' -> ['1 de artista', 'de artista', 'artista']"""
+    suffixes = []
+    position = normalized.find(' ')
+    while position != -1:
+        suffixes.append(normalized[position + 1:])
+        position = normalized.find(' ', position + 1)
+    return suffixes
+
+
+class _TypeaheadSnapshot:
+    """Datos inmutables de una carga; se sustituye entero al refrescar"""
+
+    def __init__(self, artists: List[tuple], albums: List[tuple], token: str, duration: float):
+        self.artists = artists
+        self.albums = albums
+        self.token = token
+        self.duration = duration
+        self.built_at = datetime.now().isoformat()
+
+        full, words = [], []
+        for ref, (_, name) in enumerate(artists):
+            key = normalize(name)
+            if key:
+                full.append((key, ref))
+                words.extend((suffix, ref) for suffix in _word_suffixes(key))
+        self.artist_index = _PrefixIndex(full, words)
+
+        full, words = [], []
+        for ref, (_, name, artist_name, *_rest) in enumerate(albums):
+            key = normalize(name)
+            display_key = normalize(f"{artist_name} {name}")
+            if key:
+                full.append((key, ref))
+            if display_key and display_key != key:
+                full.append((display_key, ref))
+            for suffix in set(_word_suffixes(key)) | set(_word_suffixes(display_key)):
+                if suffix != key:
+                    words.append((suffix, ref))
+        self.album_index = _PrefixIndex(full, words)
+
+
+class TypeaheadIndex:
+    """Sugerencias de artistas y álbumes en memoria mediante bisección
+
+    Carga (id, nombre) de `artists` y `albums` en arrays ordenados de claves
+    normalizadas y responde búsquedas por prefijo y por prefijo de palabra
+    sin consultar SQLite. Se recarga en segundo plano cuando cambia la BD.
+    """
+
+    def __init__(self, pool, config: dict = None):
+        typeahead_config = (config or {}).get('typeahead', {})
+
+        self.pool = pool
+        self.enabled = typeahead_config.get('enabled', True)
+        self.check_interval = typeahead_config.get('check_interval', 5)
+        self.max_limit = typeahead_config.get('max_limit', 50)
+
+        self._snapshot: Optional[_TypeaheadSnapshot] = None
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self.last_error = None
+
+    # === CARGA ===
+
+    def start(self):
+        """Carga inicial en segundo plano"""
+        if self.enabled:
+            self._refresh_async()
+
+    def load(self) -> bool:
+        """Lee artistas y álbumes y construye un snapshot nuevo"""
+        with self._load_lock:
+            token = self.pool.data_token()
+            if self._snapshot is not None and self._snapshot.token == token:
+                return False
+
+            started = time.time()
+            try:
+                conn = self.pool.get_connection()
+                artists = [tuple(row) for row in conn.execute("""
+                    SELECT id, name FROM artists
+                    WHERE name IS NOT NULL AND name != ''
+                """)]
+                albums = [tuple(row) for row in conn.execute("""
+                    SELECT a.id, a.name, ar.name, a.year, a.genre, a.label
+                    FROM albums a
+                    JOIN artists ar ON a.artist_id = ar.id
+                    WHERE a.name IS NOT NULL AND a.name != ''
+                      AND ar.name IS NOT NULL AND ar.name != ''
+                """)]
+                self._snapshot = _TypeaheadSnapshot(artists, albums, token, round(time.time() - started, 3))
+                self.last_error = None
+                logger.info(f"Índice de sugerencias cargado: {len(artists)} artistas, "
+                            f"{len(albums)} álbumes en {self._snapshot.duration}s")
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error cargando índice de sugerencias: {e}")
+                return False
+
+    def _refresh_async(self):
+        if self._loading:
+            return
+        self._loading = True
+
+        def run():
+            try:
+                self.load()
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name='typeahead-loader', daemon=True).start()
+
+    def _snapshot_for_lookup(self) -> Optional[_TypeaheadSnapshot]:
+        """Snapshot actual; comprueba cambios en la BD como mucho cada check_interval"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.load()
+            return self._snapshot
+
+        now = time.time()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self.pool.data_token() != snapshot.token:
+                # Se sigue respondiendo con el snapshot anterior mientras se recarga
+                self._refresh_async()
+        return snapshot
+
+    # === CONSULTA ===
+
+    def suggest(self, query: str, kinds=('artist', 'album'), limit: int = 10) -> Optional[Dict[str, List[Dict]]]:
+        """Sugerencias por prefijo / prefijo de palabra para cada tipo pedido"""
+        if not self.enabled:
+            return None
+        snapshot = self._snapshot_for_lookup()
+        if snapshot is None:
+            return None
+
+        limit = max(0, min(limit, self.max_limit))
+        prefix = normalize(query)
+        results = {}
+
+        if 'artist' in kinds:
+            refs = snapshot.artist_index.lookup(prefix, limit) if prefix and limit else []
+            results['artists'] = [
+                {'id': snapshot.artists[ref][0], 'name': snapshot.artists[ref][1]}
+                for ref in refs
+            ]
+
+        if 'album' in kinds:
+            refs = snapshot.album_index.lookup(prefix, limit) if prefix and limit else []
+            results['albums'] = []
+            for ref in refs:
+                album_id, name, artist_name, year, genre, label = snapshot.albums[ref]
+                results['albums'].append({
+                    'id': album_id,
+                    'name': name or 'Sin nombre',
+                    'year': year or 'Desconocido',
+                    'genre': genre or 'Desconocido',
+                    'label': label or 'Desconocido',
+                    'artist_name': artist_name or 'Artista desconocido',
+                    'display_name': f"{artist_name} - {name}"
+                })
+
+        return results
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            'enabled': self.enabled,
+            'loaded': snapshot is not None,
+            'artists': len(snapshot.artists) if snapshot else 0,
+            'albums': len(snapshot.albums) if snapshot else 0,
+            'keys': (len(snapshot.artist_index) + len(snapshot.album_index)) if snapshot else 0,
+            'built_at': snapshot.built_at if snapshot else None,
+            'load_duration_s': snapshot.duration if snapshot else None,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RecentSearchBuffer:
+    """Cola de escritura diferida para `recent_searches`
+
+    Las búsquedas se guardan en memoria (una entrada por término, con la
+    fecha más reciente) y un hilo las escribe en una sola transacción con
+    `executemany` cada `flush_interval` segundos o en cuanto hay
+    `max_pending` términos. Al terminar el proceso se vacía la cola.
+    """
+
+    def __init__(self, pool, config: dict = None):
+        buffer_config = (config or {}).get('database', {}).get('recent_searches', {})
+
+        self.pool = pool
+        self.enabled = buffer_config.get('write_behind', True)
+        self.flush_interval = buffer_config.get('flush_interval', 5)
+        self.max_pending = buffer_config.get('max_pending', 50)
+
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {'added': 0, 'flushes': 0, 'written': 0, 'failed_flushes': 0}
+        self.last_error = None
+
+    # === CICLO DE VIDA ===
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._flush_loop, name='recent-searches-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Detiene el hilo y escribe lo pendiente"""
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            self.flush()
+
+    # === COLA ===
+
+    @staticmethod
+    def _now() -> str:
+        # Mismo formato que datetime('now') de SQLite (UTC)
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def add(self, search_term: str):
+        """Encola una búsqueda; nunca bloquea la petición con E/S"""
+        if not self.enabled:
+            self._write([(search_term, self._now())])
+            return
+        with self._lock:
+            # Reinsertar para que el orden del dict refleje la más reciente
+            self._pending.pop(search_term, None)
+            self._pending[search_term] = self._now()
+            self._stats['added'] += 1
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def pending(self) -> List[Tuple[str, str]]:
+        """Búsquedas aún no escritas, la más reciente primero"""
+        with self._lock:
+            return list(reversed(self._pending.items()))
+
+    def flush(self) -> int:
+        """Escribe lo pendiente en una transacción; devuelve las filas escritas"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = list(self._pending.items())
+                self._pending.clear()
+
+            if self._write(batch):
+                return len(batch)
+
+            # Se devuelven a la cola (sin pisar búsquedas más nuevas) y se
+            # descartan las más antiguas si se supera el límite
+            with self._lock:
+                restored = dict(batch)
+                restored.update(self._pending)
+                overflow = len(restored) - self.max_pending * 4
+                for term in list(restored)[:max(overflow, 0)]:
+                    del restored[term]
+                self._pending = restored
+            return 0
+
+    def _write(self, batch: List[Tuple[str, str]]) -> bool:
+        try:
+            with self.pool.writer() as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO recent_searches (search_term, search_date)
+                    VALUES (?, ?)
+                """, batch)
+            self._stats['flushes'] += 1
+            self._stats['written'] += len(batch)
+            self.last_error = None
+            return True
+        except Exception as e:
+            self._stats['failed_flushes'] += 1
+            self.last_error = str(e)
+            logger.debug(f"No se pudieron guardar {len(batch)} búsquedas recientes: {e}")
+            return False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'pending': pending,
+            'flush_interval': self.flush_interval,
+            'max_pending': self.max_pending,
+            'last_error': self.last_error,
+            **self._stats
+        }
@@ -274,8 +274,7 @@ function renderAlbumAnalysisContent(tabName, data, container) {
                     if (chartContainer && data.charts[chartId]) {
                         console.log(`📈 Renderizando gráfico de álbum: ${chartId}`);
                         
-                        const plotData = typeof data.charts[chartId] === 'string' ? 
-                            JSON.parse(data.charts[chartId]) : data.charts[chartId];
+                        const plotData = toPlotlyFigure(data.charts[chartId]);
                         
                         if (window.Plotly && plotData.data && plotData.layout) {
                             Plotly.newPlot(`chart-${chartId}`, plotData.data, plotData.layout, {
@@ -387,8 +386,7 @@ function renderAnalysisContent(tabName, data, container) {
                     if (chartContainer && data.charts[chartId]) {
                         console.log(`📈 Renderizando gráfico: ${chartId}`);
                         
-                        const plotData = typeof data.charts[chartId] === 'string' ? 
-                            JSON.parse(data.charts[chartId]) : data.charts[chartId];
+                        const plotData = toPlotlyFigure(data.charts[chartId]);
                         
                         if (window.Plotly && plotData.data && plotData.layout) {
                             Plotly.newPlot(`chart-${chartId}`, plotData.data, plotData.layout, {
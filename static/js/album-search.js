@@ -1,5 +1,6 @@
 // Variables para búsqueda de álbumes
 let albumSearchTimeout = null;
+let albumSearchController = null;
 
 // Configurar eventos del buscador de álbumes
 function setupAlbumSearchEvents() {
@@ -20,7 +21,7 @@ function setupAlbumSearchEvents() {
         clearTimeout(albumSearchTimeout);
         albumSearchTimeout = setTimeout(() => {
             filterAlbums(searchTerm);
-        }, 300);
+        }, 150);
     });
     
     input.addEventListener('keydown', function(e) {
@@ -63,16 +64,29 @@ async function filterAlbums(searchTerm) {
         return;
     }
     
+    // Cancelar la búsqueda anterior: su respuesta ya no corresponde al texto escrito
+    if (albumSearchController) {
+        albumSearchController.abort();
+    }
+    const controller = new AbortController();
+    albumSearchController = controller;
+    
     try {
         console.log(`🔍 Buscando álbumes: "${searchTerm}"`);
         
-        const response = await fetch(`/api/albums/search?q=${encodeURIComponent(searchTerm)}&limit=15`);
+        // Índice de sugerencias en memoria (prefijo / prefijo de palabra)
+        const response = await fetch(`/api/suggest?type=album&limit=15&q=${encodeURIComponent(searchTerm)}`, {
+            signal: controller.signal
+        });
         
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
         
         const data = await response.json();
+        if (controller.signal.aborted) {
+            return;
+        }
         console.log(`📊 Respuesta de búsqueda:`, data);
         
         dropdown.innerHTML = '';
@@ -83,13 +97,15 @@ async function filterAlbums(searchTerm) {
             return;
         }
         
-        if (!data.results || data.results.length === 0) {
+        const results = data.albums || [];
+        
+        if (results.length === 0) {
             dropdown.innerHTML = '<div style="padding: 10px 15px; color: #ff6b6b;">No se encontraron álbumes</div>';
             dropdown.style.display = 'block';
             return;
         }
         
-        data.results.forEach((album, index) => {
+        results.forEach((album, index) => {
             const item = document.createElement('div');
             item.style.cssText = 'padding: 12px 15px; cursor: pointer; border-bottom: 1px solid rgba(255,255,255,0.1); transition: background 0.2s ease;';
             
@@ -120,9 +136,12 @@ async function filterAlbums(searchTerm) {
         });
         
         dropdown.style.display = 'block';
-        console.log(`✅ Mostrados ${data.results.length} álbumes`);
+        console.log(`✅ Mostrados ${results.length} álbumes`);
         
     } catch (error) {
+        if (controller.signal.aborted) {
+            return; // Sustituida por una búsqueda posterior
+        }
         console.error('💥 Error buscando álbumes:', error);
         dropdown.innerHTML = `<div style="padding: 15px; text-align: center; color: #ff6b6b;">Error de conexión: ${error.message}</div>`;
         dropdown.style.display = 'block';
@@ -1,24 +1,20 @@
 // === BÚSQUEDA Y FILTRADO DE ARTISTAS ===
 
+// Sugerencias del servidor (/api/suggest): ya no se descarga la lista completa
+let artistSuggestTimeout = null;
+let artistSuggestController = null;
+let artistsTotal = 0;
+
 async function loadArtistsList() {
     try {
-        console.log('🔄 Cargando lista de artistas...');
-        
-        // AÑADIR DEBUG: Verificar qué devuelve la BD
-        const debugResponse = await fetch('/api/debug/artists');
-        if (debugResponse.ok) {
-            const debugData = await debugResponse.json();
-            console.log('🔍 Debug info de la BD:', debugData);
-        }
+        console.log('🔄 Consultando índice de artistas...');
         
-        const response = await fetch('/api/artists/list?limit=5000');
+        // limit=0 solo devuelve los totales del índice de sugerencias
+        const response = await fetch('/api/suggest?type=artist&limit=0');
         const data = await response.json();
         
-        console.log('📊 Respuesta completa del API:', data);
-        
         if (data.error) {
             console.error('❌ Error en API:', data.error);
-            console.error('🔧 Debug info:', data.debug);
             
             // Mostrar error en la UI
             const initialMessage = document.getElementById('initialMessage');
@@ -26,42 +22,23 @@ async function loadArtistsList() {
                 initialMessage.innerHTML = `
                     <i class="fas fa-exclamation-triangle" style="font-size: 3rem; margin-bottom: 20px; display: block; color: #ff6b6b;"></i>
                     <p>Error cargando artistas: ${data.error}</p>
-                    <p><small>Debug: ${JSON.stringify(data.debug)}</small></p>
                 `;
             }
             return;
         }
         
-        if (data.artists && data.artists.length > 0) {
-            artistsList = data.artists;
-            console.log(`✅ Lista de artistas cargada: ${artistsList.length} artistas`);
-            console.log('👤 Primeros 5 artistas:', artistsList.slice(0, 5));
-            console.log('👤 Últimos 5 artistas:', artistsList.slice(-5));
-            
-            // Actualizar mensaje inicial si existe
-            const initialMessage = document.getElementById('initialMessage');
-            if (initialMessage) {
-                const smallText = initialMessage.querySelector('small');
-                if (smallText) {
-                    smallText.textContent = `Escribe para buscar entre ${artistsList.length} artistas`;
-                } else {
-                    initialMessage.innerHTML += `<p><small>Escribe para buscar entre ${artistsList.length} artistas</small></p>`;
-                }
-            }
-        } else {
-            console.warn('⚠️ No se encontraron artistas en la respuesta');
-            console.warn('📄 Datos recibidos:', data);
-            artistsList = [];
-            
-            // Mostrar información de debug en la UI
-            const initialMessage = document.getElementById('initialMessage');
-            if (initialMessage) {
-                initialMessage.innerHTML = `
-                    <i class="fas fa-search" style="font-size: 3rem; margin-bottom: 20px; display: block;"></i>
-                    <p>No se encontraron artistas</p>
-                    <p><small>Total en BD: ${data.debug?.total_in_db || 'Desconocido'}</small></p>
-                    <p><small>Processed: ${data.debug?.processed || 0}</small></p>
-                `;
+        artistsTotal = data.counts?.artists || 0;
+        artistsList = [];
+        console.log(`✅ Índice de artistas disponible: ${artistsTotal} artistas`);
+        
+        // Actualizar mensaje inicial si existe
+        const initialMessage = document.getElementById('initialMessage');
+        if (initialMessage) {
+            const smallText = initialMessage.querySelector('small');
+            if (smallText) {
+                smallText.textContent = `Escribe para buscar entre ${artistsTotal} artistas`;
+            } else {
+                initialMessage.innerHTML += `<p><small>Escribe para buscar entre ${artistsTotal} artistas</small></p>`;
             }
         }
     } catch (error) {
@@ -83,6 +60,37 @@ async function loadArtistsList() {
     }
 }
 
+// Pedir sugerencias al servidor; guarda el resultado en artistsList.
+// Cada petición cancela la anterior: devuelve null si otra más reciente la ha sustituido
+async function fetchArtistSuggestions(searchTerm, limit = 15) {
+    if (artistSuggestController) {
+        artistSuggestController.abort();
+    }
+    const controller = new AbortController();
+    artistSuggestController = controller;
+    
+    let data;
+    try {
+        const response = await fetch(`/api/suggest?type=artist&limit=${limit}&q=${encodeURIComponent(searchTerm)}`, {
+            signal: controller.signal
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        data = await response.json();
+    } catch (error) {
+        if (controller.signal.aborted) {
+            return null;
+        }
+        throw error;
+    }
+    if (controller.signal.aborted) {
+        return null;
+    }
+    artistsList = data.artists || [];
+    return artistsList;
+}
+
 
 function setupArtistSearchEvents() {
     const input = document.getElementById('artistSearchInput');
@@ -99,17 +107,30 @@ function setupArtistSearchEvents() {
     input.addEventListener('input', function(e) {
         const searchTerm = e.target.value;
         console.log(`🔍 Búsqueda: "${searchTerm}"`);
-        filterArtists(searchTerm);
+        
+        clearTimeout(artistSuggestTimeout);
+        artistSuggestTimeout = setTimeout(() => {
+            filterArtists(searchTerm);
+        }, 100);
     });
     
     // Evento de tecla Enter
-    input.addEventListener('keydown', function(e) {
+    input.addEventListener('keydown', async function(e) {
         if (e.key === 'Enter') {
             e.preventDefault();
             const searchTerm = e.target.value.trim();
             console.log(`⏎ Enter presionado con: "${searchTerm}"`);
             
             if (searchTerm.length >= 2) {
+                clearTimeout(artistSuggestTimeout);
+                try {
+                    if (await fetchArtistSuggestions(searchTerm) === null) {
+                        return; // Sustituida por una búsqueda posterior
+                    }
+                } catch (error) {
+                    console.error('💥 Error obteniendo sugerencias:', error);
+                }
+                
                 // Buscar coincidencia exacta o primera coincidencia
                 const exactMatch = artistsList.find(artist => 
                     artist.name.toLowerCase() === searchTerm.toLowerCase()
@@ -119,10 +140,8 @@ function setupArtistSearchEvents() {
                     console.log(`🎯 Coincidencia exacta encontrada: ${exactMatch.name}`);
                     selectArtist(exactMatch);
                 } else {
-                    // Buscar primera coincidencia parcial
-                    const partialMatch = artistsList.find(artist => 
-                        artist.name.toLowerCase().includes(searchTerm.toLowerCase())
-                    );
+                    // Primera sugerencia (prefijo o prefijo de palabra)
+                    const partialMatch = artistsList[0];
                     
                     if (partialMatch) {
                         console.log(`🎯 Coincidencia parcial encontrada: ${partialMatch.name}`);
@@ -155,7 +174,7 @@ function setupArtistSearchEvents() {
 
 // === BÚSQUEDA Y FILTRADO DE ARTISTAS ===
 
-function filterArtists(searchTerm) {
+async function filterArtists(searchTerm) {
     const dropdown = document.getElementById('artistDropdown');
     
     if (!dropdown) {
@@ -168,17 +187,19 @@ function filterArtists(searchTerm) {
         return;
     }
     
-    if (!artistsList || artistsList.length === 0) {
-        console.warn('⚠️ Lista de artistas vacía');
-        dropdown.innerHTML = '<div style="padding: 10px 15px; color: #ff6b6b;">No hay artistas cargados</div>';
+    let filtered = [];
+    try {
+        filtered = await fetchArtistSuggestions(searchTerm, 15); // Limitar a 15 resultados
+    } catch (error) {
+        console.error('💥 Error obteniendo sugerencias:', error);
+        dropdown.innerHTML = `<div style="padding: 10px 15px; color: #ff6b6b;">Error de conexión: ${error.message}</div>`;
         dropdown.style.display = 'block';
         return;
     }
     
-    const searchLower = searchTerm.toLowerCase();
-    const filtered = artistsList.filter(artist => 
-        artist.name.toLowerCase().includes(searchLower)
-    ).slice(0, 15); // Limitar a 15 resultados
+    if (filtered === null) {
+        return; // Respuesta obsoleta: ya hay una búsqueda más reciente
+    }
     
     console.log(`🔍 Filtrado: "${searchTerm}" -> ${filtered.length} resultados`);
     
@@ -323,7 +344,7 @@ async function showArtistAnalysis(container) {
             <div id="initialMessage" style="text-align: center; padding: 40px; color: #a8e6cf;">
                 <i class="fas fa-chart-line" style="font-size: 3rem; margin-bottom: 20px; display: block;"></i>
                 <p>Selecciona un artista para ver su análisis detallado</p>
-                <p><small>Escribe para buscar entre ${artistsList.length} artistas</small></p>
+                <p><small>Escribe para buscar entre ${artistsTotal} artistas</small></p>
             </div>
             
             <!-- Contenido del artista seleccionado -->
@@ -477,8 +498,7 @@ async function showArtistAnalysisTab(tabName) {
                         if (container && data.charts[chartId]) {
                             console.log(`📈 Renderizando gráfico: ${chartId}`);
                             
-                            const plotData = typeof data.charts[chartId] === 'string' ? 
-                                JSON.parse(data.charts[chartId]) : data.charts[chartId];
+                            const plotData = toPlotlyFigure(data.charts[chartId]);
                             
                             if (window.Plotly && plotData.data && plotData.layout) {
                                 Plotly.newPlot(`chart-${chartId}`, plotData.data, plotData.layout, {
@@ -34,8 +34,8 @@ async function loadChart(category, chartType, containerId) {
             return;
         }
         
-        // Parsear el JSON del gráfico de Plotly
-        const plotlyData = JSON.parse(data.chart);
+        // Especificación compacta o JSON de la figura de Plotly
+        const plotlyData = toPlotlyFigure(data.chart);
         
         // Renderizar con Plotly
         Plotly.newPlot(containerId, plotlyData.data, plotlyData.layout, {
@@ -49,6 +49,202 @@ async function loadChart(category, chartType, containerId) {
 }
 
 
+// === ESPECIFICACIÓN COMPACTA DE GRÁFICOS ===
+// El servidor envía {spec, type, title, x, y, data: [valores x, valores y], style}
+// y aquí se expande a la figura de Plotly que antes se generaba en Python
+
+const CHART_STYLE_PRESETS = {
+    'mwe-dark': {
+        accent: '#a8e6cf',
+        markerColor: '#2a5298',
+        tickfont: { size: 11, color: 'white' },
+        gridcolor: 'rgba(255,255,255,0.2)',
+        axis: {
+            automargin: true,
+            gridcolor: '#283442',
+            linecolor: '#506784',
+            ticks: '',
+            title: { standoff: 15 },
+            zerolinecolor: '#283442',
+            zerolinewidth: 2
+        },
+        layout: {
+            font: {
+                family: "'Segoe UI', Tahoma, Geneva, Verdana, sans-serif",
+                size: 13,
+                color: 'white'
+            },
+            colorway: ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+                       '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'],
+            plot_bgcolor: 'rgba(30, 60, 114, 0.1)',
+            paper_bgcolor: 'rgba(30, 60, 114, 0.05)',
+            hovermode: 'closest',
+            hoverlabel: { align: 'left' },
+            legend: { tracegroupgap: 0 },
+            showlegend: true,
+            height: 450,
+            margin: { l: 60, r: 60, t: 80, b: 60 },
+            shapes: [{
+                type: 'rect',
+                xref: 'paper', yref: 'paper',
+                x0: 0, y0: 0, x1: 1, y1: 1,
+                line: { color: 'rgba(168, 230, 207, 0.3)', width: 1 }
+            }]
+        }
+    }
+};
+
+function isChartSpec(chartData) {
+    return Boolean(chartData && chartData.spec && chartData.type);
+}
+
+function chartAxis(preset, title, extra) {
+    return {
+        ...preset.axis,
+        title: { ...preset.axis.title, text: title },
+        ...extra
+    };
+}
+
+function expandChartSpec(spec) {
+    const preset = CHART_STYLE_PRESETS[spec.style] || CHART_STYLE_PRESETS['mwe-dark'];
+    // Plotly modifica el layout que recibe: copia por gráfico
+    const layout = JSON.parse(JSON.stringify(preset.layout));
+    
+    if (spec.type === 'empty') {
+        delete layout.shapes;
+        delete layout.margin;
+        layout.showlegend = false;
+        layout.font = { color: 'white' };
+        layout.annotations = [{
+            text: spec.title,
+            xref: 'paper', yref: 'paper',
+            x: 0.5, y: 0.5,
+            showarrow: false,
+            font: { size: 18, color: preset.accent }
+        }];
+        return { data: [], layout: layout };
+    }
+    
+    const [xValues, yValues] = spec.data;
+    const hovertemplate = '<b>%{x}</b><br>Valor: %{y}<br><extra></extra>';
+    let trace;
+    
+    layout.title = {
+        text: spec.title,
+        font: { size: 18, color: preset.accent },
+        x: 0.5,
+        xanchor: 'center'
+    };
+    
+    switch (spec.type) {
+        case 'pie':
+            trace = {
+                type: 'pie',
+                labels: xValues,
+                values: yValues,
+                automargin: true,
+                hovertemplate: '<b>%{label}</b><br>Valor: %{value}<br><extra></extra>',
+                textposition: 'inside',
+                textinfo: 'label+percent+value',
+                textfont: { size: 14 },
+                marker: { line: { color: '#000000', width: 2 } },
+                pull: xValues.map((_, i) => i === 0 ? 0.1 : 0)  // Destacar el primer sector
+            };
+            layout.legend = {
+                ...layout.legend,
+                orientation: 'v',
+                yanchor: 'top',
+                y: 1,
+                xanchor: 'left',
+                x: 1.01,
+                font: { size: 12 }
+            };
+            break;
+        
+        case 'bar':
+            trace = {
+                type: 'bar',
+                x: xValues,
+                y: yValues,
+                orientation: 'v',
+                showlegend: false,
+                hovertemplate: hovertemplate,
+                marker: {
+                    color: preset.accent,
+                    line: { color: 'rgba(255,255,255,0.3)', width: 1 },
+                    opacity: 0.8
+                },
+                texttemplate: '%{y}',
+                textposition: 'outside',
+                textfont: { size: 12, color: 'white' }
+            };
+            layout.barmode = 'relative';
+            layout.xaxis = chartAxis(preset, spec.x, {
+                tickangle: xValues.some(x => String(x).length > 10) ? 45 : 0,
+                tickfont: preset.tickfont
+            });
+            layout.yaxis = chartAxis(preset, spec.y, {
+                tickfont: preset.tickfont,
+                gridcolor: preset.gridcolor
+            });
+            break;
+        
+        case 'line':
+            trace = {
+                type: 'scatter',
+                mode: 'lines+markers',
+                x: xValues,
+                y: yValues,
+                showlegend: false,
+                hovertemplate: hovertemplate,
+                line: { color: preset.accent, dash: 'solid', width: 3 },
+                marker: {
+                    symbol: 'circle',
+                    size: 8,
+                    color: preset.markerColor,
+                    line: { width: 2, color: 'white' }
+                },
+                textfont: { size: 12, color: 'white' }
+            };
+            layout.xaxis = chartAxis(preset, spec.x, { tickfont: preset.tickfont, gridcolor: preset.gridcolor });
+            layout.yaxis = chartAxis(preset, spec.y, { tickfont: preset.tickfont, gridcolor: preset.gridcolor });
+            break;
+        
+        case 'scatter':
+            trace = {
+                type: 'scatter',
+                mode: 'markers',
+                x: xValues,
+                y: yValues,
+                showlegend: false,
+                hovertemplate: hovertemplate,
+                marker: {
+                    symbol: 'circle',
+                    size: 10,
+                    color: preset.accent,
+                    line: { width: 2, color: 'white' },
+                    opacity: 0.8
+                }
+            };
+            layout.xaxis = chartAxis(preset, spec.x);
+            layout.yaxis = chartAxis(preset, spec.y);
+            break;
+        
+        default:
+            return expandChartSpec({ type: 'empty', title: `Tipo de gráfico no soportado: ${spec.type}`, style: spec.style });
+    }
+    
+    return { data: [trace], layout: layout };
+}
+
+function toPlotlyFigure(chartData) {
+    // Acepta la especificación compacta o la figura completa (charts.format: plotly)
+    const figure = typeof chartData === 'string' ? JSON.parse(chartData) : chartData;
+    return isChartSpec(figure) ? expandChartSpec(figure) : figure;
+}
+
+
 // === RENDERIZADO ESPECÍFICO DE GRÁFICOS ===
 
 function renderChart(chartId, chartData) {
@@ -80,7 +276,7 @@ function renderPlotlyChart(containerId, plotData) {
         
         console.log(`📈 Renderizando gráfico: ${containerId}`);
         
-        const data = typeof plotData === 'string' ? JSON.parse(plotData) : plotData;
+        const data = toPlotlyFigure(plotData);
         
         if (window.Plotly && data.data && data.layout) {
             Plotly.newPlot(containerId, data.data, data.layout, {
@@ -3,6 +3,16 @@
 // Variables globales para escuchas
 let currentScrobblesView = 'main';
 
+// Pestañas precargadas con /api/scrobbles/analysis/all (pestaña → promesa con los datos o null)
+let scrobblesAnalysisPrefetch = {};
+// Filtros con los que se hizo la precarga (query string)
+let scrobblesAnalysisPrefetchQuery = null;
+
+// Filtros activos (?user=, ?from=, ?to=); por defecto los de la URL de la página
+let scrobblesAnalysisFilters = readScrobblesAnalysisFilters();
+const SCROBBLES_ANALYSIS_TABS = ['tiempo', 'generos', 'calidad', 'descubrimiento', 'evolucion',
+                                 'sellos', 'colaboradores', 'duracion', 'idiomas'];
+
 // === CONFIGURACIÓN INICIAL ===
 
 function setupScrobblesAnalysis() {
@@ -207,6 +217,84 @@ async function showScrobblesAnalysis(container) {
     
     // Mostrar el menú principal de scrobbles
     showScrobblesMainSection();
+    
+    // Calcular todas las pestañas en segundo plano mientras se elige una
+    prefetchScrobblesAnalyses();
+}
+
+// === FILTROS ===
+
+function readScrobblesAnalysisFilters() {
+    const params = new URLSearchParams(window.location.search);
+    const filters = {};
+    ['user', 'from', 'to'].forEach(name => {
+        if (params.get(name)) filters[name] = params.get(name);
+    });
+    return filters;
+}
+
+// Query string de los filtros activos, más los parámetros indicados
+function scrobblesAnalysisQuery(extra = {}) {
+    const params = new URLSearchParams();
+    Object.entries({ ...scrobblesAnalysisFilters, ...extra }).forEach(([name, value]) => {
+        if (value) params.set(name, value);
+    });
+    const query = params.toString();
+    return query ? `?${query}` : '';
+}
+
+// Cambia los filtros y vuelve a precargar las pestañas con ellos
+function setScrobblesAnalysisFilters(filters) {
+    scrobblesAnalysisFilters = { ...filters };
+    prefetchScrobblesAnalyses();
+}
+
+// === PRECARGA DE PESTAÑAS ===
+
+function prefetchScrobblesAnalyses() {
+    const resolvers = {};
+    scrobblesAnalysisPrefetch = {};
+    scrobblesAnalysisPrefetchQuery = scrobblesAnalysisQuery();
+    SCROBBLES_ANALYSIS_TABS.forEach(tab => {
+        scrobblesAnalysisPrefetch[tab] = new Promise(resolve => { resolvers[tab] = resolve; });
+    });
+    
+    readScrobblesAnalysisStream(resolvers, scrobblesAnalysisQuery({ stream: '1' }))
+        .catch(error => console.warn('⚠️ Precarga de análisis de scrobbles fallida:', error))
+        // Las pestañas que no lleguen se piden una a una
+        .finally(() => Object.values(resolvers).forEach(resolve => resolve(null)));
+}
+
+async function readScrobblesAnalysisStream(resolvers, query) {
+    const response = await fetch(`/api/scrobbles/analysis/all${query}`);
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    
+    // Una línea JSON por pestaña según terminan en el servidor
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (!line) continue;
+            
+            const message = JSON.parse(line);
+            if (message.tab && resolvers[message.tab]) {
+                console.log(`⏱️ Análisis ${message.tab}: ${message.elapsed_ms}ms`);
+                resolvers[message.tab](message.data && !message.data.error ? message.data : null);
+            } else if (message.done) {
+                console.log(`⏱️ Todos los análisis de scrobbles: ${message.total_ms}ms`);
+            }
+        }
+    }
 }
 
 async function showScrobblesAnalysisTab(tabName) {
@@ -240,14 +328,21 @@ async function showScrobblesAnalysisTab(tabName) {
     content.style.display = 'block';
     
     try {
-        console.log(`🌐 Haciendo petición a: /api/scrobbles/analysis/${tabName}`);
-        const response = await fetch(`/api/scrobbles/analysis/${tabName}`);
+        // Resultado precargado (o en curso) con los mismos filtros; si no, se pide solo esta pestaña
+        const query = scrobblesAnalysisQuery();
+        const prefetched = query === scrobblesAnalysisPrefetchQuery ? scrobblesAnalysisPrefetch[tabName] : null;
+        let data = prefetched ? await prefetched : null;
         
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        if (!data) {
+            console.log(`🌐 Haciendo petición a: /api/scrobbles/analysis/${tabName}${query}`);
+            const response = await fetch(`/api/scrobbles/analysis/${tabName}${query}`);
+            
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            
+            data = await response.json();
         }
-        
-        const data = await response.json();
         console.log('📄 Respuesta del servidor:', data);
         
         if (data.error) {
@@ -394,8 +489,7 @@ function renderScrobblesAnalysisContent(tabName, data, container) {
                     if (chartContainer && data.charts[chartId]) {
                         console.log(`📈 Renderizando gráfico de scrobbles: ${chartId}`);
                         
-                        const plotData = typeof data.charts[chartId] === 'string' ? 
-                            JSON.parse(data.charts[chartId]) : data.charts[chartId];
+                        const plotData = toPlotlyFigure(data.charts[chartId]);
                         
                         if (window.Plotly && plotData.data && plotData.layout) {
                             Plotly.newPlot(`chart-${chartId}`, plotData.data, plotData.layout, {